@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from recipe import stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Serve the recipe event stream natively and the rest through Django"""
+    if scope['type'] == 'http' and scope['path'] == stream.PATH:
+        return await stream.recipe_events(scope, receive, send)
+    return await django_application(scope, receive, send)
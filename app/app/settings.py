@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'rest_framework',
     'rest_framework.authtoken',
@@ -45,6 +46,8 @@ INSTALLED_APPS = [
     'drf_spectacular',
     'user',
     'recipe',
+    'batch',
+    'audit',
 
 ]
 
@@ -56,6 +59,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.RateLimitHeadersMiddleware',
+    'core.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -78,6 +83,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'app.wsgi.application'
 
+ASGI_APPLICATION = 'app.asgi.application'
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -132,6 +139,11 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', str(BASE_DIR / 'var' / 'media'))
+# Media names are content hashes, so responses may be cached for a year
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -139,10 +151,154 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Locks, cache versions and idempotent responses live here, so the
+# backend must be shared by all processes: docker-compose points
+# CACHE_BACKEND at memcached. The database cache (created with
+# `manage.py createcachetable`) is the fallback. The serve command refuses
+# to fork several workers over a process local cache.
+
+CACHE_BACKEND = os.environ.get(
+    'CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'core_cache'),
+    },
+}
+if CACHE_BACKEND == 'django.core.cache.backends.db.DatabaseCache':
+    # Culling is off: past MAX_ENTRIES it deletes rows in key order, held
+    # locks and versions included. Expired rows are deleted by the
+    # prune_expired command instead.
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': 10 ** 12,
+        'CULL_FREQUENCY': 0,
+    }
+
+# Single-flight caching (see core.singleflight)
+SINGLE_FLIGHT_CACHE = 'default'
+# Seconds a stale entry may still be served while it is refreshed
+SINGLE_FLIGHT_STALE_TTL = int(os.environ.get('SINGLE_FLIGHT_STALE_TTL', 300))
+# Seconds a caller may hold the lock to compute an entry
+SINGLE_FLIGHT_LOCK_TIMEOUT = int(os.environ.get('SINGLE_FLIGHT_LOCK_TIMEOUT', 10))
+RECIPE_CACHE_TTL = int(os.environ.get('RECIPE_CACHE_TTL', 60))
+SCHEMA_CACHE_TTL = int(os.environ.get('SCHEMA_CACHE_TTL', 3600))
+# Idempotency-Key responses and locks (see core.idempotency); kept for
+# IDEMPOTENCY_TTL seconds, and a create holds its key at most
+# IDEMPOTENCY_LOCK_TIMEOUT seconds
+IDEMPOTENCY_CACHE = 'default'
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 24 * 60 * 60))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 30))
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.AnonTokenBucketThrottle',
+        'core.throttling.UserTokenBucketThrottle',
+        'core.throttling.ScopedTokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.environ.get('THROTTLE_RATE_ANON', '300/min'),
+        'user': os.environ.get('THROTTLE_RATE_USER', '3000/min'),
+        'auth': os.environ.get('THROTTLE_RATE_AUTH', '30/min'),
+        'recipe_write': os.environ.get('THROTTLE_RATE_RECIPE_WRITE', '600/min'),
+    },
 }
 
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
-}
\ No newline at end of file
+}
+
+# Number of recipes removed per transaction when deleting a user
+USER_DELETION_BATCH_SIZE = int(os.environ.get('USER_DELETION_BATCH_SIZE', 1000))
+# Set to 1 to have PostgreSQL delete a user's recipes and MinHash bands
+# along with the user row (ON DELETE CASCADE), skipping Django signals.
+# migrate applies it; run apply_user_db_cascade after changing it.
+USER_DELETION_DB_CASCADE = os.environ.get('USER_DELETION_DB_CASCADE') == '1'
+
+# Background jobs (see core.jobs)
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+# Base and maximum delay, in seconds, between retries of a failed job
+JOB_RETRY_BACKOFF = float(os.environ.get('JOB_RETRY_BACKOFF', 10))
+JOB_RETRY_BACKOFF_MAX = float(os.environ.get('JOB_RETRY_BACKOFF_MAX', 3600))
+# Seconds after which a running job is assumed to belong to a dead worker
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 3600))
+
+# Largest number of recipes returned by one batch retrieve request
+RECIPE_BATCH_MAX_IDS = int(os.environ.get('RECIPE_BATCH_MAX_IDS', 100))
+
+# Limits of the /api/batch/ endpoint
+BATCH_MAX_SUBREQUESTS = int(os.environ.get('BATCH_MAX_SUBREQUESTS', 20))
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 4))
+
+# Recipe title autocomplete (see recipe.autocomplete)
+AUTOCOMPLETE_MAX_RESULTS = 20
+# Users whose title index is kept in memory by each worker
+AUTOCOMPLETE_CACHE_USERS = int(os.environ.get('AUTOCOMPLETE_CACHE_USERS', 1000))
+# Titles kept in memory by each worker across all users' indexes
+AUTOCOMPLETE_CACHE_TITLES = int(
+    os.environ.get('AUTOCOMPLETE_CACHE_TITLES', 200000))
+# Users with more titles than this are served from the database only
+AUTOCOMPLETE_MAX_TITLES = int(os.environ.get('AUTOCOMPLETE_MAX_TITLES', 20000))
+# Seconds an in-memory title index is used before it is rebuilt
+AUTOCOMPLETE_INDEX_TTL = int(os.environ.get('AUTOCOMPLETE_INDEX_TTL', 60))
+
+# Similar recipe index (see recipe.similarity), rebuilt by the
+# build_similarity_index command and memory mapped by every worker
+RECIPE_SIMILARITY_DIR = os.environ.get(
+    'RECIPE_SIMILARITY_DIR', str(BASE_DIR / 'var' / 'similarity'))
+RECIPE_SIMILARITY_DIMENSIONS = int(
+    os.environ.get('RECIPE_SIMILARITY_DIMENSIONS', 256))
+RECIPE_SIMILARITY_MAX_RESULTS = 20
+
+# Estimated Jaccard similarity from which two recipes count as duplicates
+RECIPE_DUPLICATE_THRESHOLD = float(
+    os.environ.get('RECIPE_DUPLICATE_THRESHOLD', 0.8))
+
+# Columnar recipe snapshot for reporting (see recipe.snapshot)
+RECIPE_SNAPSHOT_DIR = os.environ.get(
+    'RECIPE_SNAPSHOT_DIR', str(BASE_DIR / 'var' / 'snapshot'))
+RECIPE_REPORT_MAX_BINS = 100
+
+# Request profiling (see core.profiling): staff send the X-Profile header,
+# and PROFILING_SAMPLE_RATE of all requests get a stack-only profile
+PROFILING_HEADER = 'HTTP_X_PROFILE'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_INTERVAL = float(os.environ.get('PROFILING_INTERVAL', 0.005))
+PROFILING_TRACEBACK_FRAMES = 1
+PROFILING_TOP_ALLOCATIONS = 50
+PROFILING_DIR = os.environ.get(
+    'PROFILING_DIR', str(BASE_DIR / 'var' / 'profiles'))
+PROFILING_MAX_ENTRIES = int(os.environ.get('PROFILING_MAX_ENTRIES', 200))
+
+# Recipe change events (see core.events), streamed by the ASGI server
+RECIPE_EVENTS_CHANNEL = 'recipe_events'
+RECIPE_EVENTS_QUEUE_SIZE = int(os.environ.get('RECIPE_EVENTS_QUEUE_SIZE', 100))
+# Seconds between keepalive comments on idle streams
+RECIPE_EVENTS_KEEPALIVE = int(os.environ.get('RECIPE_EVENTS_KEEPALIVE', 15))
+# Seconds a client has to open the stream with a ticket
+RECIPE_EVENTS_TICKET_TTL = 30
+
+# Recipe images (see recipe.images)
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.environ.get('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024))
+RECIPE_THUMBNAIL_SIZES = (160, 480)
+# Processes rendering thumbnails in each web worker, and the uploads that
+# may wait for them before work is handed to the job queue
+RECIPE_THUMBNAIL_WORKERS = int(os.environ.get('RECIPE_THUMBNAIL_WORKERS', 2))
+RECIPE_THUMBNAIL_QUEUE_SIZE = int(
+    os.environ.get('RECIPE_THUMBNAIL_QUEUE_SIZE', 16))
+
+# Audit log (see core.audit): events are written in batches of
+# AUDIT_BUFFER_SIZE, or once the oldest waited AUDIT_FLUSH_INTERVAL seconds
+AUDIT_BUFFER_SIZE = int(os.environ.get('AUDIT_BUFFER_SIZE', 500))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 5))
+# Events kept for retrying while the database cannot be written
+AUDIT_BUFFER_MAX = int(os.environ.get('AUDIT_BUFFER_MAX', 50000))
+# Flush from a thread of each process and at exit; off while testing
+AUDIT_BACKGROUND_FLUSH = True
+AUDIT_PAGE_SIZE = 100
+
+# Keeps background work such as audit flushes out of the test database
+TEST_RUNNER = 'app.test_runner.TestRunner'
@@ -0,0 +1,14 @@
+"""
+Test runner for the project
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Run tests without background threads writing to the database"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # Flushing at exit would write after the test database is gone
+        settings.AUDIT_BACKGROUND_FLUSH = False
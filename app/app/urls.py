@@ -15,19 +15,36 @@ Including another URLconf
 """
 
 from django.contrib import admin
-from django.urls import path, include
-from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
+from django.conf import settings
+from django.urls import path, include, re_path
+from drf_spectacular.views import SpectacularRedocView, SpectacularSwaggerView
+
+from core.views import (
+    CachedSpectacularAPIView, media, profile_detail, profile_list)
 
 
 
 urlpatterns = [
+    path('admin/profiles/', profile_list, name='profile-list'),
+    path(
+        'admin/profiles/<str:profile_id>/',
+        profile_detail,
+        name='profile-detail',
+    ),
     path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('api/schema/', CachedSpectacularAPIView.as_view(), name='schema'),
     # Optional UI:
     path('api/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('api/schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
 
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
+    path('api/batch/', include('batch.urls')),
+    path('api/audit/', include('audit.urls')),
+    re_path(
+        rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.+)$",
+        media,
+        name='media',
+    ),
 
 ]
@@ -0,0 +1,37 @@
+"""
+Serializers for audit app
+"""
+from rest_framework import serializers
+
+from core.models import AuditEvent
+
+
+class AuditEventSerializer(serializers.ModelSerializer):
+    """Serializer for audit events"""
+
+    class Meta:
+        model = AuditEvent
+        fields = [
+            'id', 'created_at', 'actor', 'action', 'object_type',
+            'object_id', 'changes', 'source',
+        ]
+        read_only_fields = fields
+
+
+class AuditFilterSerializer(serializers.Serializer):
+    """Serializer for the query parameters filtering audit events"""
+    user = serializers.IntegerField(required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    object_type = serializers.ChoiceField(
+        choices=('recipe', 'user'), required=False)
+    object_id = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if 'object_id' in attrs and 'object_type' not in attrs:
+            raise serializers.ValidationError(
+                'object_id requires object_type.')
+        if attrs.get('since') and attrs.get('until') and \
+                attrs['since'] >= attrs['until']:
+            raise serializers.ValidationError('since must precede until.')
+        return attrs
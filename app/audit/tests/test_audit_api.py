@@ -0,0 +1,89 @@
+"""
+Tests for the audit API
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import AuditEvent
+
+
+AUDIT_URL = reverse('audit:event-list')
+
+
+def create_user(**params):
+    return get_user_model().objects.create_user(**params)
+
+
+def create_event(actor, created_at, **params):
+    defaults = {
+        'action': AuditEvent.ACTION_UPDATED,
+        'object_type': 'recipe',
+        'object_id': 1,
+        'source': 'api',
+    }
+    defaults.update(params)
+    return AuditEvent.objects.create(
+        actor=actor, created_at=created_at, **defaults)
+
+
+class AuditApiTests(TestCase):
+    """Test listing audit events"""
+
+    def setUp(self):
+        self.staff = create_user(
+            email='staff@example.com', password='testpass123', is_staff=True)
+        self.user = create_user(
+            email='user@example.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        self.now = timezone.now()
+
+    def test_staff_required(self):
+        """Test regular users cannot read the audit log"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.get(AUDIT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_filter_by_user_and_time(self):
+        """Test events are filtered by actor and time range, newest first"""
+        old = create_event(self.user, self.now - timedelta(days=10))
+        recent = create_event(self.user, self.now - timedelta(hours=1))
+        newest = create_event(self.user, self.now)
+        create_event(self.staff, self.now)
+
+        res = self.client.get(AUDIT_URL, {
+            'user': self.user.id,
+            'since': (self.now - timedelta(days=1)).isoformat(),
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [event['id'] for event in res.data['results']]
+        self.assertEqual(ids, [newest.id, recent.id])
+        self.assertNotIn(old.id, ids)
+
+    def test_filter_by_object(self):
+        """Test events are filtered by the changed object"""
+        event = create_event(self.user, self.now, object_id=7)
+        create_event(self.user, self.now, object_id=8)
+        create_event(self.user, self.now, object_type='user', object_id=7)
+
+        res = self.client.get(
+            AUDIT_URL, {'object_type': 'recipe', 'object_id': 7})
+
+        self.assertEqual(
+            [e['id'] for e in res.data['results']], [event.id])
+
+    def test_invalid_filter(self):
+        """Test malformed filters are rejected"""
+        res = self.client.get(AUDIT_URL, {'since': 'yesterday'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,12 @@
+"""
+Urls for audit app
+"""
+from django.urls import path
+
+from audit import views
+
+app_name = 'audit'
+
+urlpatterns = [
+    path('', views.AuditEventListView.as_view(), name='event-list'),
+]
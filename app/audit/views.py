@@ -0,0 +1,46 @@
+"""
+Views for the audit API
+"""
+from django.conf import settings
+from rest_framework import authentication, generics, pagination, permissions
+
+from audit import serializers
+from core.models import AuditEvent
+
+
+class AuditPagination(pagination.CursorPagination):
+    """Newest first; a cursor stays cheap however deep the client pages"""
+    ordering = ('-created_at', '-id')
+    page_size = settings.AUDIT_PAGE_SIZE
+
+
+class AuditEventListView(generics.ListAPIView):
+    """List recorded changes to recipes and users (staff only)
+
+    Filtered by ``user`` (the actor), ``since``/``until``, ``object_type``
+    and ``object_id``. Bounding the time range lets PostgreSQL read only
+    the matching monthly partitions.
+    """
+    serializer_class = serializers.AuditEventSerializer
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.IsAdminUser]
+    pagination_class = AuditPagination
+
+    def get_queryset(self):
+        params = serializers.AuditFilterSerializer(
+            data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+
+        queryset = AuditEvent.objects.all()
+        if 'user' in filters:
+            queryset = queryset.filter(actor_id=filters['user'])
+        if 'since' in filters:
+            queryset = queryset.filter(created_at__gte=filters['since'])
+        if 'until' in filters:
+            queryset = queryset.filter(created_at__lt=filters['until'])
+        if 'object_type' in filters:
+            queryset = queryset.filter(object_type=filters['object_type'])
+        if 'object_id' in filters:
+            queryset = queryset.filter(object_id=filters['object_id'])
+        return queryset
@@ -0,0 +1,27 @@
+"""
+Serializers for batch app
+"""
+from django.conf import settings
+from rest_framework import serializers
+
+
+class SubRequestSerializer(serializers.Serializer):
+    """Serializer for one API call inside a batch"""
+    method = serializers.ChoiceField(
+        choices=('GET', 'POST', 'PUT', 'PATCH', 'DELETE'), default='GET')
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False)
+
+
+class BatchSerializer(serializers.Serializer):
+    """Serializer for a list of API calls run in a single request"""
+    requests = SubRequestSerializer(many=True, allow_empty=False)
+    concurrent = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        """Enforce the maximum number of calls per batch"""
+        limit = settings.BATCH_MAX_SUBREQUESTS
+        if len(value) > limit:
+            raise serializers.ValidationError(
+                f'At most {limit} requests can be batched.')
+        return value
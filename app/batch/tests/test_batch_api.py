@@ -0,0 +1,126 @@
+"""
+Tests for the batch API
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+
+BATCH_URL = reverse('batch:batch')
+ME_URL = reverse('user:me')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def create_user(**params):
+    return get_user_model().objects.create_user(**params)
+
+
+class BatchApiTests(TestCase):
+    """Test running several API calls in one request"""
+
+    def setUp(self):
+        self.user = create_user(
+            email='user@example.com',
+            password='testpass123',
+            name='Test name',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_batch_runs_calls_as_user(self):
+        """Test each call runs authenticated as the batch user"""
+        Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('4.50'),
+        )
+        payload = {'requests': [
+            {'method': 'GET', 'path': ME_URL},
+            {'method': 'GET', 'path': RECIPES_URL},
+            {
+                'method': 'POST',
+                'path': RECIPES_URL,
+                'body': {
+                    'title': 'Created in batch',
+                    'time_minutes': 10,
+                    'price': '2.00',
+                },
+            },
+        ]}
+
+        res = self.client.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        me, recipes, created = res.data['responses']
+        self.assertEqual(me['status'], status.HTTP_200_OK)
+        self.assertEqual(me['body']['email'], self.user.email)
+        self.assertEqual(len(recipes['body']), 1)
+        self.assertEqual(created['status'], status.HTTP_201_CREATED)
+        self.assertTrue(Recipe.objects.filter(
+            user=self.user, title='Created in batch').exists())
+
+    def test_batch_without_credentials(self):
+        """Test calls of an anonymous batch are anonymous"""
+        self.client.credentials()
+        payload = {'requests': [{'method': 'GET', 'path': ME_URL}]}
+
+        res = self.client.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['responses'][0]['status'],
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+    # Threads cannot write to the cache and throttle tables of the test
+    # transaction
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }}, REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {}})
+    def test_batch_concurrent_reads(self):
+        """Test read only calls can be run concurrently"""
+        payload = {
+            'concurrent': True,
+            'requests': [{'method': 'GET', 'path': ME_URL}] * 3,
+        }
+
+        res = self.client.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(
+            [call['status'] for call in res.data['responses']],
+            [status.HTTP_200_OK] * 3,
+        )
+
+    def test_batch_rejects_unknown_and_nested_paths(self):
+        """Test only API routes other than the batch itself are allowed"""
+        payload = {'requests': [
+            {'method': 'GET', 'path': '/api/unknown/'},
+            {'method': 'POST', 'path': BATCH_URL},
+            {'method': 'GET', 'path': '/admin/'},
+        ]}
+
+        res = self.client.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(
+            [call['status'] for call in res.data['responses']],
+            [404, 400, 400],
+        )
+
+    @override_settings(BATCH_MAX_SUBREQUESTS=2)
+    def test_batch_size_limited(self):
+        """Test batches over the limit are rejected"""
+        payload = {'requests': [{'method': 'GET', 'path': ME_URL}] * 3}
+
+        res = self.client.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,12 @@
+"""
+Urls for batch app
+"""
+from django.urls import path
+
+from batch import views
+
+app_name = 'batch'
+
+urlpatterns = [
+    path('', views.BatchView.as_view(), name='batch'),
+]
@@ -0,0 +1,143 @@
+"""
+Views for the batch API
+"""
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import Resolver404, resolve, reverse
+from rest_framework import authentication, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from batch.serializers import BatchSerializer
+
+logger = logging.getLogger(__name__)
+
+# Request headers carried over from the batch request to each call
+FORWARDED_HEADERS = (
+    'HTTP_HOST',
+    'HTTP_ACCEPT_LANGUAGE',
+    'HTTP_USER_AGENT',
+    'HTTP_X_FORWARDED_FOR',
+    'HTTP_X_FORWARDED_PROTO',
+)
+
+SAFE_METHODS = ('GET',)
+
+
+class BatchView(APIView):
+    """Run several API calls in one request.
+
+    The batch request is authenticated once and every call is dispatched
+    in-process as that user, skipping the HTTP, middleware and token
+    lookup cost of separate requests. Read-only batches can ask for their
+    calls to run concurrently.
+    """
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.AllowAny]
+    serializer_class = BatchSerializer
+
+    def post(self, request):
+        """Dispatch the calls and return their responses in order."""
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        calls = serializer.validated_data['requests']
+
+        concurrent = serializer.validated_data['concurrent'] and all(
+            call['method'] in SAFE_METHODS for call in calls)
+        if concurrent and len(calls) > 1:
+            workers = min(len(calls), settings.BATCH_MAX_WORKERS)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                responses = list(executor.map(
+                    lambda call: self._dispatch_in_thread(request, call),
+                    calls,
+                ))
+        else:
+            responses = [self._dispatch(request, call) for call in calls]
+
+        return Response({'responses': responses})
+
+    def _dispatch_in_thread(self, request, call):
+        try:
+            return self._dispatch(request, call)
+        finally:
+            connections.close_all()
+
+    def _dispatch(self, request, call):
+        """Run one call and return its status, headers and body."""
+        url = urlsplit(call['path'])
+        if not url.path.startswith('/api/') or \
+                url.path == reverse('batch:batch'):
+            return self._error(400, 'Path cannot be batched.')
+        try:
+            match = resolve(url.path, getattr(request, 'urlconf', None))
+        except Resolver404:
+            return self._error(404, 'Not found.')
+
+        sub_request = self._build_request(request, call, url)
+        try:
+            response = match.func(sub_request, *match.args, **match.kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        except Exception:
+            logger.exception('Batched call to %s failed', url.path)
+            return self._error(500, 'Server error.')
+
+        return {
+            'status': response.status_code,
+            'headers': {
+                name: value for name, value in response.items()
+                if name.lower() != 'vary'
+            },
+            'body': self._decode(response),
+        }
+
+    def _build_request(self, request, call, url):
+        """Create the request object passed to the called view."""
+        body = b''
+        if 'body' in call:
+            body = json.dumps(call['body']).encode()
+
+        environ = {
+            key: value for key, value in request.META.items()
+            if not key.startswith('HTTP_') or key in FORWARDED_HEADERS
+        }
+        environ.update({
+            'REQUEST_METHOD': call['method'],
+            'PATH_INFO': url.path,
+            'SCRIPT_NAME': '',
+            'QUERY_STRING': url.query,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body),
+        })
+        sub_request = WSGIRequest(environ)
+        if request.user.is_authenticated:
+            # Reuse the batch request's credentials instead of
+            # authenticating every call again.
+            sub_request._force_auth_user = request.user
+            sub_request._force_auth_token = request.auth
+        return sub_request
+
+    @staticmethod
+    def _decode(response):
+        content = getattr(response, 'content', b'')
+        if not content:
+            return None
+        if response.get('Content-Type', '').startswith('application/json'):
+            return json.loads(content)
+        return content.decode(response.charset)
+
+    @staticmethod
+    def _error(status_code, detail):
+        return {
+            'status': status_code,
+            'headers': {},
+            'body': {'detail': detail},
+        }
@@ -6,12 +6,53 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext as _
 
-from core import models
+from core import audit, models
+from core.deletion import schedule_user_deletion
+from core.paginators import EstimatedCountPaginator
 
 
-class UserAdmin(BaseUserAdmin):
+class AuditedAdminMixin:
+    """Record changes made through the admin in the audit log"""
+
+    def save_model(self, request, obj, form, change):
+        before = None
+        if change:
+            before = audit.capture(type(obj)._default_manager.get(pk=obj.pk))
+        super().save_model(request, obj, form, change)
+        audit.record(
+            request.user,
+            models.AuditEvent.ACTION_UPDATED if change
+            else models.AuditEvent.ACTION_CREATED,
+            obj, before, source='admin',
+        )
+
+    def delete_model(self, request, obj):
+        pk = obj.pk
+        super().delete_model(request, obj)
+        obj.pk = pk
+        self.audit_deleted(request, [obj])
+
+    def delete_queryset(self, request, queryset):
+        objs = list(queryset)
+        super().delete_queryset(request, queryset)
+        self.audit_deleted(request, objs)
+
+    def audit_deleted(self, request, objs):
+        for obj in objs:
+            audit.record(
+                request.user, models.AuditEvent.ACTION_DELETED, obj,
+                source='admin',
+            )
+
+
+class UserAdmin(AuditedAdminMixin, BaseUserAdmin):
     ordering = ['id']
     list_display = ['email', 'name']
+    list_filter = ('is_active', 'is_staff', 'is_superuser')
+    # Prefix lookups on email are served by the unique index
+    search_fields = ['email__startswith']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Personal Info', {'fields': ('name',)}),
@@ -29,5 +70,104 @@ class UserAdmin(BaseUserAdmin):
     )
     readonly_fields = ('last_login',)
 
+    # Deleting a user goes through the background deletion so the admin
+    # never collects (or lists) every recipe of a large account.
+
+    def get_deleted_objects(self, objs, request):
+        """Summarize the deletion without collecting related objects"""
+        objs = list(objs)
+        to_delete = [str(obj) for obj in objs]
+        model_count = {self.model._meta.verbose_name_plural: len(objs)}
+        return to_delete, model_count, set(), []
+
+    def delete_model(self, request, obj):
+        """Schedule a background deletion of the user"""
+        schedule_user_deletion(obj)
+        self.audit_deleted(request, [obj])
+
+    def delete_queryset(self, request, queryset):
+        """Schedule background deletions of the selected users"""
+        users = list(queryset)
+        for user in users:
+            schedule_user_deletion(user)
+        self.audit_deleted(request, users)
+
+
+class RecipeAdmin(AuditedAdminMixin, admin.ModelAdmin):
+    """Admin for recipes, built to stay usable on very large tables"""
+    ordering = ['-id']
+    list_display = ['id', 'title', 'user', 'time_minutes', 'price']
+    list_select_related = ('user',)
+    # Walk the primary key index only; sorting by other columns would
+    # force a full sort of the table on every page
+    sortable_by = ('id',)
+    search_fields = ['title__startswith', 'user__email__startswith']
+    raw_id_fields = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        """Look up numeric search terms by primary key"""
+        if search_term.strip().isdigit():
+            return queryset.filter(pk=int(search_term)), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+class UserDeletionAdmin(admin.ModelAdmin):
+    """Read only progress of background user deletions"""
+    ordering = ['-id']
+    list_display = [
+        'email', 'status', 'recipes_deleted', 'recipes_total',
+        'created_at', 'finished_at',
+    ]
+    list_filter = ('status',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class JobAdmin(admin.ModelAdmin):
+    """Background jobs, mostly for inspecting failures"""
+    ordering = ['-id']
+    list_display = [
+        'id', 'name', 'status', 'attempts', 'run_at', 'finished_at',
+    ]
+    list_filter = ('status',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+
+class AuditEventAdmin(admin.ModelAdmin):
+    """Read only view of the audit log"""
+    ordering = ['-created_at']
+    list_display = [
+        'created_at', 'actor', 'action', 'object_type', 'object_id',
+        'source',
+    ]
+    list_filter = ('action', 'object_type', 'source')
+    list_select_related = ('actor',)
+    sortable_by = ('created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Recipe)
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.UserDeletion, UserDeletionAdmin)
+admin.site.register(models.Job, JobAdmin)
+admin.site.register(models.AuditEvent, AuditEventAdmin)
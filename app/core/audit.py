@@ -0,0 +1,177 @@
+"""
+Buffered audit log of recipe and user changes
+
+Changes are recorded once their transaction commits into an in-process
+buffer, which is written with one bulk insert when it holds
+AUDIT_BUFFER_SIZE events or its oldest event is AUDIT_FLUSH_INTERVAL
+seconds old. The first event of each process starts a background thread
+flushing on the time threshold and registers a flush at exit, so servers,
+commands and job workers alike lose nothing; gunicorn workers also flush
+in worker_exit.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+
+from core.models import AuditEvent
+
+logger = logging.getLogger(__name__)
+
+AUDITED_FIELDS = {
+    'recipe': (
+        'user', 'title', 'time_minutes', 'price', 'link', 'description',
+        'image',
+    ),
+    'user': ('email', 'name', 'password', 'is_active', 'is_staff',
+             'is_superuser'),
+}
+# Only the fact that these changed is recorded
+REDACTED_FIELDS = {'password'}
+
+_encoder = DjangoJSONEncoder()
+
+
+def _plain(value):
+    """Return a value as stored in the JSON changes column"""
+    if isinstance(value, FieldFile):
+        return value.name or None
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return _encoder.default(value)
+
+
+def capture(instance):
+    """Return the audited field values of a recipe or user"""
+    return {
+        name: _plain(instance._meta.get_field(name).value_from_object(
+            instance))
+        for name in AUDITED_FIELDS[instance._meta.model_name]
+    }
+
+
+def _shown(name, value):
+    return '***' if name in REDACTED_FIELDS and value is not None else value
+
+
+def diff(before, after):
+    """Return {field: [old, new]} for the fields that differ"""
+    return {
+        name: [_shown(name, before.get(name)), _shown(name, value)]
+        for name, value in after.items()
+        if before.get(name) != value
+    }
+
+
+def record(actor, action, instance, before=None, source='api'):
+    """Queue an audit event to be written after the transaction commits
+
+    ``before`` is the capture() of the instance prior to an update.
+    """
+    if action == AuditEvent.ACTION_DELETED:
+        changes = {}
+    else:
+        after = capture(instance)
+        if action == AuditEvent.ACTION_UPDATED:
+            changes = diff(before or {}, after)
+            if not changes:
+                return
+        else:
+            changes = diff({}, after)
+    event = AuditEvent(
+        created_at=timezone.now(),
+        actor_id=actor.pk if actor is not None and actor.is_authenticated
+        else None,
+        action=action,
+        object_type=instance._meta.model_name,
+        object_id=instance.pk,
+        changes=changes,
+        source=source,
+    )
+    transaction.on_commit(lambda: buffer.add(event))
+
+
+class AuditBuffer:
+    """Events waiting to be written, shared by the threads of a process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = []
+        self._oldest = None
+        self._flusher_pid = None
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, event):
+        if settings.AUDIT_BACKGROUND_FLUSH and \
+                self._flusher_pid != os.getpid():
+            self.start()
+        with self._lock:
+            if not self._events:
+                self._oldest = time.monotonic()
+            self._events.append(event)
+            due = self._due()
+        if due:
+            self.flush()
+
+    def _due(self):
+        return bool(self._events) and (
+            len(self._events) >= settings.AUDIT_BUFFER_SIZE or
+            time.monotonic() - self._oldest >= settings.AUDIT_FLUSH_INTERVAL
+        )
+
+    def flush(self):
+        """Write all buffered events, returning how many were written"""
+        with self._lock:
+            events, self._events = self._events, []
+            self._oldest = None
+        if not events:
+            return 0
+        try:
+            AuditEvent.objects.bulk_create(
+                events, batch_size=settings.AUDIT_BUFFER_SIZE)
+        except Exception:
+            logger.exception('Writing %d audit events failed', len(events))
+            with self._lock:
+                # Retry with the next flush, dropping the oldest events
+                # rather than growing without bound
+                self._events = (events + self._events)[
+                    -settings.AUDIT_BUFFER_MAX:]
+                self._oldest = time.monotonic()
+            return 0
+        return len(events)
+
+    def start(self):
+        """Flush on the time threshold from a thread, and at exit
+
+        Runs once per process, so a forked child starts its own thread.
+        """
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(
+            target=self._run, name='audit-flusher', daemon=True).start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(settings.AUDIT_FLUSH_INTERVAL / 2)
+            with self._lock:
+                due = self._due()
+            if due:
+                try:
+                    self.flush()
+                finally:
+                    connection.close()
+
+
+buffer = AuditBuffer()
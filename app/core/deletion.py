@@ -0,0 +1,115 @@
+"""
+Background deletion of user accounts
+"""
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from core.jobs import task
+from core.models import (
+    Recipe, RecipeMinHashBand, RecipeStats, UserDeletion)
+
+logger = logging.getLogger(__name__)
+
+# Tables whose foreign key to the user follows USER_DELETION_DB_CASCADE
+DB_CASCADE_TABLES = ('core_recipe', 'core_recipeminhashband')
+
+
+def schedule_user_deletion(user):
+    """Deactivate a user now and remove their data in the background
+
+    The account stops authenticating as soon as this returns; recipes are
+    then deleted in bounded batches so no single transaction has to load
+    or lock all of them.
+    """
+    with transaction.atomic():
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        Token.objects.filter(user=user).delete()
+
+        stats = RecipeStats.objects.filter(user=user).first()
+        deletion = UserDeletion.objects.create(
+            user=user,
+            email=user.email,
+            recipes_total=stats.recipe_count if stats else 0,
+        )
+        run_user_deletion.delay(deletion.pk)
+
+    return deletion
+
+
+@task
+def run_user_deletion(deletion_id, batch_size=None):
+    """Delete a user's recipes in batches, then the user itself"""
+    batch_size = batch_size or settings.USER_DELETION_BATCH_SIZE
+    deletions = UserDeletion.objects.filter(pk=deletion_id)
+    deletion = deletions.get()
+    if deletion.status == UserDeletion.STATUS_DONE:
+        return deletion
+
+    deletions.update(status=UserDeletion.STATUS_RUNNING)
+    try:
+        if deletion.user_id is not None:
+            # The summary is going away anyway; dropping it first keeps
+            # the per-recipe statistics signal handlers cheap.
+            RecipeStats.objects.filter(user_id=deletion.user_id).delete()
+            _delete_recipes(deletions, deletion.user_id, batch_size)
+            with transaction.atomic():
+                # Bands of recipes written since the last batch
+                RecipeMinHashBand.objects.filter(
+                    user_id=deletion.user_id).delete()
+                get_user_model().objects.filter(
+                    pk=deletion.user_id).delete()
+    except Exception as exc:
+        logger.exception('Deletion %s failed', deletion_id)
+        deletions.update(status=UserDeletion.STATUS_FAILED, error=str(exc))
+        raise
+
+    deletions.update(
+        status=UserDeletion.STATUS_DONE,
+        error='',
+        finished_at=timezone.now(),
+    )
+    return deletions.get()
+
+
+def _delete_recipes(deletions, user_id, batch_size):
+    """Delete the recipes of a user, one bounded transaction per batch"""
+    recipes = Recipe.objects.filter(user_id=user_id).order_by('id')
+    while True:
+        with transaction.atomic():
+            ids = list(recipes.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return
+            Recipe.objects.filter(pk__in=ids).delete()
+            deletions.update(recipes_deleted=F('recipes_deleted') + len(ids))
+
+
+def set_db_cascade(enabled):
+    """Recreate the foreign keys of DB_CASCADE_TABLES to the user table
+
+    With ``enabled`` they get ON DELETE CASCADE, so deleting a user row
+    in the database removes its recipes and bands without Django signals.
+    PostgreSQL only.
+    """
+    on_delete = 'ON DELETE CASCADE' if enabled else ''
+    with transaction.atomic(), connection.cursor() as cursor:
+        for table in DB_CASCADE_TABLES:
+            cursor.execute(
+                "SELECT conname FROM pg_constraint "
+                "WHERE conrelid = %s::regclass "
+                "AND confrelid = 'core_user'::regclass AND contype = 'f'",
+                [table],
+            )
+            for (name,) in cursor.fetchall():
+                cursor.execute(
+                    f'ALTER TABLE {table} DROP CONSTRAINT {name}, '
+                    f'ADD CONSTRAINT {name} FOREIGN KEY (user_id) '
+                    f'REFERENCES core_user (id) {on_delete} '
+                    f'DEFERRABLE INITIALLY DEFERRED'
+                )
@@ -0,0 +1,205 @@
+"""
+Near-duplicate recipe detection with MinHash and locality-sensitive hashing
+
+Every recipe gets a MinHash signature of the character shingles of its
+title and description, stored as raw bytes on the recipe. The signature is
+cut into bands and each band is hashed into a RecipeMinHashBand row, so
+recipes sharing any bucket are found through the (user, band, hash) index
+instead of comparing every pair. Candidates are then confirmed by the share
+of equal signature slots, an estimate of their Jaccard similarity.
+"""
+import hashlib
+import re
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+
+from core.models import Recipe, RecipeMinHashBand
+
+PERMUTATIONS = 64
+BANDS = 16
+ROWS = PERMUTATIONS // BANDS
+SHINGLE_SIZE = 5
+PRIME = (1 << 31) - 1
+DTYPE = np.dtype('<u4')
+# Rows compared at a time when confirming a bucket's candidates
+BLOCK = 256
+
+# Fixed seed: signatures must match across processes and releases
+_random = np.random.RandomState(1234567)
+_A = _random.randint(1, PRIME, PERMUTATIONS).astype(np.uint64)
+_B = _random.randint(0, PRIME, PERMUTATIONS).astype(np.uint64)
+
+WORD_RE = re.compile(r'\w+')
+
+
+def shingles(text):
+    """Return the character shingles of the normalized text"""
+    text = ' '.join(WORD_RE.findall(text.lower()))
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {
+        text[start:start + SHINGLE_SIZE]
+        for start in range(len(text) - SHINGLE_SIZE + 1)
+    }
+
+
+def signature(title, description):
+    """Return the MinHash signature of a recipe as bytes
+
+    Recipes without any text get an empty signature and never match.
+    """
+    tokens = shingles(f'{title} {description or ""}')
+    if not tokens:
+        return b''
+    hashes = np.fromiter(
+        (int.from_bytes(
+            hashlib.blake2b(token.encode(), digest_size=4).digest(), 'little')
+         for token in tokens),
+        dtype=np.uint64, count=len(tokens),
+    ) % PRIME
+    values = (hashes[:, None] * _A + _B) % PRIME
+    return values.min(axis=0).astype(DTYPE).tobytes()
+
+
+def band_hashes(minhash):
+    """Return the bucket hash of every band of a signature"""
+    if not minhash:
+        return []
+    minhash = bytes(minhash)
+    width = ROWS * DTYPE.itemsize
+    return [
+        int.from_bytes(hashlib.blake2b(
+            minhash[band * width:(band + 1) * width], digest_size=8,
+        ).digest(), 'little', signed=True)
+        for band in range(BANDS)
+    ]
+
+
+def band_rows(recipe_id, user_id, minhash):
+    """Return unsaved RecipeMinHashBand rows for a signature"""
+    return [
+        RecipeMinHashBand(
+            recipe_id=recipe_id, user_id=user_id, band=band, hash=value)
+        for band, value in enumerate(band_hashes(minhash))
+    ]
+
+
+def compute_signatures(rows):
+    """Return (id, user_id, signature) for (id, user_id, title, description)
+
+    Pure computation so it can run in a separate process.
+    """
+    return [
+        (pk, user_id, signature(title, description))
+        for pk, user_id, title, description in rows
+    ]
+
+
+def save_signatures(signatures):
+    """Store signatures computed outside of Recipe.save and index them"""
+    Recipe.objects.bulk_update(
+        [Recipe(pk=pk, minhash=minhash) for pk, _, minhash in signatures],
+        ['minhash'],
+    )
+    RecipeMinHashBand.objects.filter(
+        recipe_id__in=[pk for pk, _, _ in signatures]).delete()
+    RecipeMinHashBand.objects.bulk_create([
+        band
+        for pk, user_id, minhash in signatures
+        for band in band_rows(pk, user_id, minhash)
+    ])
+
+
+def recipe_saved(recipe, previous):
+    """Reindex a saved recipe whose signature or owner changed"""
+    if previous is not None:
+        unchanged = (
+            previous['user_id'] == recipe.user_id and
+            previous['minhash'] is not None and
+            bytes(previous['minhash']) == bytes(recipe.minhash or b'')
+        )
+        if unchanged:
+            return
+        RecipeMinHashBand.objects.filter(recipe_id=recipe.pk).delete()
+    RecipeMinHashBand.objects.bulk_create(
+        band_rows(recipe.pk, recipe.user_id, recipe.minhash))
+
+
+def colliding_bands(queryset=None):
+    """Return bands that share their bucket with another recipe"""
+    queryset = RecipeMinHashBand.objects.all() if queryset is None \
+        else queryset
+    others = RecipeMinHashBand.objects.filter(
+        user_id=OuterRef('user_id'),
+        band=OuterRef('band'),
+        hash=OuterRef('hash'),
+    ).exclude(recipe_id=OuterRef('recipe_id'))
+    return queryset.filter(Exists(others))
+
+
+def verify_groups(buckets, signatures, threshold):
+    """Group candidate recipes whose estimated similarity reaches threshold
+
+    ``buckets`` are lists of recipe ids sharing an LSH bucket and
+    ``signatures`` maps those ids to signature bytes. Returns groups of at
+    least two ids, each sorted, ordered by their lowest id. Pure
+    computation so it can run in a separate process.
+    """
+    parent = {}
+
+    def find(pk):
+        while parent.setdefault(pk, pk) != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    for bucket in buckets:
+        ids = sorted(pk for pk in set(bucket) if signatures.get(pk))
+        if len(ids) < 2:
+            continue
+        matrix = np.frombuffer(
+            b''.join(bytes(signatures[pk]) for pk in ids), dtype=DTYPE,
+        ).reshape(len(ids), PERMUTATIONS)
+        # Share of equal slots between a block of rows and every row
+        for start in range(0, len(ids), BLOCK):
+            similarity = (
+                matrix[start:start + BLOCK, None, :] == matrix[None, :, :]
+            ).mean(axis=2)
+            for first, second in zip(*np.nonzero(similarity >= threshold)):
+                first += start
+                if first < second:
+                    parent[find(ids[second])] = find(ids[first])
+
+    groups = defaultdict(list)
+    for pk in parent:
+        groups[find(pk)].append(pk)
+    return sorted(
+        (sorted(group) for group in groups.values() if len(group) > 1),
+        key=lambda group: group[0],
+    )
+
+
+def buckets_from_rows(rows):
+    """Turn (..., band, hash, recipe_id) rows into lists of bucket members"""
+    buckets = defaultdict(list)
+    for *bucket, recipe_id in rows:
+        buckets[tuple(bucket)].append(recipe_id)
+    return list(buckets.values())
+
+
+def duplicate_groups(user, threshold=None):
+    """Return groups of ids of a user's near-identical recipes"""
+    threshold = threshold or settings.RECIPE_DUPLICATE_THRESHOLD
+    rows = colliding_bands(
+        RecipeMinHashBand.objects.filter(user=user),
+    ).values_list('band', 'hash', 'recipe_id')
+    buckets = buckets_from_rows(rows)
+    ids = {pk for bucket in buckets for pk in bucket}
+    signatures = dict(
+        Recipe.objects.filter(user=user, pk__in=ids)
+        .values_list('id', 'minhash')
+    )
+    return verify_groups(buckets, signatures, threshold)
@@ -0,0 +1,150 @@
+"""
+Recipe change notifications for streaming clients
+
+Recipe writes publish a small JSON payload on a PostgreSQL NOTIFY channel;
+the notification is delivered when the writing transaction commits. Every
+ASGI worker process keeps one LISTEN connection and fans each payload out
+to the in-memory queues of the owner's subscribers, so idle clients cost
+a queue and a coroutine rather than a database connection.
+
+On other databases payloads are handed to the hub of the current process
+after commit, which is enough for a single development server.
+"""
+import asyncio
+import json
+import logging
+
+import psycopg2
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CREATED = 'created'
+UPDATED = 'updated'
+DELETED = 'deleted'
+# Sent when events may have been lost; clients should refetch
+RESYNC = 'resync'
+
+
+def publish(event, recipe):
+    """Notify subscribers of the recipe owner once the change commits"""
+    payload = json.dumps(
+        {'event': event, 'id': recipe.pk, 'user': recipe.user_id},
+        separators=(',', ':'),
+    )
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, %s)',
+                [settings.RECIPE_EVENTS_CHANNEL, payload],
+            )
+    else:
+        transaction.on_commit(lambda: hub.dispatch_threadsafe(payload))
+
+
+class Hub:
+    """Fan payloads out to the subscribers of one worker process"""
+
+    def __init__(self):
+        self.subscribers = {}
+        self.loop = None
+        self._listener = None
+
+    def subscribe(self, user_id):
+        """Return a queue receiving the events of a user's recipes"""
+        self.loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=settings.RECIPE_EVENTS_QUEUE_SIZE)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        if connections['default'].vendor == 'postgresql' and (
+                self._listener is None or self._listener.done()):
+            self._listener = self.loop.create_task(self._listen())
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self.subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+    def dispatch(self, payload):
+        """Queue a JSON payload for every subscriber of its user"""
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning('Ignoring malformed recipe event %r', payload)
+            return
+        for queue in self.subscribers.get(event.get('user'), ()):
+            self._put(queue, event)
+
+    def dispatch_threadsafe(self, payload):
+        """Dispatch from a thread other than the event loop's"""
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.dispatch, payload)
+
+    def resync(self):
+        """Tell every subscriber that events may have been missed"""
+        for queues in self.subscribers.values():
+            for queue in queues:
+                self._put(queue, {'event': RESYNC})
+
+    def _put(self, queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A slow client: drop its backlog and have it refetch
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({'event': RESYNC})
+
+    async def _listen(self):
+        """Keep one LISTEN connection open while there are subscribers"""
+        delay = 1
+        reconnecting = False
+        while self.subscribers:
+            try:
+                conn = await self.loop.run_in_executor(None, self._connect)
+            except Exception:
+                logger.exception('Recipe event listener failed to connect')
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+                continue
+            delay = 1
+            lost = self.loop.create_future()
+            self.loop.add_reader(conn, self._readable, conn, lost)
+            if reconnecting:
+                # Anything sent while disconnected was missed
+                self.resync()
+            reconnecting = True
+            try:
+                while self.subscribers and not lost.done():
+                    await asyncio.wait(
+                        [lost], timeout=settings.RECIPE_EVENTS_KEEPALIVE)
+            finally:
+                self.loop.remove_reader(conn)
+                conn.close()
+
+    def _connect(self):
+        params = connections['default'].get_connection_params()
+        conn = psycopg2.connect(**params)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f'LISTEN "{settings.RECIPE_EVENTS_CHANNEL}"')
+        return conn
+
+    def _readable(self, conn, lost):
+        try:
+            conn.poll()
+        except Exception:
+            logger.exception('Recipe event listener lost its connection')
+            if not lost.done():
+                lost.set_result(None)
+            return
+        while conn.notifies:
+            self.dispatch(conn.notifies.pop(0).payload)
+
+
+hub = Hub()
@@ -0,0 +1,108 @@
+"""
+Idempotency-Key support for create endpoints
+
+Clients retrying a POST send the same Idempotency-Key header. The first
+response for a (view, user, key) is kept in IDEMPOTENCY_CACHE, shared by
+all worker processes, for IDEMPOTENCY_TTL seconds and replayed to retries
+without running the create again. While the first request is still
+running, duplicates get 409 instead of executing concurrently. A key
+reused with a different body gets 422.
+"""
+import hashlib
+import hmac
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.singleflight import CacheLock
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+
+
+def _cache():
+    return caches[settings.IDEMPOTENCY_CACHE]
+
+
+def fingerprint(request):
+    """Return a keyed hash of the request body the key was first used with
+
+    Bodies may hold passwords, so a plain hash kept in the cache could be
+    cracked offline; the HMAC cannot without SECRET_KEY.
+    """
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hmac.new(
+        settings.SECRET_KEY.encode(), body.encode(), hashlib.sha256,
+    ).hexdigest()
+
+
+class IdempotentCreateMixin:
+    """Make ``create`` of a DRF view honour the Idempotency-Key header"""
+
+    def create(self, request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'detail': 'Invalid Idempotency-Key header.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        cache_key = self.idempotency_cache_key(request, key)
+        body = fingerprint(request)
+        stored = _cache().get(cache_key)
+        if stored is not None:
+            return self._replay(stored, body)
+
+        lock = CacheLock(
+            cache_key, settings.IDEMPOTENCY_LOCK_TIMEOUT,
+            cache=settings.IDEMPOTENCY_CACHE,
+        )
+        if not lock.acquire():
+            return Response(
+                {'detail': 'A request with this Idempotency-Key is in '
+                           'progress.'},
+                status=status.HTTP_409_CONFLICT,
+            )
+        try:
+            # The first request may have finished while we were checking
+            stored = _cache().get(cache_key)
+            if stored is not None:
+                return self._replay(stored, body)
+            response = super().create(request, *args, **kwargs)
+            # Server errors may succeed on retry and are not kept
+            if response.status_code < 500:
+                _cache().set(cache_key, {
+                    'fingerprint': body,
+                    'status': response.status_code,
+                    'data': response.data,
+                    'headers': dict(response.items()),
+                }, settings.IDEMPOTENCY_TTL)
+            return response
+        finally:
+            lock.release()
+
+    def idempotency_cache_key(self, request, key):
+        """Scope keys by view and user so clients cannot see each other's"""
+        user = request.user.pk if request.user.is_authenticated else 'anon'
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return f'idempotency:{type(self).__name__}:{user}:{digest}'
+
+    def _replay(self, stored, body):
+        if stored['fingerprint'] != body:
+            return Response(
+                {'detail': 'Idempotency-Key was used with a different '
+                           'request body.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        headers = {
+            name: value for name, value in stored['headers'].items()
+            if name.lower() not in ('content-type', 'content-length')
+        }
+        headers['Idempotent-Replayed'] = 'true'
+        return Response(stored['data'], status=stored['status'],
+                        headers=headers)
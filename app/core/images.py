@@ -0,0 +1,33 @@
+"""
+Thumbnail rendering
+
+Kept free of Django imports so it can run in freshly spawned worker
+processes without setting up the project.
+"""
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+THUMBNAIL_FORMAT = 'JPEG'
+THUMBNAIL_EXTENSION = 'jpg'
+
+
+def render_thumbnails(source, sizes, quality=85):
+    """Return {size: JPEG bytes} fitting the image into size x size boxes
+
+    ``source`` is a file path or the image bytes.
+    """
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+    with Image.open(source) as image:
+        # JPEGs can be decoded at a fraction of their size directly
+        image.draft('RGB', (max(sizes), max(sizes)))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        thumbnails = {}
+        for size in sorted(sizes, reverse=True):
+            image.thumbnail((size, size), Image.LANCZOS)
+            output = BytesIO()
+            image.save(
+                output, THUMBNAIL_FORMAT, quality=quality, optimize=True)
+            thumbnails[size] = output.getvalue()
+    return thumbnails
@@ -0,0 +1,198 @@
+"""
+Database backed background jobs
+
+Jobs are rows in the core_job table. Workers claim them with
+``SELECT ... FOR UPDATE SKIP LOCKED`` so any number of workers can poll the
+same table without blocking each other or running a job twice.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.metrics import Metrics
+from core.models import Job
+
+logger = logging.getLogger(__name__)
+
+_tasks = {}
+
+
+def task(func=None, *, max_attempts=None):
+    """Register a function so it can be run as a background job
+
+    Only registered functions can be executed by a worker. The decorated
+    function gains a ``delay(*args, **kwargs)`` method that enqueues it.
+    """
+    def register(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+        _tasks[name] = func
+        func.job_name = name
+        func.delay = lambda *args, **kwargs: enqueue(
+            name, args=args, kwargs=kwargs, max_attempts=max_attempts)
+        return func
+
+    if func is None:
+        return register
+    return register(func)
+
+
+def get_task(name):
+    """Return the registered function for a job name"""
+    if name not in _tasks:
+        # Importing the module runs the @task decorator
+        try:
+            import_string(name)
+        except ImportError:
+            pass
+    if name not in _tasks:
+        raise LookupError(f'{name} is not a registered task')
+    return _tasks[name]
+
+
+def enqueue(name, args=(), kwargs=None, run_at=None, max_attempts=None):
+    """Queue a registered task to run in a worker"""
+    name = getattr(name, 'job_name', name)
+    get_task(name)
+    return Job.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs or {},
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def claim(worker_id, limit=1):
+    """Lock and return up to ``limit`` jobs that are due
+
+    Jobs still marked running after JOB_LOCK_TIMEOUT seconds belong to a
+    worker that died and are claimed again.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Job.STATUS_QUEUED, run_at__lte=now) |
+                Q(status=Job.STATUS_RUNNING, locked_at__lt=stale)
+            )
+            .order_by('run_at', 'id')[:limit]
+        )
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=Job.STATUS_RUNNING,
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+    for job in jobs:
+        job.status = Job.STATUS_RUNNING
+        job.locked_by = worker_id
+        job.locked_at = now
+        job.attempts += 1
+    metrics.incr('claimed', len(jobs))
+    return jobs
+
+
+def backoff(attempts):
+    """Return the delay in seconds before retrying a failed attempt"""
+    delay = settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1)
+    delay = min(delay, settings.JOB_RETRY_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def run(job):
+    """Execute a claimed job and record the outcome"""
+    jobs = Job.objects.filter(pk=job.pk)
+    started = time.monotonic()
+    try:
+        get_task(job.name)(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            logger.warning('Job %s failed, retrying', job.pk)
+            jobs.update(
+                status=Job.STATUS_QUEUED,
+                run_at=timezone.now() + timedelta(
+                    seconds=backoff(job.attempts)),
+                locked_by='',
+                locked_at=None,
+                last_error=error,
+            )
+            metrics.incr('retried')
+        else:
+            logger.error('Job %s failed permanently', job.pk)
+            jobs.update(
+                status=Job.STATUS_FAILED,
+                finished_at=timezone.now(),
+                last_error=error,
+            )
+            metrics.incr('failed')
+        return False
+    finally:
+        metrics.incr('seconds', time.monotonic() - started)
+
+    jobs.update(status=Job.STATUS_DONE, finished_at=timezone.now())
+    metrics.incr('succeeded')
+    return True
+
+
+# Job counters of the current process
+metrics = Metrics()
+
+
+def queue_stats():
+    """Return job counts by status and the age of the oldest due job"""
+    counts = {
+        row['status']: row['count'] for row in
+        Job.objects.order_by().values('status').annotate(count=Count('id'))
+    }
+    oldest = Job.objects.filter(
+        status=Job.STATUS_QUEUED, run_at__lte=timezone.now(),
+    ).aggregate(oldest=Min('run_at'))['oldest']
+    return {
+        'counts': counts,
+        'oldest_due_seconds': (
+            (timezone.now() - oldest).total_seconds() if oldest else 0
+        ),
+    }
+
+
+class Worker:
+    """Poll the job table and run jobs until told to stop"""
+
+    def __init__(self, name=None, poll_interval=1.0, batch_size=1,
+                 burst=False):
+        self.name = name or (
+            f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}')
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.burst = burst
+        self.stopping = threading.Event()
+
+    def run(self):
+        """Run jobs until stopped, or until the queue is empty in burst mode"""
+        while not self.stopping.is_set():
+            close_old_connections()
+            jobs = claim(self.name, self.batch_size)
+            for job in jobs:
+                run(job)
+            if not jobs:
+                if self.burst:
+                    break
+                self.stopping.wait(self.poll_interval)
+
+    def stop(self):
+        self.stopping.set()
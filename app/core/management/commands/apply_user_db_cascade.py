@@ -0,0 +1,26 @@
+"""
+Apply USER_DELETION_DB_CASCADE to an already migrated database
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.deletion import set_db_cascade
+
+
+class Command(BaseCommand):
+    """Django command to switch the database cascade of user deletes"""
+    help = (
+        'Add or remove ON DELETE CASCADE on the foreign keys of recipes '
+        'and MinHash bands to users, following USER_DELETION_DB_CASCADE'
+    )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        if connection.vendor != 'postgresql':
+            raise CommandError('Database cascades require PostgreSQL.')
+
+        enabled = settings.USER_DELETION_DB_CASCADE
+        set_db_cascade(enabled)
+        self.stdout.write(self.style.SUCCESS(
+            f"Database cascade of user deletes {'on' if enabled else 'off'}"))
@@ -0,0 +1,39 @@
+"""
+Build the memory-mapped index used for similar recipe lookups
+"""
+from django.core.management.base import BaseCommand
+
+from recipe import similarity
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the similar recipe index"""
+    help = (
+        'Write a new version of the similar recipe index, vectorizing only '
+        'recipes added or changed since the previous build'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Vectorize every recipe and recompute term weights',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Recipes loaded and vectorized at a time',
+        )
+        parser.add_argument(
+            '--keep', type=int, default=2,
+            help='Number of index versions kept on disk',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        path, vectorized = similarity.build_index(
+            full=options['full'],
+            chunk_size=options['chunk_size'],
+            keep=max(options['keep'], 1),
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Built {path.name}, vectorized {vectorized} recipes'))
@@ -0,0 +1,101 @@
+"""
+Create the monthly partitions of the audit log ahead of time
+"""
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+TABLE = 'core_auditevent'
+DEFAULT_PARTITION = 'core_auditevent_default'
+
+
+def add_months(month, count):
+    """Return the first day of the month ``count`` months after ``month``"""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+class Command(BaseCommand):
+    """Django command to maintain audit partitions (PostgreSQL only)"""
+    help = (
+        'Create one range partition of the audit log per month, moving '
+        'matching rows out of the default partition, and drop old months'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int, default=3,
+            help='Months after the current one to create partitions for',
+        )
+        parser.add_argument(
+            '--retain-months', type=int, default=None,
+            help='Drop partitions of months older than this many months',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        if connection.vendor != 'postgresql':
+            raise CommandError('Audit partitions require PostgreSQL.')
+
+        existing = self._partitions()
+        current = timezone.now().date().replace(day=1)
+        for offset in range(max(options['months'], 0) + 1):
+            month = add_months(current, offset)
+            if partition_name(month) not in existing:
+                self._create(month)
+
+        if options['retain_months'] is not None:
+            oldest = partition_name(
+                add_months(current, -options['retain_months']))
+            for name in sorted(existing):
+                if name != DEFAULT_PARTITION and name < oldest:
+                    self._drop(name)
+
+    def _partitions(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT c.relname FROM pg_inherits i '
+                'JOIN pg_class c ON c.oid = i.inhrelid '
+                'WHERE i.inhparent = %s::regclass',
+                [TABLE],
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    def _create(self, month):
+        name = partition_name(month)
+        bounds = [month.isoformat(), add_months(month, 1).isoformat()]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE {name} '
+                f'(LIKE {TABLE} INCLUDING DEFAULTS)')
+            # Keep new events of the month out of the default partition
+            # until it no longer covers them
+            cursor.execute(
+                f'LOCK TABLE {DEFAULT_PARTITION} IN SHARE ROW EXCLUSIVE MODE')
+            cursor.execute(
+                f'WITH moved AS ('
+                f'DELETE FROM {DEFAULT_PARTITION} '
+                f'WHERE created_at >= %s AND created_at < %s RETURNING *) '
+                f'INSERT INTO {name} SELECT * FROM moved',
+                bounds,
+            )
+            moved = cursor.rowcount
+            cursor.execute(
+                f'ALTER TABLE {TABLE} ATTACH PARTITION {name} '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                bounds,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {name} ({moved} events moved)'))
+
+    def _drop(self, name):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+            cursor.execute(f'DROP TABLE {name}')
+        self.stdout.write(f'Dropped {name}')
@@ -0,0 +1,40 @@
+"""
+Export recipes into the columnar snapshot used for reporting
+"""
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from recipe import snapshot
+
+
+class Command(BaseCommand):
+    """Django command to export the recipe reporting snapshot"""
+    help = (
+        'Write the recipe columns to memory-mappable files read by the '
+        'recipe report endpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to read from, ideally a replica',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Recipes read per query',
+        )
+        parser.add_argument(
+            '--keep', type=int, default=2,
+            help='Number of snapshots kept on disk',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        path, count = snapshot.export(
+            using=options['database'],
+            chunk_size=options['chunk_size'],
+            keep=max(options['keep'], 1),
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {count} recipes to {path.name}'))
@@ -0,0 +1,145 @@
+"""
+Find near-identical recipes across the whole recipe table
+"""
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import duplicates
+from core.models import Recipe
+
+
+def imap(func, chunks, workers):
+    """Yield func(*chunk) in order, computed by a pool of processes
+
+    Chunks are read lazily and at most two per worker are in flight, so
+    the table is never loaded as a whole. Workers are spawned rather than
+    forked so they never share the parent's database connections.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield func(*chunk)
+        return
+
+    with ProcessPoolExecutor(
+        workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    ) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(func, *chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class Command(BaseCommand):
+    """Django command to report or remove duplicate recipes"""
+    help = (
+        'Compute missing MinHash signatures and list groups of near-'
+        'identical recipes of the same user, in parallel chunks'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Number of processes computing signatures and groups',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Recipes (or LSH bucket rows) handed to a worker at a time',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=None,
+            help='Similarity from which recipes count as duplicates',
+        )
+        parser.add_argument(
+            '--delete', action='store_true',
+            help='Delete every duplicate but the oldest recipe of a group',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        workers = max(options['workers'], 1)
+        chunk_size = options['chunk_size']
+
+        computed = 0
+        for signatures in imap(
+            duplicates.compute_signatures,
+            self._unsigned_chunks(chunk_size), workers,
+        ):
+            with transaction.atomic():
+                duplicates.save_signatures(signatures)
+            computed += len(signatures)
+        if computed:
+            self.stdout.write(f'Computed {computed} missing signatures')
+
+        threshold = (
+            options['threshold'] or settings.RECIPE_DUPLICATE_THRESHOLD)
+        found = removed = 0
+        for groups in imap(
+            duplicates.verify_groups,
+            self._bucket_chunks(chunk_size, threshold), workers,
+        ):
+            for group in groups:
+                found += 1
+                self.stdout.write(
+                    f'Duplicates: {", ".join(str(pk) for pk in group)}')
+            if options['delete'] and groups:
+                with transaction.atomic():
+                    removed += Recipe.objects.filter(
+                        pk__in=[pk for group in groups for pk in group[1:]],
+                    ).delete()[1].get(Recipe._meta.label, 0)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Found {found} groups of duplicate recipes'
+            + (f', deleted {removed} recipes' if options['delete'] else '')
+        ))
+
+    def _unsigned_chunks(self, chunk_size):
+        """Yield chunks of recipes that have no signature yet"""
+        recipes = Recipe.objects.filter(minhash__isnull=True).order_by('id')
+        last_id = 0
+        while True:
+            rows = list(
+                recipes.filter(id__gt=last_id).values_list(
+                    'id', 'user_id', 'title', 'description')[:chunk_size]
+            )
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield (rows,)
+
+    def _bucket_chunks(self, chunk_size, threshold):
+        """Yield shared LSH buckets with their signatures, whole users only"""
+        rows = duplicates.colliding_bands().order_by(
+            'user_id', 'band', 'hash', 'recipe_id',
+        ).values_list('user_id', 'band', 'hash', 'recipe_id')
+
+        chunk = []
+        for row in rows.iterator(chunk_size=chunk_size):
+            if len(chunk) >= chunk_size and row[0] != chunk[-1][0]:
+                yield self._with_signatures(chunk, threshold)
+                chunk = []
+            chunk.append(row)
+        if chunk:
+            yield self._with_signatures(chunk, threshold)
+
+    def _with_signatures(self, rows, threshold):
+        buckets = duplicates.buckets_from_rows(rows)
+        signatures = dict(
+            Recipe.objects.filter(pk__in={row[-1] for row in rows})
+            .values_list('id', 'minhash')
+        )
+        # Plain bytes: database drivers may return memoryviews
+        signatures = {
+            pk: bytes(value) for pk, value in signatures.items() if value}
+        return buckets, signatures, threshold
@@ -0,0 +1,37 @@
+"""
+Report users whose emails only differ in case
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+class Command(BaseCommand):
+    """Django command to list case-insensitive email collisions"""
+    help = 'List emails shared by several users when compared ignoring case'
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        User = get_user_model()
+        collisions = (
+            User.objects.annotate(email_lower=Lower('email'))
+            .values('email_lower')
+            .annotate(count=Count('id'))
+            .filter(count__gt=1)
+            .order_by('email_lower')
+            .values_list('email_lower', flat=True)
+        )
+        found = 0
+        for email in collisions:
+            found += 1
+            users = User.objects.filter_email(email).order_by('id')
+            accounts = ', '.join(
+                f'{user.id}:{user.email}' for user in users)
+            self.stdout.write(f'{email}: {accounts}')
+
+        if found:
+            self.stdout.write(self.style.WARNING(
+                f'{found} emails are used by more than one user'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No email collisions'))
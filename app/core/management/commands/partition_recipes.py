@@ -0,0 +1,122 @@
+"""
+Convert the recipe table into a table hash partitioned on user_id
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from core import partitioning
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    """Django command to partition core_recipe online (PostgreSQL only)"""
+    help = (
+        'Move recipes into a table hash partitioned by user, copying '
+        'existing rows in batches while the application keeps running'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--partitions', type=int, default=16,
+            help='Number of hash partitions',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Range of recipe ids copied per transaction',
+        )
+        parser.add_argument(
+            '--verify-only', action='store_true',
+            help='Only check that per-user queries read one partition',
+        )
+        parser.add_argument(
+            '--drop-old', action='store_true',
+            help='Drop the unpartitioned table kept after the swap',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning requires PostgreSQL.')
+
+        with connection.cursor() as cursor:
+            partitioned = partitioning.is_partitioned(cursor)
+
+        if not partitioned:
+            if options['verify_only']:
+                raise CommandError(f'{partitioning.TABLE} is not partitioned.')
+            self._partition(options['partitions'], options['batch_size'])
+
+        self._verify()
+
+        if options['drop_old']:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DROP TABLE IF EXISTS {partitioning.OLD_TABLE}')
+            self.stdout.write(f'Dropped {partitioning.OLD_TABLE}')
+
+    def _partition(self, partitions, batch_size):
+        with connection.cursor() as cursor:
+            if partitioning.table_exists(cursor, partitioning.NEW_TABLE):
+                raise CommandError(
+                    f'{partitioning.NEW_TABLE} already exists; drop it to '
+                    f'restart an interrupted conversion.'
+                )
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for statement in partitioning.create_table_sql(partitions):
+                cursor.execute(statement)
+            for statement in partitioning.mirror_trigger_sql():
+                cursor.execute(statement)
+        self.stdout.write(
+            f'Created {partitioning.NEW_TABLE} with {partitions} partitions')
+
+        # Rows written from now on reach the new table through the
+        # trigger; everything older is copied range by range.
+        bounds = Recipe.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is not None:
+            start = bounds['low']
+            while start <= bounds['high']:
+                end = start + batch_size
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(partitioning.copy_batch_sql(), [start, end])
+                self.stdout.write(f'Copied recipes with id < {end}')
+                start = end
+
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        with connection.cursor() as cursor:
+            indexes = partitioning.recipe_indexes(cursor)
+            for statement in partitioning.copy_indexes_sql(
+                    indexes, partitions):
+                cursor.execute(statement)
+        self.stdout.write(f'Built {len(indexes)} indexes')
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for statement in partitioning.swap_sql(indexes):
+                cursor.execute(statement)
+        self.stdout.write(self.style.SUCCESS(
+            f'{partitioning.TABLE} is now partitioned; the old table is '
+            f'kept as {partitioning.OLD_TABLE}'
+        ))
+
+    def _verify(self):
+        """Check that a per-user recipe query is pruned to one partition"""
+        user_id = Recipe.objects.values_list('user_id', flat=True).first()
+        queryset = Recipe.objects.filter(user_id=user_id or 1).order_by('-id')
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        relations = partitioning.scanned_relations(plan)
+        if len(relations) != 1:
+            raise CommandError(
+                f'Per-user query reads {len(relations)} tables: '
+                f'{", ".join(sorted(relations))}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Per-user queries read a single table: {relations.pop()}'))
@@ -0,0 +1,32 @@
+"""
+Resume user deletions that did not finish in the background
+"""
+from django.core.management.base import BaseCommand
+
+from core.deletion import run_user_deletion
+from core.models import UserDeletion
+
+
+class Command(BaseCommand):
+    """Django command to run pending, interrupted or failed deletions"""
+    help = 'Run outstanding user deletions in the foreground'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Number of recipes removed per transaction',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        deletions = UserDeletion.objects.exclude(
+            status=UserDeletion.STATUS_DONE,
+        ).order_by('id')
+        for deletion_id in deletions.values_list('id', flat=True):
+            deletion = run_user_deletion(
+                deletion_id, batch_size=options['batch_size'])
+            self.stdout.write(
+                f'Deleted {deletion.email}: '
+                f'{deletion.recipes_deleted} recipes removed'
+            )
+        self.stdout.write(self.style.SUCCESS('User deletions processed'))
@@ -0,0 +1,46 @@
+"""
+Delete shared state that has expired
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.management.base import BaseCommand
+from django.db import connections, router
+from django.utils import timezone
+
+from core.models import ThrottleBucket
+
+
+class Command(BaseCommand):
+    """Django command to keep the throttle and cache tables small"""
+    help = (
+        'Delete token buckets that have refilled and expired rows of '
+        'database caches, which are not culled'
+    )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        deleted, _ = ThrottleBucket.objects.filter(
+            tat__lt=time.time()).delete()
+        self.stdout.write(f'Deleted {deleted} full throttle buckets')
+
+        for alias in settings.CACHES:
+            cache = caches[alias]
+            if isinstance(cache, DatabaseCache):
+                deleted = self._delete_expired(cache)
+                self.stdout.write(
+                    f'Deleted {deleted} expired entries of cache {alias}')
+        self.stdout.write(self.style.SUCCESS('Expired state pruned'))
+
+    def _delete_expired(self, cache):
+        connection = connections[router.db_for_write(cache.cache_model_class)]
+        table = connection.ops.quote_name(cache._table)
+        now = timezone.now().replace(microsecond=0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE expires < %s',
+                [connection.ops.adapt_datetimefield_value(now)],
+            )
+            return cursor.rowcount
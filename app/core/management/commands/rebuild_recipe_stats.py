@@ -0,0 +1,40 @@
+"""
+Rebuild the per-user recipe statistics from the recipe table
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import stats
+
+
+class Command(BaseCommand):
+    """Django command to reconcile RecipeStats with the recipes"""
+    help = 'Recompute per-user recipe statistics in batches of users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of users reconciled per transaction',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        batch_size = options['batch_size']
+        users = get_user_model().objects.order_by('id')
+        last_id = 0
+        total = 0
+        while True:
+            user_ids = list(
+                users.filter(id__gt=last_id)
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+            with transaction.atomic():
+                total += stats.rebuild(user_ids)
+            last_id = user_ids[-1]
+            self.stdout.write(f'Reconciled users up to id {last_id}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt recipe statistics for {total} users'))
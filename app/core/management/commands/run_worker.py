@@ -0,0 +1,131 @@
+"""
+Run background jobs from the job table
+"""
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import jobs
+
+
+def _run_process(options, results):
+    """Entry point of a forked worker process
+
+    The job counters of the process are sent back through ``results`` so
+    the parent can report them.
+    """
+    worker = jobs.Worker(
+        poll_interval=options['poll_interval'],
+        batch_size=options['batch_size'],
+        burst=options['burst'],
+    )
+    signal.signal(signal.SIGTERM, lambda *args: worker.stop())
+    signal.signal(signal.SIGINT, lambda *args: worker.stop())
+    try:
+        worker.run()
+    finally:
+        results.put(jobs.metrics.snapshot())
+
+
+class Command(BaseCommand):
+    """Django command to process queued jobs"""
+    help = 'Run background jobs with a pool of threads or processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Number of jobs run at the same time',
+        )
+        parser.add_argument(
+            '--mode', choices=('thread', 'process'), default='thread',
+            help='Run jobs on threads (I/O bound) or processes (CPU bound)',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to wait when no job is due',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1,
+            help='Jobs claimed per query by each worker',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once there are no more jobs due',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        concurrency = max(1, options['concurrency'])
+        self.stdout.write(
+            f"Starting {concurrency} {options['mode']} worker(s)")
+
+        if options['mode'] == 'process':
+            self._run_processes(concurrency, options)
+        else:
+            self._run_threads(concurrency, options)
+
+        self.stdout.write(f'Processed: {jobs.metrics.snapshot()}')
+        self.stdout.write(f'Queue: {jobs.queue_stats()}')
+        self.stdout.write(self.style.SUCCESS('Worker stopped'))
+
+    def _run_threads(self, concurrency, options):
+        workers = [
+            jobs.Worker(
+                poll_interval=options['poll_interval'],
+                batch_size=options['batch_size'],
+                burst=options['burst'],
+            )
+            for _ in range(concurrency)
+        ]
+
+        def stop(*args):
+            for worker in workers:
+                worker.stop()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        if concurrency == 1:
+            workers[0].run()
+            return
+
+        threads = [threading.Thread(target=self._run_thread, args=(worker,))
+                   for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    @staticmethod
+    def _run_thread(worker):
+        try:
+            worker.run()
+        finally:
+            connections.close_all()
+
+    def _run_processes(self, concurrency, options):
+        # Children must not inherit the parent's database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.SimpleQueue()
+        processes = [
+            context.Process(target=_run_process, args=(options, results))
+            for _ in range(concurrency)
+        ]
+        for process in processes:
+            process.start()
+
+        def stop(*args):
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for process in processes:
+            process.join()
+        while not results.empty():
+            jobs.metrics.merge(results.get())
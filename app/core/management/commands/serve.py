@@ -0,0 +1,111 @@
+"""
+Serve the project with preforked gunicorn workers
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+
+from core import server
+
+
+def local_caches():
+    """Return the aliases of shared state caches private to one process"""
+    aliases = {settings.SINGLE_FLIGHT_CACHE, settings.IDEMPOTENCY_CACHE}
+    return sorted(
+        alias for alias in aliases
+        if isinstance(caches[alias], LocMemCache)
+    )
+
+
+class Command(BaseCommand):
+    """Django command to run the production server"""
+    help = (
+        'Serve the project with preforked workers. SIGHUP to the master '
+        'replaces the workers gracefully, but with preloading (the '
+        'default) they are forked from the code the master already '
+        'imported: deploy code changes with a restart, or with USR2 then '
+        'QUIT to the old master, or serve with --no-preload.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bind', default='0.0.0.0:8000',
+            help='Address to listen on',
+        )
+        parser.add_argument(
+            '--mode', choices=tuple(server.WORKER_CLASSES), default='wsgi',
+            help='Threaded WSGI workers or event loop ASGI workers',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of worker processes, defaults to the CPU count',
+        )
+        parser.add_argument(
+            '--threads', type=int, default=4,
+            help='Threads per worker in WSGI mode',
+        )
+        parser.add_argument(
+            '--max-requests', type=int, default=10000,
+            help='Recycle a worker after this many requests (0 disables)',
+        )
+        parser.add_argument(
+            '--max-requests-jitter', type=int, default=1000,
+            help='Random extra requests so workers do not recycle together',
+        )
+        parser.add_argument(
+            '--max-memory', type=int, default=0,
+            help='Recycle a worker above this resident memory in MB',
+        )
+        parser.add_argument(
+            '--timeout', type=int, default=30,
+            help='Seconds before a silent worker is killed and restarted',
+        )
+        parser.add_argument(
+            '--graceful-timeout', type=int, default=30,
+            help='Seconds workers get to finish requests when stopping',
+        )
+        parser.add_argument(
+            '--no-preload', action='store_false', dest='preload',
+            help='Import the project in each worker instead of the master, '
+                 'so SIGHUP picks up code changes',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        mode = options['mode']
+        config = {
+            'bind': options['bind'],
+            'workers': options['workers'] or server.cpu_count(),
+            'worker_class': server.WORKER_CLASSES[mode],
+            'threads': options['threads'] if mode == 'wsgi' else 1,
+            'max_requests': options['max_requests'],
+            'max_requests_jitter': options['max_requests_jitter'],
+            'timeout': options['timeout'],
+            'graceful_timeout': options['graceful_timeout'],
+            'preload_app': options['preload'],
+            'post_fork': server.post_fork,
+            'post_worker_init': server.post_worker_init,
+            'worker_exit': server.worker_exit,
+            'accesslog': '-',
+            'access_log_format': server.ACCESS_LOG_FORMAT,
+        }
+        local = local_caches()
+        if config['workers'] > 1 and local:
+            raise CommandError(
+                f"Cache {', '.join(local)} is local to each process; "
+                f'configure a shared CACHE_BACKEND or serve with one worker.'
+            )
+        if options['max_memory']:
+            config['post_worker_init'] = server.watch_memory(
+                options['max_memory'])
+
+        application = (
+            settings.WSGI_APPLICATION if mode == 'wsgi'
+            else settings.ASGI_APPLICATION
+        )
+        self.stdout.write(
+            f"Serving {application} on {config['bind']} with "
+            f"{config['workers']} {mode} workers"
+        )
+        server.Server(application, config).run()
@@ -0,0 +1,26 @@
+"""
+In-process counters
+"""
+import threading
+
+
+class Metrics:
+    """Thread safe counters for the current process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def merge(self, counters):
+        """Add counters, such as a snapshot taken in another process"""
+        with self._lock:
+            for name, value in counters.items():
+                self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counters)
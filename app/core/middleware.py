@@ -0,0 +1,87 @@
+"""
+Middleware for the core app
+"""
+import random
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core import profiling
+
+
+class RateLimitHeadersMiddleware:
+    """Add RateLimit-* headers for requests checked by a throttle"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit is not None:
+            response['RateLimit-Limit'] = rate_limit['limit']
+            response['RateLimit-Remaining'] = rate_limit['remaining']
+            response['RateLimit-Reset'] = rate_limit['reset']
+        return response
+
+
+class ProfilingMiddleware:
+    """Profile requests of staff sending the profiling header, or a sample
+
+    Requests without the header cost one dictionary lookup (and a random
+    number when PROFILING_SAMPLE_RATE is set). Sampled requests only
+    record stacks; tracemalloc is reserved for explicit staff requests.
+    The profile id is returned in the X-Profile-Id header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.PROFILING_HEADER in request.META:
+            if not self._is_staff(request):
+                return self.get_response(request)
+            trigger = 'header'
+        elif settings.PROFILING_SAMPLE_RATE and \
+                random.random() < settings.PROFILING_SAMPLE_RATE:
+            trigger = 'sample'
+        else:
+            return self.get_response(request)
+
+        profile = profiling.begin(allocations=trigger == 'header')
+        if profile is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        except Exception:
+            profiling.finish(profile, **self._details(request, trigger, 500))
+            raise
+        response['X-Profile-Id'] = profiling.finish(
+            profile,
+            **self._details(request, trigger, response.status_code),
+        )
+        return response
+
+    def _is_staff(self, request):
+        """Check the session user, or the API token when there is none"""
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            try:
+                authenticated = TokenAuthentication().authenticate(request)
+            except exceptions.AuthenticationFailed:
+                return False
+            user = authenticated[0] if authenticated else None
+        return bool(user and user.is_staff)
+
+    def _details(self, request, trigger, status):
+        user = getattr(request, 'user', None)
+        return {
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'trigger': trigger,
+            'user_id': user.pk if user is not None else None,
+            'created_at': timezone.now().isoformat(),
+        }
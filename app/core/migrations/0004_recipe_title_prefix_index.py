@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+INDEX_NAME = 'core_recipe_title_prefix_idx'
+
+
+def create_title_prefix_index(apps, schema_editor):
+    """Index recipe titles for LIKE 'prefix%' lookups on PostgreSQL"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS %s ON core_recipe '
+        '(title varchar_pattern_ops)' % INDEX_NAME
+    )
+
+
+def drop_title_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS %s' % INDEX_NAME)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_recipe_description'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_title_prefix_index,
+            drop_title_prefix_index,
+        ),
+    ]
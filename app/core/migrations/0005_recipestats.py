@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:14
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_recipe_title_prefix_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recipe_stats', serialize=False, to='core.user')),
+                ('recipe_count', models.IntegerField(default=0)),
+                ('time_minutes_total', models.BigIntegerField(default=0)),
+                ('price_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16)),
+                ('price_min', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('price_max', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+            ],
+        ),
+    ]
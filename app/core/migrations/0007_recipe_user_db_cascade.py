@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def _set_recipe_user_fk(schema_editor, on_delete):
+    """Recreate the recipe -> user foreign key with the given ON DELETE"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname FROM pg_constraint "
+            "WHERE conrelid = 'core_recipe'::regclass "
+            "AND confrelid = 'core_user'::regclass AND contype = 'f'"
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    for name in names:
+        schema_editor.execute(
+            'ALTER TABLE core_recipe DROP CONSTRAINT %(name)s, '
+            'ADD CONSTRAINT %(name)s FOREIGN KEY (user_id) '
+            'REFERENCES core_user (id) %(on_delete)s '
+            'DEFERRABLE INITIALLY DEFERRED'
+            % {'name': name, 'on_delete': on_delete}
+        )
+
+
+def add_db_cascade(apps, schema_editor):
+    if not settings.USER_DELETION_DB_CASCADE:
+        return
+    _set_recipe_user_fk(schema_editor, 'ON DELETE CASCADE')
+
+
+def remove_db_cascade(apps, schema_editor):
+    _set_recipe_user_fk(schema_editor, '')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_userdeletion'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_db_cascade, remove_db_cascade),
+    ]
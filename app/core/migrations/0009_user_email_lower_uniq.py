@@ -0,0 +1,42 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_email_collisions(apps, schema_editor):
+    """Refuse to migrate while emails collide case-insensitively"""
+    User = apps.get_model('core', 'User')
+    collisions = list(
+        User.objects.using(schema_editor.connection.alias)
+        .annotate(email_lower=Lower('email'))
+        .values('email_lower')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+        .values_list('email_lower', flat=True)[:20]
+    )
+    if collisions:
+        raise RuntimeError(
+            'Cannot add the case-insensitive email index, these emails are '
+            'used by several users: %s. Run "manage.py '
+            'find_email_collisions" for the full list and merge or rename '
+            'the accounts first.' % ', '.join(collisions)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            check_email_collisions,
+            migrations.RunPython.noop,
+        ),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_user_email_lower_uniq '
+            'ON core_user (lower(email))',
+            'DROP INDEX core_user_email_lower_uniq',
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+INDEX_NAME = 'core_recipe_title_trgm_idx'
+
+
+def create_trigram_index(apps, schema_editor):
+    """Index recipe titles for fuzzy matching on PostgreSQL"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS %s ON core_recipe '
+        'USING gin (title gin_trgm_ops)' % INDEX_NAME
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS %s' % INDEX_NAME)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_user_email_lower_uniq'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
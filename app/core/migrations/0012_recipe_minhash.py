@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='minhash',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='RecipeMinHashBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.SmallIntegerField()),
+                ('hash', models.BigIntegerField()),
+                ('recipe', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='minhash_bands', to='core.recipe')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipeminhashband',
+            index=models.Index(fields=['user', 'band', 'hash'], name='core_minhash_bucket_idx'),
+        ),
+    ]
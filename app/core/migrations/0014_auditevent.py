@@ -0,0 +1,72 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def partition_audit_table(apps, schema_editor):
+    """Turn core_auditevent into a table range partitioned by created_at
+
+    Monthly partitions are added by the create_audit_partitions command;
+    until then rows land in the default partition.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in (
+        'ALTER TABLE core_auditevent RENAME TO core_auditevent_plain',
+        'CREATE TABLE core_auditevent '
+        '(LIKE core_auditevent_plain INCLUDING DEFAULTS) '
+        'PARTITION BY RANGE (created_at)',
+        # Unique constraints of a partitioned table need the partition key
+        'ALTER TABLE core_auditevent ADD PRIMARY KEY (id, created_at)',
+        'ALTER SEQUENCE core_auditevent_id_seq '
+        'OWNED BY core_auditevent.id',
+        'DROP TABLE core_auditevent_plain',
+        'CREATE TABLE core_auditevent_default '
+        'PARTITION OF core_auditevent DEFAULT',
+        'CREATE INDEX core_audit_actor_time_idx '
+        'ON core_auditevent (actor_id, created_at)',
+        'CREATE INDEX core_audit_object_time_idx '
+        'ON core_auditevent (object_type, object_id, created_at)',
+        'CREATE INDEX core_audit_time_idx ON core_auditevent (created_at)',
+    ):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=10)),
+                ('object_type', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('changes', models.JSONField(blank=True, default=dict)),
+                ('source', models.CharField(max_length=10)),
+                ('actor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='auditevent',
+            index=models.Index(fields=['actor', 'created_at'], name='core_audit_actor_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditevent',
+            index=models.Index(fields=['object_type', 'object_id', 'created_at'], name='core_audit_object_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditevent',
+            index=models.Index(fields=['created_at'], name='core_audit_time_idx'),
+        ),
+        migrations.RunPython(
+            partition_audit_table, migrations.RunPython.noop),
+    ]
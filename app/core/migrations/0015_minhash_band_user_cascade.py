@@ -0,0 +1,65 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+import django.db.models.deletion
+
+
+def delete_orphan_bands(apps, schema_editor):
+    """Drop bands left behind by recipes deleted in the database"""
+    Band = apps.get_model('core', 'RecipeMinHashBand')
+    Recipe = apps.get_model('core', 'Recipe')
+    User = apps.get_model('core', 'User')
+    Band.objects.filter(
+        ~Exists(Recipe.objects.filter(pk=OuterRef('recipe_id'))) |
+        ~Exists(User.objects.filter(pk=OuterRef('user_id')))
+    ).delete()
+
+
+def _set_band_user_fk(schema_editor, on_delete):
+    """Recreate the band -> user foreign key with the given ON DELETE"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname FROM pg_constraint "
+            "WHERE conrelid = 'core_recipeminhashband'::regclass "
+            "AND confrelid = 'core_user'::regclass AND contype = 'f'"
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    for name in names:
+        schema_editor.execute(
+            'ALTER TABLE core_recipeminhashband DROP CONSTRAINT %(name)s, '
+            'ADD CONSTRAINT %(name)s FOREIGN KEY (user_id) '
+            'REFERENCES core_user (id) %(on_delete)s '
+            'DEFERRABLE INITIALLY DEFERRED'
+            % {'name': name, 'on_delete': on_delete}
+        )
+
+
+def add_db_cascade(apps, schema_editor):
+    if not settings.USER_DELETION_DB_CASCADE:
+        return
+    _set_band_user_fk(schema_editor, 'ON DELETE CASCADE')
+
+
+def remove_db_cascade(apps, schema_editor):
+    _set_band_user_fk(schema_editor, '')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_auditevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_orphan_bands, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='recipeminhashband',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(add_db_cascade, remove_db_cascade),
+    ]
@@ -1,14 +1,32 @@
+from decimal import Decimal
+
 from django.db import models # noqa
 
 # Create your models here.
 
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models.functions import Lower
+from django.utils import timezone
 
 from django.contrib.auth.models import (
     AbstractBaseUser, BaseUserManager, PermissionsMixin)
 
 class UserManager(BaseUserManager):
     """Manager for user profiles"""
+    def filter_email(self, email):
+        """Return users whose email matches regardless of case
+
+        Compares lower(email), which is served by the
+        core_user_email_lower_uniq index.
+        """
+        return self.alias(email_lower=Lower('email')).filter(
+            email_lower=email.lower())
+
+    def get_by_natural_key(self, username):
+        """Look users up by email case-insensitively"""
+        return self.filter_email(username).get()
+
     def create_user(self, email, password=None, **extra_fields):
         """Create a new user profile"""
         if not email:
@@ -41,6 +59,18 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     USERNAME_FIELD = 'email'
 
+    def validate_unique(self, exclude=None):
+        """Also reject emails that only differ in case from another user"""
+        super().validate_unique(exclude=exclude)
+        if exclude and 'email' in exclude:
+            return
+        clash = type(self)._default_manager.filter_email(self.email)
+        if self.pk is not None:
+            clash = clash.exclude(pk=self.pk)
+        if clash.exists():
+            raise ValidationError(
+                {'email': 'User with this email already exists.'})
+
 class Recipe(models.Model):
     """Recipe object"""
     user = models.ForeignKey(
@@ -52,6 +82,213 @@ class Recipe(models.Model):
     price = models.DecimalField(max_digits=5, decimal_places=2)
     link = models.CharField(max_length=255, blank=True)
     description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Stored under its content hash, see recipe.images
+    image = models.ImageField(max_length=255, blank=True)
+    thumbnails = models.JSONField(default=dict, blank=True)
+    # MinHash signature of title and description, see core.duplicates
+    minhash = models.BinaryField(null=True, blank=True, editable=False)
+
+    def __str__(self):
+        return self.title
+
+
+class RecipeMinHashBand(models.Model):
+    """One locality-sensitive hashing bucket a recipe signature falls in"""
+    # No database constraint: a partitioned recipe table has no unique id
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='minhash_bands',
+    )
+    # Cascades in the database too (migration 0015), so bands go with
+    # recipes removed by the recipe -> user ON DELETE CASCADE
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    band = models.SmallIntegerField()
+    hash = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'band', 'hash'],
+                name='core_minhash_bucket_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Band {self.band} of recipe {self.recipe_id}'
+
+class RecipeStats(models.Model):
+    """Running recipe totals for a user, maintained on every recipe write"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='recipe_stats',
+    )
+    recipe_count = models.IntegerField(default=0)
+    time_minutes_total = models.BigIntegerField(default=0)
+    price_total = models.DecimalField(
+        max_digits=16, decimal_places=2, default=Decimal('0.00'))
+    price_min = models.DecimalField(
+        max_digits=5, decimal_places=2, null=True, blank=True)
+    price_max = models.DecimalField(
+        max_digits=5, decimal_places=2, null=True, blank=True)
+
+    @property
+    def time_minutes_avg(self):
+        """Average preparation time of the user's recipes"""
+        if not self.recipe_count:
+            return None
+        return self.time_minutes_total / self.recipe_count
+
+    @property
+    def price_avg(self):
+        """Average price of the user's recipes"""
+        if not self.recipe_count:
+            return None
+        return (Decimal(self.price_total) / self.recipe_count).quantize(
+            Decimal('0.01'))
+
+    def __str__(self):
+        return f'Recipe stats for user {self.user_id}'
+
+
+class UserDeletion(models.Model):
+    """Progress of a user account being removed in the background"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='deletions',
+    )
+    email = models.EmailField(max_length=255)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    recipes_total = models.IntegerField(default=0)
+    recipes_deleted = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Deletion of {self.email} ({self.status})'
+
+
+class Job(models.Model):
+    """Unit of deferred work picked up by the run_worker command"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    name = models.CharField(max_length=255)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=255, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'run_at'],
+                name='core_job_status_run_at_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+
+class AuditEvent(models.Model):
+    """Who changed which recipe or user, written in batches by core.audit
+
+    On PostgreSQL the table is range partitioned by month of created_at.
+    """
+    ACTION_CREATED = 'created'
+    ACTION_UPDATED = 'updated'
+    ACTION_DELETED = 'deleted'
+    ACTION_CHOICES = (
+        (ACTION_CREATED, 'Created'),
+        (ACTION_UPDATED, 'Updated'),
+        (ACTION_DELETED, 'Deleted'),
+    )
+
+    created_at = models.DateTimeField(default=timezone.now)
+    # Events outlive the users they mention
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='+',
+    )
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    object_type = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    changes = models.JSONField(default=dict, blank=True)
+    source = models.CharField(max_length=10)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['actor', 'created_at'],
+                name='core_audit_actor_time_idx',
+            ),
+            models.Index(
+                fields=['object_type', 'object_id', 'created_at'],
+                name='core_audit_object_time_idx',
+            ),
+            models.Index(
+                fields=['created_at'],
+                name='core_audit_time_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.object_type} {self.object_id} {self.action}'
+
+
+class ThrottleBucket(models.Model):
+    """Token bucket of one client, updated atomically by core.throttling
+
+    ``tat`` is the time at which the bucket will be full again; a missing
+    or past value means a full bucket, so such rows can be pruned freely.
+    """
+    key = models.CharField(max_length=255, primary_key=True)
+    tat = models.FloatField()
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.key
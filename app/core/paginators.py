@@ -0,0 +1,50 @@
+"""
+Paginators for large tables
+"""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that uses planner statistics instead of COUNT(*)
+
+    An unfiltered ``SELECT COUNT(*)`` has to visit every row of the table,
+    which makes the admin changelist unusable once a table holds millions of
+    rows. For unfiltered querysets on PostgreSQL the row estimate kept in
+    ``pg_class.reltuples`` is used instead. Small tables, filtered querysets
+    and other databases still get an exact count.
+    """
+    # Below this many rows an exact count is cheap and more useful
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        """Return the estimated or exact number of objects"""
+        estimate = self._estimated_count()
+        if estimate is not None and estimate > self.exact_count_threshold:
+            return estimate
+        return super().count
+
+    def _estimated_count(self):
+        """Return the planner row estimate or None if not applicable"""
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is None or query.where or query.distinct:
+            return None
+
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+
+        # reltuples is -1 (or 0) until the table has been analyzed
+        if not row or row[0] <= 0:
+            return None
+        return int(row[0])
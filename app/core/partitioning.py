@@ -0,0 +1,170 @@
+"""
+Online conversion of core_recipe into a hash partitioned table (PostgreSQL)
+
+The conversion builds a copy of the table partitioned by ``hash(user_id)``,
+keeps it in step with a trigger while existing rows are copied in batches
+and finally swaps the two tables under a short exclusive lock. The old
+table is kept as ``core_recipe_unpartitioned`` until it is dropped.
+"""
+import re
+
+from core.models import Recipe
+
+TABLE = Recipe._meta.db_table
+NEW_TABLE = f'{TABLE}_partitioned'
+OLD_TABLE = f'{TABLE}_unpartitioned'
+TRIGGER = f'{TABLE}_mirror'
+
+INDEX_DEFINITION = re.compile(
+    rf'CREATE INDEX \S+ ON (?P<schema>\S+\.)?{TABLE} (?P<method>USING .+)$')
+
+
+def create_table_sql(partitions):
+    """Return the statements creating the partitioned copy of the table"""
+    statements = [
+        f'CREATE TABLE {NEW_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS) '
+        f'PARTITION BY HASH (user_id)',
+        # Unique constraints of a partitioned table must contain the
+        # partition key; ids stay unique through the shared sequence.
+        f'ALTER TABLE {NEW_TABLE} ADD PRIMARY KEY (id, user_id)',
+        f'ALTER TABLE {NEW_TABLE} ADD CONSTRAINT {NEW_TABLE}_user_fk '
+        f'FOREIGN KEY (user_id) REFERENCES core_user (id) '
+        f'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED',
+    ]
+    for remainder in range(partitions):
+        statements.append(
+            f'CREATE TABLE {TABLE}_p{remainder} PARTITION OF {NEW_TABLE} '
+            f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})'
+        )
+    return statements
+
+
+def recipe_indexes(cursor):
+    """Return (name, definition) of the non-unique indexes of the table"""
+    cursor.execute(
+        'SELECT indexname, indexdef FROM pg_indexes '
+        'WHERE tablename = %s AND indexdef NOT LIKE %s ORDER BY indexname',
+        [TABLE, 'CREATE UNIQUE%'],
+    )
+    return cursor.fetchall()
+
+
+def temporary_index_name(name):
+    """Return the name an index has on the copy until the swap"""
+    return f'{name}_part'
+
+
+def copy_indexes_sql(indexes, partitions):
+    """Return statements recreating the indexes on the copy
+
+    An index built on the partitioned table would lock it, and through the
+    mirror trigger every write to the original table, for the whole
+    build. Instead the parent index is created empty and each partition's
+    index is built CONCURRENTLY and attached to it.
+    """
+    statements = []
+    for name, definition in indexes:
+        match = INDEX_DEFINITION.match(definition)
+        if match is None:
+            raise ValueError(f'Unexpected definition of {name}: {definition}')
+        schema, method = match.group('schema') or '', match.group('method')
+        parent = temporary_index_name(name)
+        statements.append(
+            f'CREATE INDEX {parent} ON ONLY {schema}{NEW_TABLE} {method}')
+        for remainder in range(partitions):
+            child = f'{name}_p{remainder}'
+            statements.append(
+                f'CREATE INDEX CONCURRENTLY {child} '
+                f'ON {schema}{TABLE}_p{remainder} {method}'
+            )
+            statements.append(f'ALTER INDEX {parent} ATTACH PARTITION {child}')
+    return statements
+
+
+def mirror_trigger_sql():
+    """Return statements copying every write on the old table to the new"""
+    return [
+        f"""
+        CREATE OR REPLACE FUNCTION {TRIGGER}() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM {NEW_TABLE}
+                WHERE id = OLD.id AND user_id = OLD.user_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO {NEW_TABLE} SELECT NEW.*
+                ON CONFLICT DO NOTHING;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        f'CREATE TRIGGER {TRIGGER} AFTER INSERT OR UPDATE OR DELETE '
+        f'ON {TABLE} FOR EACH ROW EXECUTE PROCEDURE {TRIGGER}()',
+    ]
+
+
+def copy_batch_sql():
+    """Return the statement copying one id range into the new table
+
+    Rows are locked FOR SHARE so a concurrent delete waits for the batch
+    to commit and its trigger then removes the copied row again.
+    """
+    return (
+        f'INSERT INTO {NEW_TABLE} '
+        f'SELECT * FROM {TABLE} WHERE id >= %s AND id < %s '
+        f'ORDER BY id FOR SHARE '
+        f'ON CONFLICT DO NOTHING'
+    )
+
+
+def swap_sql(indexes):
+    """Return the statements replacing the old table with the new one
+
+    The new table's indexes and primary key take over the names of the
+    old ones, so later migrations still find the indexes Django created.
+    """
+    statements = [
+        f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE',
+        f'DROP TRIGGER {TRIGGER} ON {TABLE}',
+        f'DROP FUNCTION {TRIGGER}()',
+        f'ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}',
+        f'ALTER TABLE {OLD_TABLE} '
+        f'RENAME CONSTRAINT {TABLE}_pkey TO {OLD_TABLE}_pkey',
+        f'ALTER TABLE {NEW_TABLE} RENAME TO {TABLE}',
+        f'ALTER TABLE {TABLE} '
+        f'RENAME CONSTRAINT {NEW_TABLE}_pkey TO {TABLE}_pkey',
+        f'ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id',
+    ]
+    for name, _ in indexes:
+        statements.append(f'ALTER INDEX {name} RENAME TO {name}_old')
+        statements.append(
+            f'ALTER INDEX {temporary_index_name(name)} RENAME TO {name}')
+    return statements
+
+
+def is_partitioned(cursor, table=TABLE):
+    """Return True if the table is a partitioned table"""
+    cursor.execute(
+        'SELECT 1 FROM pg_partitioned_table '
+        'WHERE partrelid = to_regclass(%s)',
+        [table],
+    )
+    return cursor.fetchone() is not None
+
+
+def table_exists(cursor, table):
+    cursor.execute('SELECT to_regclass(%s)', [table])
+    return cursor.fetchone()[0] is not None
+
+
+def scanned_relations(plan):
+    """Return the names of the tables read by an EXPLAIN (FORMAT JSON) plan"""
+    relations = set()
+    nodes = [plan[0]['Plan']] if isinstance(plan, list) else [plan]
+    while nodes:
+        node = nodes.pop()
+        if 'Relation Name' in node:
+            relations.add(node['Relation Name'])
+        nodes.extend(node.get('Plans', []))
+    return relations
@@ -0,0 +1,187 @@
+"""
+On-demand profiling of single requests
+
+A profile combines a sampled call-stack profile of the thread serving the
+request with a tracemalloc diff of the allocations made meanwhile. Stacks
+are kept in the folded format ("outer;inner;leaf count") read by
+flamegraph.pl and speedscope. Profiles are written as JSON files to a
+directory holding at most PROFILING_MAX_ENTRIES of them.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+ID_RE = re.compile(r'[0-9]+-[0-9a-f]+')
+
+# tracemalloc is process wide, so only one request is profiled at a time
+_active = threading.Lock()
+
+
+class StackSampler:
+    """Record the stack of one thread at a fixed interval"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            self.stacks[fold(frame)] += 1
+
+
+def fold(frame):
+    """Return a frame's stack as 'module:function' names, outermost first"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get('__name__', '?')
+        names.append(f'{module}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Profile:
+    """Profile the current thread until stop() is called"""
+
+    def __init__(self, allocations=True):
+        self.allocations = allocations
+        self.sampler = StackSampler(
+            threading.get_ident(), settings.PROFILING_INTERVAL)
+        self._started_tracing = False
+        self._before = None
+
+    def start(self):
+        if self.allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(settings.PROFILING_TRACEBACK_FRAMES)
+                self._started_tracing = True
+            self._before = tracemalloc.take_snapshot()
+        self.started = time.perf_counter()
+        self.sampler.start()
+
+    def stop(self):
+        """Stop profiling and return stacks and allocation differences"""
+        self.sampler.stop()
+        duration = time.perf_counter() - self.started
+        allocations = []
+        if self.allocations:
+            after = tracemalloc.take_snapshot()
+            if self._started_tracing:
+                tracemalloc.stop()
+            allocations = [
+                {
+                    'location': str(stat.traceback[0]),
+                    'size_diff': stat.size_diff,
+                    'count_diff': stat.count_diff,
+                }
+                for stat in after.compare_to(self._before, 'lineno')[
+                    :settings.PROFILING_TOP_ALLOCATIONS]
+                if stat.size_diff
+            ]
+        return {
+            'duration_ms': round(duration * 1000, 3),
+            'interval_ms': settings.PROFILING_INTERVAL * 1000,
+            'samples': sum(self.sampler.stacks.values()),
+            'stacks': dict(self.sampler.stacks.most_common()),
+            'allocations': allocations,
+        }
+
+
+def begin(allocations=True):
+    """Start profiling the current thread, or return None if one is running"""
+    if not _active.acquire(blocking=False):
+        return None
+    try:
+        profile = Profile(allocations=allocations)
+        profile.start()
+    except Exception:
+        _active.release()
+        raise
+    return profile
+
+
+def finish(profile, **details):
+    """Stop a profile from begin() and store it, returning its id"""
+    try:
+        result = profile.stop()
+    finally:
+        _active.release()
+    result.update(details)
+    result['id'] = f'{time.time_ns()}-{uuid.uuid4().hex[:8]}'
+    save(result)
+    return result['id']
+
+
+def _directory():
+    path = Path(settings.PROFILING_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def save(result):
+    """Write a profile, dropping the oldest ones beyond the limit"""
+    directory = _directory()
+    temporary = directory / f".{result['id']}.tmp"
+    temporary.write_text(json.dumps(result))
+    os.replace(temporary, directory / f"{result['id']}.json")
+
+    # Ids start with a timestamp, so names sort oldest first
+    stored = sorted(directory.glob('*.json'))
+    for old in stored[:-settings.PROFILING_MAX_ENTRIES]:
+        old.unlink(missing_ok=True)
+
+
+def list_profiles():
+    """Return a summary of the stored profiles, newest first"""
+    summaries = []
+    for path in sorted(_directory().glob('*.json'), reverse=True):
+        try:
+            profile = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        summaries.append({
+            key: profile.get(key) for key in (
+                'id', 'method', 'path', 'status', 'duration_ms', 'samples',
+                'trigger', 'user_id', 'created_at',
+            )
+        })
+    return summaries
+
+
+def load_profile(profile_id):
+    """Return a stored profile, or None if it has been rotated out"""
+    if not ID_RE.fullmatch(profile_id or ''):
+        return None
+    try:
+        return json.loads(
+            (_directory() / f'{profile_id}.json').read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def folded(profile):
+    """Return the stacks of a profile as folded text for flame graphs"""
+    return ''.join(
+        f'{stack} {count}\n' for stack, count in profile['stacks'].items())
@@ -0,0 +1,109 @@
+"""
+Production server built on gunicorn
+"""
+import logging
+import os
+import resource
+import signal
+import threading
+
+from django.db import connections
+from django.utils.module_loading import import_string
+from gunicorn.app.base import BaseApplication
+
+from core import audit
+
+logger = logging.getLogger(__name__)
+
+WORKER_CLASSES = {
+    'wsgi': 'gthread',
+    'asgi': 'uvicorn.workers.UvicornWorker',
+}
+
+# Gunicorn's default format without query strings (%(U)s instead of the
+# request line), which may carry secrets
+ACCESS_LOG_FORMAT = (
+    '%(h)s %(l)s %(u)s %(t)s "%(m)s %(U)s %(H)s" %(s)s %(b)s '
+    '"%(f)s" "%(a)s"'
+)
+
+
+def cpu_count():
+    """Return the number of CPUs this process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def rss_megabytes():
+    """Return the resident memory of the current process in MB"""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        # Peak rather than current usage, in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+
+def post_fork(server, worker):
+    """Drop database connections inherited from the preloading master"""
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    """Start flushing buffered audit events in the background"""
+    audit.buffer.start()
+
+
+def worker_exit(server, worker):
+    """Write the audit events still buffered by a stopping worker"""
+    audit.buffer.flush()
+
+
+def watch_memory(limit_mb, interval=5):
+    """Return a hook that recycles a worker once it uses too much memory"""
+    def watching_post_worker_init(worker):
+        post_worker_init(worker)
+
+        def watch():
+            stopping = threading.Event()
+            while not stopping.wait(interval):
+                usage = rss_megabytes()
+                if usage > limit_mb:
+                    worker.log.info(
+                        'Worker %s uses %d MB (limit %d MB), recycling',
+                        worker.pid, usage, limit_mb,
+                    )
+                    # Graceful shutdown; the master starts a replacement
+                    os.kill(worker.pid, signal.SIGTERM)
+                    return
+
+        threading.Thread(target=watch, daemon=True).start()
+
+    return watching_post_worker_init
+
+
+class Server(BaseApplication):
+    """Gunicorn application serving the Django project
+
+    With ``preload_app`` the project is imported once in the master and
+    workers are forked from it, sharing its memory copy-on-write. Sending
+    SIGHUP to the master replaces all workers gracefully, but only reloads
+    the code without ``preload_app``; otherwise the new workers run the
+    code the master imported, and a code change needs a restart or a USR2
+    binary upgrade.
+    """
+
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return import_string(self.application)
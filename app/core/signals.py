@@ -0,0 +1,70 @@
+"""
+Signal handlers for the core app
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from django.contrib.auth import get_user_model
+
+from core import duplicates, singleflight, stats
+from core.models import Recipe
+
+
+def invalidate_recipes(user_id):
+    """Drop a user's cached recipe responses once the change commits
+
+    Bumping earlier would let a concurrent reader cache the old rows under
+    the new version.
+    """
+    namespace = f'recipes:{user_id}'
+    transaction.on_commit(lambda: singleflight.bump_version(namespace))
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_values(sender, instance, **kwargs):
+    """Keep the stored values of a recipe that is about to change"""
+    instance._stats_previous = None
+    if not instance._state.adding and instance.pk is not None:
+        instance._stats_previous = sender.objects.filter(
+            pk=instance.pk,
+        ).values('user_id', 'time_minutes', 'price', 'minhash').first()
+
+
+@receiver(pre_save, sender=Recipe)
+def compute_recipe_signature(sender, instance, update_fields=None, **kwargs):
+    """Refresh the MinHash signature used to find duplicate recipes"""
+    instance._minhash_saved = (
+        update_fields is None or 'minhash' in update_fields)
+    if instance._minhash_saved:
+        instance.minhash = duplicates.signature(
+            instance.title, instance.description)
+
+
+@receiver(post_save, sender=Recipe)
+def update_stats_on_save(sender, instance, created, **kwargs):
+    """Keep the owner's recipe statistics in step with the recipe"""
+    previous = getattr(instance, '_stats_previous', None)
+    if created or previous is None:
+        stats.recipe_created(instance)
+    else:
+        stats.recipe_updated(previous, instance)
+        if previous['user_id'] != instance.user_id:
+            invalidate_recipes(previous['user_id'])
+    if instance._minhash_saved:
+        duplicates.recipe_saved(instance, previous)
+    invalidate_recipes(instance.user_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def update_stats_on_delete(sender, instance, **kwargs):
+    """Remove a deleted recipe from its owner's statistics"""
+    stats.recipe_deleted(instance)
+    invalidate_recipes(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def reset_recipe_cache_for_new_user(sender, instance, created, **kwargs):
+    """Never serve cached recipes of an earlier user with the same id"""
+    if created:
+        invalidate_recipes(instance.pk)
@@ -0,0 +1,171 @@
+"""
+Single-flight caching to protect the database from cache stampedes
+
+When a popular cache entry is missing, only one caller computes it: other
+threads of the same process wait on a local lock and other processes wait
+on a lock held in the cache backend, then all of them read the fresh
+value. Entries are kept for a while after they go stale so readers can be
+served the old value while a single caller refreshes it in the background.
+"""
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from core.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# hit: fresh value, stale: old value served, computed: value computed here,
+# coalesced: value computed by another caller, refreshed: background refresh
+metrics = Metrics()
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def _cache(alias=None):
+    return caches[alias or settings.SINGLE_FLIGHT_CACHE]
+
+
+class CacheLock:
+    """Lock shared by all processes using the same cache backend
+
+    Acquired with an atomic ``cache.add``; it expires on its own after
+    ``timeout`` seconds so a crashed holder cannot block others forever.
+    ``cache`` is the alias of the backend, SINGLE_FLIGHT_CACHE by default.
+    """
+
+    def __init__(self, key, timeout, cache=None):
+        self.key = f'lock:{key}'
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+        self.cache = cache
+
+    def acquire(self):
+        return _cache(self.cache).add(self.key, self.token, self.timeout)
+
+    def release(self):
+        if _cache(self.cache).get(self.key) == self.token:
+            _cache(self.cache).delete(self.key)
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class _LocalLock:
+    """Per-key lock shared by the threads of this process"""
+
+    def __init__(self, key):
+        self.key = key
+
+    def __enter__(self):
+        with _local_locks_guard:
+            entry = _local_locks.setdefault(self.key, [threading.Lock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+
+    def __exit__(self, *exc_info):
+        with _local_locks_guard:
+            entry = _local_locks[self.key]
+            entry[0].release()
+            entry[1] -= 1
+            if not entry[1]:
+                del _local_locks[self.key]
+
+
+def get_version(namespace):
+    """Return the current version token of a group of cache entries"""
+    key = f'version:{namespace}'
+    version = _cache().get(key)
+    if version is None:
+        _cache().add(key, uuid.uuid4().hex, None)
+        version = _cache().get(key)
+    return version
+
+
+def bump_version(namespace):
+    """Invalidate every entry keyed with the namespace's version"""
+    _cache().set(f'version:{namespace}', uuid.uuid4().hex, None)
+
+
+def get_or_compute(key, compute, ttl, stale_ttl=None, lock_timeout=None):
+    """Return the cached value for key, computing it at most once
+
+    ``compute`` is called without arguments and must return a picklable
+    value. Values are fresh for ``ttl`` seconds and may then be served
+    stale for ``stale_ttl`` more seconds while one caller refreshes them.
+    """
+    if stale_ttl is None:
+        stale_ttl = settings.SINGLE_FLIGHT_STALE_TTL
+    if lock_timeout is None:
+        lock_timeout = settings.SINGLE_FLIGHT_LOCK_TIMEOUT
+
+    entry = _cache().get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if fresh_until > time.time():
+            metrics.incr('hit')
+        else:
+            _refresh_in_background(key, compute, ttl, stale_ttl, lock_timeout)
+            metrics.incr('stale')
+        return value
+
+    with _LocalLock(key):
+        entry = _cache().get(key)
+        if entry is not None:
+            metrics.incr('coalesced')
+            return entry[0]
+
+        lock = CacheLock(key, lock_timeout)
+        if lock.acquire():
+            try:
+                value = _compute_and_store(key, compute, ttl, stale_ttl)
+            finally:
+                lock.release()
+            metrics.incr('computed')
+            return value
+
+        # Another process is computing the value: wait for it to land
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = _cache().get(key)
+            if entry is not None:
+                metrics.incr('coalesced')
+                return entry[0]
+
+        metrics.incr('computed')
+        return _compute_and_store(key, compute, ttl, stale_ttl)
+
+
+def _compute_and_store(key, compute, ttl, stale_ttl):
+    value = compute()
+    _cache().set(key, (value, time.time() + ttl), ttl + stale_ttl)
+    return value
+
+
+def _refresh_in_background(key, compute, ttl, stale_ttl, lock_timeout):
+    """Recompute a stale entry on a thread unless someone else already is"""
+    lock = CacheLock(key, lock_timeout)
+    if not lock.acquire():
+        return
+
+    def refresh():
+        try:
+            _compute_and_store(key, compute, ttl, stale_ttl)
+            metrics.incr('refreshed')
+        except Exception:
+            logger.exception('Refreshing cache entry %s failed', key)
+        finally:
+            lock.release()
+            connections.close_all()
+
+    threading.Thread(target=refresh, daemon=True).start()
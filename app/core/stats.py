@@ -0,0 +1,151 @@
+"""
+Incremental maintenance of per-user recipe statistics
+"""
+from decimal import Decimal
+
+from django.db.models import (
+    Count, DecimalField, F, Max, Min, Q, Sum, Value)
+from django.db.models.functions import Cast, Coalesce, Greatest, Least
+
+from core.models import Recipe, RecipeStats
+
+
+def _values(recipe):
+    """Return the statistic inputs of a recipe as clean python values"""
+    return {
+        'user_id': recipe['user_id'] if isinstance(recipe, dict)
+        else recipe.user_id,
+        'time_minutes': int(
+            recipe['time_minutes'] if isinstance(recipe, dict)
+            else recipe.time_minutes),
+        'price': Decimal(
+            recipe['price'] if isinstance(recipe, dict) else recipe.price),
+    }
+
+
+def _add(values, sign=1):
+    """Add (or with sign=-1 subtract) one recipe to its user's totals"""
+    RecipeStats.objects.get_or_create(user_id=values['user_id'])
+    updates = {
+        'recipe_count': F('recipe_count') + sign,
+        'time_minutes_total': F('time_minutes_total') +
+        sign * values['time_minutes'],
+        'price_total': F('price_total') + sign * values['price'],
+    }
+    if sign > 0:
+        price = Cast(
+            Value(values['price']),
+            DecimalField(max_digits=5, decimal_places=2),
+        )
+        updates['price_min'] = Least(Coalesce(F('price_min'), price), price)
+        updates['price_max'] = Greatest(
+            Coalesce(F('price_max'), price), price)
+    RecipeStats.objects.filter(user_id=values['user_id']).update(**updates)
+
+
+def _refresh_price_bounds(user_id):
+    """Recompute min and max price after the current extreme went away"""
+    bounds = Recipe.objects.filter(user_id=user_id).aggregate(
+        price_min=Min('price'),
+        price_max=Max('price'),
+    )
+    RecipeStats.objects.filter(user_id=user_id).update(**bounds)
+
+
+def _is_price_bound(values):
+    """Return True if the recipe's price is its user's current min or max"""
+    price = values['price']
+    return RecipeStats.objects.filter(
+        Q(price_min=price) | Q(price_max=price),
+        user_id=values['user_id'],
+    ).exists()
+
+
+def recipe_created(recipe):
+    """Account for a newly created recipe"""
+    _add(_values(recipe))
+
+
+def recipe_deleted(recipe):
+    """Account for a deleted recipe"""
+    values = _values(recipe)
+    if not RecipeStats.objects.filter(user_id=values['user_id']).exists():
+        # The owner (and with it the summary) is being deleted as well
+        return
+    bound = _is_price_bound(values)
+    _add(values, sign=-1)
+    if bound:
+        _refresh_price_bounds(values['user_id'])
+
+
+def recipe_updated(previous, recipe):
+    """Account for a change to an existing recipe
+
+    ``previous`` holds the ``user_id``, ``time_minutes`` and ``price`` the
+    recipe had before the change.
+    """
+    old = _values(previous)
+    new = _values(recipe)
+    if old == new:
+        return
+
+    if old['user_id'] != new['user_id']:
+        recipe_deleted(previous)
+        recipe_created(recipe)
+        return
+
+    bound = old['price'] != new['price'] and _is_price_bound(old)
+    _add(old, sign=-1)
+    _add(new)
+    if bound:
+        _refresh_price_bounds(new['user_id'])
+
+
+def rebuild(user_ids):
+    """Recompute the summaries of the given users from their recipes"""
+    user_ids = list(user_ids)
+    existing = {
+        stats.user_id: stats for stats in
+        RecipeStats.objects.select_for_update().filter(user_id__in=user_ids)
+    }
+    totals = {
+        row['user_id']: row for row in
+        Recipe.objects.filter(user_id__in=user_ids)
+        .order_by()
+        .values('user_id')
+        .annotate(
+            recipe_count=Count('id'),
+            time_minutes_total=Sum('time_minutes'),
+            price_total=Sum('price'),
+            price_min=Min('price'),
+            price_max=Max('price'),
+        )
+    }
+
+    fields = (
+        'recipe_count', 'time_minutes_total', 'price_total',
+        'price_min', 'price_max',
+    )
+    empty = {
+        'recipe_count': 0,
+        'time_minutes_total': 0,
+        'price_total': Decimal('0.00'),
+        'price_min': None,
+        'price_max': None,
+    }
+    to_update = []
+    to_create = []
+    for user_id in user_ids:
+        row = totals.get(user_id)
+        values = {field: row[field] for field in fields} if row else empty
+        stats = existing.get(user_id)
+        if stats is not None:
+            for field, value in values.items():
+                setattr(stats, field, value)
+            to_update.append(stats)
+        elif row:
+            to_create.append(RecipeStats(user_id=user_id, **values))
+
+    RecipeStats.objects.bulk_update(to_update, fields)
+    RecipeStats.objects.bulk_create(to_create)
+    return len(to_update) + len(to_create)
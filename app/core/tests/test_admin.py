@@ -1,10 +1,15 @@
 """
 Test for the django admin
 """
+from decimal import Decimal
+
 from django.contrib.auth import get_user_model
 from django.test import TestCase, Client
 from django.urls import reverse
 
+from core.models import Recipe, UserDeletion
+from core.paginators import EstimatedCountPaginator
+
 
 class AdminSiteTests(TestCase):
     """Test admin site"""
@@ -44,3 +49,76 @@ class AdminSiteTests(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+    def test_recipes_listed(self):
+        """Test that recipes are listed with their owner"""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('4.50'),
+        )
+        url = reverse('admin:core_recipe_changelist')
+        res = self.client.get(url)
+
+        self.assertContains(res, recipe.title)
+        self.assertContains(res, self.user.email)
+
+    def test_recipe_search_by_id(self):
+        """Test that numeric search terms look recipes up by id"""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Findable recipe',
+            time_minutes=5,
+            price=Decimal('4.50'),
+        )
+        Recipe.objects.create(
+            user=self.user,
+            title='Other recipe',
+            time_minutes=5,
+            price=Decimal('4.50'),
+        )
+        url = reverse('admin:core_recipe_changelist')
+        res = self.client.get(url, {'q': str(recipe.id)})
+
+        self.assertContains(res, 'Findable recipe')
+        self.assertNotContains(res, 'Other recipe')
+
+    def test_recipe_change_page_uses_raw_id_user(self):
+        """Test that the recipe edit page does not list every user"""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('4.50'),
+        )
+        url = reverse('admin:core_recipe_change', args=[recipe.id])
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertContains(res, 'vForeignKeyRawIdAdminField')
+
+    def test_estimated_paginator_exact_for_small_tables(self):
+        """Test that small or filtered querysets get an exact count"""
+        paginator = EstimatedCountPaginator(
+            get_user_model().objects.order_by('id'), 100)
+        self.assertEqual(paginator.count, 2)
+
+        paginator = EstimatedCountPaginator(
+            get_user_model().objects.filter(is_staff=True).order_by('id'),
+            100,
+        )
+        self.assertEqual(paginator.count, 1)
+
+    def test_delete_user_page_schedules_deletion(self):
+        """Test deleting a user from the admin deactivates it first"""
+        url = reverse('admin:core_user_delete', args=[self.user.id])
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client.post(url, {'post': 'yes'})
+
+        self.assertEqual(res.status_code, 302)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertTrue(UserDeletion.objects.filter(user=self.user).exists())
@@ -0,0 +1,147 @@
+"""
+Tests for the buffered audit log
+"""
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import audit
+from core.models import AuditEvent, Recipe
+
+
+def create_user(**params):
+    defaults = {'email': 'user@example.com', 'password': 'testpass123'}
+    defaults.update(params)
+    return get_user_model().objects.create_user(**defaults)
+
+
+def create_recipe(user, **params):
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class AuditBufferTests(TestCase):
+    """Test batching of audit events"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.recipe = create_recipe(self.user)
+        self.buffer = audit.AuditBuffer()
+        patcher = mock.patch.object(audit, 'buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            audit.record(self.user, AuditEvent.ACTION_CREATED, self.recipe)
+
+    @override_settings(AUDIT_BUFFER_SIZE=3, AUDIT_FLUSH_INTERVAL=60)
+    def test_flush_on_size(self):
+        """Test events are written in one batch once the buffer is full"""
+        self.record()
+        self.record()
+        self.assertEqual(len(self.buffer), 2)
+        self.assertFalse(AuditEvent.objects.exists())
+
+        self.record()
+
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(AuditEvent.objects.count(), 3)
+
+    @override_settings(AUDIT_BUFFER_SIZE=100, AUDIT_FLUSH_INTERVAL=5)
+    def test_flush_on_interval(self):
+        """Test events are written once the oldest has waited long enough"""
+        with mock.patch('core.audit.time.monotonic', return_value=100):
+            self.record()
+        self.assertFalse(AuditEvent.objects.exists())
+
+        with mock.patch('core.audit.time.monotonic', return_value=106):
+            self.record()
+
+        self.assertEqual(AuditEvent.objects.count(), 2)
+
+    def test_not_recorded_on_rollback(self):
+        """Test nothing is buffered when the transaction rolls back"""
+        with self.captureOnCommitCallbacks(execute=False):
+            audit.record(self.user, AuditEvent.ACTION_CREATED, self.recipe)
+        self.assertEqual(len(self.buffer), 0)
+
+    @override_settings(AUDIT_BUFFER_MAX=2)
+    def test_failed_flush_keeps_newest(self):
+        """Test events are retried after a failed write, within a limit"""
+        for _ in range(3):
+            self.buffer.add(AuditEvent(
+                action=AuditEvent.ACTION_DELETED, object_type='recipe',
+                object_id=self.recipe.id, source='api'))
+        with mock.patch.object(
+                AuditEvent.objects, 'bulk_create', side_effect=Exception):
+            self.assertEqual(self.buffer.flush(), 0)
+
+        self.assertEqual(len(self.buffer), 2)
+        self.assertEqual(self.buffer.flush(), 2)
+
+    @override_settings(AUDIT_BACKGROUND_FLUSH=True, AUDIT_FLUSH_INTERVAL=60)
+    @mock.patch('core.audit.atexit.register')
+    @mock.patch('core.audit.threading.Thread')
+    def test_first_event_starts_flushing(self, thread, register):
+        """Test any process flushes in the background and at exit"""
+        self.record()
+        self.record()
+
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+        register.assert_called_once_with(self.buffer.flush)
+
+        with mock.patch('core.audit.os.getpid', return_value=-1):
+            self.record()
+        self.assertEqual(thread.call_count, 2)
+
+    def test_update_records_changed_fields(self):
+        """Test updates record only what changed, hiding passwords"""
+        before = audit.capture(self.user)
+        self.user.name = 'New name'
+        self.user.set_password('newpass123')
+        self.user.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            audit.record(
+                self.user, AuditEvent.ACTION_UPDATED, self.user, before)
+        self.buffer.flush()
+
+        event = AuditEvent.objects.get()
+        self.assertEqual(event.changes, {
+            'name': ['', 'New name'],
+            'password': ['***', '***'],
+        })
+
+    def test_api_changes_recorded(self):
+        """Test recipe API writes are audited with the acting user"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('recipe:recipe-detail', args=[self.recipe.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            client.patch(url, {'title': 'New title'})
+        with self.captureOnCommitCallbacks(execute=True):
+            client.delete(url)
+        self.buffer.flush()
+
+        events = AuditEvent.objects.order_by('id')
+        self.assertEqual(
+            [(e.action, e.actor_id, e.object_id) for e in events],
+            [
+                (AuditEvent.ACTION_UPDATED, self.user.id, self.recipe.id),
+                (AuditEvent.ACTION_DELETED, self.user.id, self.recipe.id),
+            ],
+        )
+        self.assertEqual(
+            events[0].changes, {'title': ['Sample recipe', 'New title']})
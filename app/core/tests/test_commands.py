@@ -1,13 +1,44 @@
 """
 Test custom Django commands
 """
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2Error
 
-from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, override_settings)
+from django.utils import timezone
+
+from core import jobs, partitioning, server
+from core.metrics import Metrics
+from core.deletion import schedule_user_deletion
+from core.models import (
+    Job, Recipe, RecipeMinHashBand, RecipeStats, ThrottleBucket,
+    UserDeletion)
+
+
+calls = []
+
+
+@jobs.task
+def record_call(value):
+    """Task used by the worker tests"""
+    calls.append(value)
+
+
+@jobs.task
+def always_fail():
+    """Task that never succeeds"""
+    raise RuntimeError('boom')
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -30,3 +61,398 @@ class CommandTests(SimpleTestCase):
         call_command('wait_for_db')
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class RebuildRecipeStatsTests(TestCase):
+    """Test reconciling recipe statistics"""
+
+    def test_rebuild_recipe_stats(self):
+        """Test that drifted statistics are recomputed from recipes"""
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        get_user_model().objects.create_user(
+            'other@example.com', 'testpass123')
+        for minutes, price in ((10, '2.00'), (20, '6.00')):
+            Recipe.objects.create(
+                user=user,
+                title='Sample recipe',
+                time_minutes=minutes,
+                price=Decimal(price),
+            )
+        RecipeStats.objects.filter(user=user).update(
+            recipe_count=7, price_min=None)
+
+        call_command('rebuild_recipe_stats', batch_size=1, stdout=StringIO())
+
+        stats = RecipeStats.objects.get(user=user)
+        self.assertEqual(stats.recipe_count, 2)
+        self.assertEqual(stats.time_minutes_total, 30)
+        self.assertEqual(stats.price_min, Decimal('2.00'))
+        self.assertEqual(stats.price_max, Decimal('6.00'))
+        self.assertEqual(stats.price_avg, Decimal('4.00'))
+        self.assertEqual(RecipeStats.objects.count(), 1)
+
+
+class ProcessUserDeletionsTests(TestCase):
+    """Test running background user deletions"""
+
+    def test_process_user_deletions(self):
+        """Test recipes are removed in batches before the user"""
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123')
+        for owner in (user, user, user, other):
+            Recipe.objects.create(
+                user=owner,
+                title='Sample recipe',
+                time_minutes=10,
+                price=Decimal('2.00'),
+            )
+        deletion = schedule_user_deletion(user)
+        self.assertEqual(deletion.recipes_total, 3)
+
+        call_command('process_user_deletions', batch_size=2, stdout=StringIO())
+
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, UserDeletion.STATUS_DONE)
+        self.assertEqual(deletion.recipes_deleted, 3)
+        self.assertIsNone(deletion.user)
+        self.assertFalse(
+            get_user_model().objects.filter(email=user.email).exists())
+        self.assertEqual(Recipe.objects.filter(user=other).count(), 1)
+        self.assertEqual(RecipeStats.objects.get(user=other).recipe_count, 1)
+        self.assertFalse(
+            RecipeMinHashBand.objects.filter(user_id=user.id).exists())
+        self.assertTrue(RecipeMinHashBand.objects.filter(user=other).exists())
+
+    @skipUnless(connection.vendor == 'postgresql', 'Requires PostgreSQL')
+    def test_database_cascade_off_by_default(self):
+        """Test deleting a user row does not cascade unless enabled"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT DISTINCT confdeltype FROM pg_constraint "
+                "WHERE conrelid IN ('core_recipe'::regclass, "
+                "'core_recipeminhashband'::regclass) "
+                "AND confrelid = 'core_user'::regclass"
+            )
+            self.assertEqual(cursor.fetchall(), [('a',)])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Requires PostgreSQL')
+    @override_settings(USER_DELETION_DB_CASCADE=True)
+    def test_database_cascade_removes_bands(self):
+        """Test bands go with recipes deleted by the database cascade"""
+        call_command('apply_user_db_cascade', stdout=StringIO())
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        Recipe.objects.create(
+            user=user, title='Sample recipe', time_minutes=10,
+            price=Decimal('2.00'))
+        self.assertTrue(RecipeMinHashBand.objects.filter(user=user).exists())
+        RecipeStats.objects.filter(user=user).delete()
+
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM core_user WHERE id = %s', [user.id])
+
+        self.assertFalse(Recipe.objects.filter(user_id=user.id).exists())
+        self.assertFalse(
+            RecipeMinHashBand.objects.filter(user_id=user.id).exists())
+
+
+@patch('core.jobs.close_old_connections')
+class RunWorkerTests(TestCase):
+    """Test the background job worker"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_run_worker_runs_due_jobs(self, patched_close):
+        """Test queued jobs run once and are marked done"""
+        record_call.delay('first')
+        jobs.enqueue(record_call, args=['second'])
+
+        call_command('run_worker', burst=True, stdout=StringIO())
+
+        self.assertEqual(calls, ['first', 'second'])
+        self.assertEqual(
+            Job.objects.filter(status=Job.STATUS_DONE).count(), 2)
+
+    def test_failed_job_retried_with_backoff(self, patched_close):
+        """Test a failing job is requeued until it runs out of attempts"""
+        job = jobs.enqueue(always_fail, max_attempts=2)
+
+        call_command('run_worker', burst=True, stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('boom', job.last_error)
+        self.assertGreater(job.run_at, job.created_at)
+
+        Job.objects.filter(pk=job.pk).update(run_at=job.created_at)
+        call_command('run_worker', burst=True, stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    @patch('core.management.commands.run_worker.connections')
+    def test_process_mode_reports_child_counters(
+            self, patched_connections, patched_close):
+        """Test the summary adds up the counters of the worker processes"""
+        def run(worker):
+            jobs.metrics.incr('succeeded')
+
+        out = StringIO()
+        with patch.object(jobs.Worker, 'run', run), \
+                patch.object(jobs, 'metrics', Metrics()), \
+                patch.object(jobs, 'queue_stats', return_value={}):
+            call_command(
+                'run_worker', mode='process', concurrency=2, burst=True,
+                stdout=out,
+            )
+
+        self.assertIn("Processed: {'succeeded': 2}", out.getvalue())
+
+    def test_unregistered_task_rejected(self, patched_close):
+        """Test only registered functions can be queued"""
+        with self.assertRaises(LookupError):
+            jobs.enqueue('os.system', args=['true'])
+
+
+class PruneExpiredTests(TestCase):
+    """Test deleting expired shared state"""
+
+    @patch('core.management.commands.prune_expired.time.time',
+           return_value=1000.0)
+    def test_prune_full_throttle_buckets(self, patched_time):
+        """Test only buckets that have refilled are deleted"""
+        ThrottleBucket.objects.create(key='full', tat=999.0)
+        ThrottleBucket.objects.create(key='in-use', tat=1001.0)
+
+        call_command('prune_expired', stdout=StringIO())
+
+        self.assertEqual(
+            list(ThrottleBucket.objects.values_list('key', flat=True)),
+            ['in-use'],
+        )
+
+    def test_prune_expired_cache_entries(self):
+        """Test expired rows of the database cache are deleted"""
+        cache.set('expired', 1, 60)
+        cache.set('live', 1, None)
+        later = timezone.now() + timedelta(hours=1)
+
+        with patch('django.utils.timezone.now', return_value=later):
+            call_command('prune_expired', stdout=StringIO())
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT cache_key FROM core_cache')
+            keys = [row[0] for row in cursor.fetchall()]
+        self.assertEqual(keys, [cache.make_key('live')])
+
+
+@patch('core.server.Server')
+class ServeTests(SimpleTestCase):
+    """Test the production server command"""
+
+    def test_serve_wsgi_defaults(self, patched_server):
+        """Test WSGI mode preloads the app with threaded workers"""
+        with patch('core.server.cpu_count', return_value=3):
+            call_command('serve', stdout=StringIO())
+
+        application, config = patched_server.call_args.args
+        self.assertEqual(application, 'app.wsgi.application')
+        self.assertEqual(config['workers'], 3)
+        self.assertEqual(config['worker_class'], 'gthread')
+        self.assertTrue(config['preload_app'])
+        self.assertIs(config['post_worker_init'], server.post_worker_init)
+        self.assertIs(config['worker_exit'], server.worker_exit)
+        self.assertNotIn('%(r)s', config['access_log_format'])
+        patched_server.return_value.run.assert_called_once()
+
+    def test_serve_asgi_with_recycling(self, patched_server):
+        """Test ASGI mode and memory based recycling options"""
+        call_command(
+            'serve', mode='asgi', workers=2, max_memory=512,
+            max_requests=500, stdout=StringIO(),
+        )
+
+        application, config = patched_server.call_args.args
+        self.assertEqual(application, 'app.asgi.application')
+        self.assertEqual(
+            config['worker_class'], 'uvicorn.workers.UvicornWorker')
+        self.assertEqual(config['workers'], 2)
+        self.assertEqual(config['max_requests'], 500)
+        self.assertTrue(callable(config['post_worker_init']))
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }})
+    def test_serve_refuses_local_cache(self, patched_server):
+        """Test several workers cannot share a process local cache"""
+        with self.assertRaisesMessage(CommandError, 'default'):
+            call_command('serve', workers=2, stdout=StringIO())
+        patched_server.assert_not_called()
+
+        call_command('serve', workers=1, stdout=StringIO())
+        patched_server.return_value.run.assert_called_once()
+
+
+class PartitionRecipesTests(SimpleTestCase):
+    """Test the recipe partitioning command and its SQL"""
+
+    @patch('core.management.commands.partition_recipes.connection')
+    def test_requires_postgresql(self, patched_connection):
+        """Test the command refuses to run on other databases"""
+        patched_connection.vendor = 'sqlite'
+
+        with self.assertRaises(CommandError):
+            call_command('partition_recipes', stdout=StringIO())
+
+    def test_create_table_sql(self):
+        """Test one hash partition is created per remainder"""
+        statements = partitioning.create_table_sql(4)
+
+        self.assertIn('PARTITION BY HASH (user_id)', statements[0])
+        self.assertIn('PRIMARY KEY (id, user_id)', statements[1])
+        partitions = [sql for sql in statements if 'PARTITION OF' in sql]
+        self.assertEqual(len(partitions), 4)
+        self.assertIn('MODULUS 4, REMAINDER 3', partitions[-1])
+
+    def test_copy_indexes_sql(self):
+        """Test partition indexes are built concurrently and attached"""
+        statements = partitioning.copy_indexes_sql([(
+            'core_recipe_user_id_idx',
+            'CREATE INDEX core_recipe_user_id_idx ON public.core_recipe '
+            'USING btree (user_id)',
+        )], 2)
+
+        self.assertEqual(statements, [
+            'CREATE INDEX core_recipe_user_id_idx_part '
+            'ON ONLY public.core_recipe_partitioned USING btree (user_id)',
+            'CREATE INDEX CONCURRENTLY core_recipe_user_id_idx_p0 '
+            'ON public.core_recipe_p0 USING btree (user_id)',
+            'ALTER INDEX core_recipe_user_id_idx_part '
+            'ATTACH PARTITION core_recipe_user_id_idx_p0',
+            'CREATE INDEX CONCURRENTLY core_recipe_user_id_idx_p1 '
+            'ON public.core_recipe_p1 USING btree (user_id)',
+            'ALTER INDEX core_recipe_user_id_idx_part '
+            'ATTACH PARTITION core_recipe_user_id_idx_p1',
+        ])
+
+    def test_scanned_relations(self):
+        """Test tables are collected from every node of a plan"""
+        plan = [{'Plan': {
+            'Node Type': 'Append',
+            'Plans': [
+                {'Node Type': 'Index Scan', 'Relation Name': 'core_recipe_p3'},
+            ],
+        }}]
+
+        self.assertEqual(
+            partitioning.scanned_relations(plan), {'core_recipe_p3'})
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Requires PostgreSQL')
+class PartitionRecipesPostgresTests(TransactionTestCase):
+    """Test partitioning a live recipe table"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        for number in range(5):
+            Recipe.objects.create(
+                user=self.user, title=f'Recipe {number}', time_minutes=5,
+                price=Decimal('1.00'))
+        with connection.cursor() as cursor:
+            self.indexes = partitioning.recipe_indexes(cursor)
+        self.addCleanup(self.unpartition)
+
+    def unpartition(self):
+        """Put the original table back for the following tests"""
+        table, old = partitioning.TABLE, partitioning.OLD_TABLE
+        with connection.cursor() as cursor:
+            if not partitioning.table_exists(cursor, old):
+                return
+            cursor.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {old}.id')
+            cursor.execute(f'DROP TABLE {table}')
+            cursor.execute(f'ALTER TABLE {old} RENAME TO {table}')
+            cursor.execute(
+                f'ALTER TABLE {table} RENAME CONSTRAINT {old}_pkey '
+                f'TO {table}_pkey')
+            for name, _ in self.indexes:
+                cursor.execute(f'ALTER INDEX {name}_old RENAME TO {name}')
+
+    def test_partition_and_swap(self):
+        """Test rows, index names and writes survive the swap"""
+        call_command(
+            'partition_recipes', partitions=4, batch_size=2,
+            stdout=StringIO())
+
+        with connection.cursor() as cursor:
+            self.assertTrue(partitioning.is_partitioned(cursor))
+            cursor.execute(
+                'SELECT indexname FROM pg_indexes WHERE tablename = %s',
+                [partitioning.TABLE])
+            names = {row[0] for row in cursor.fetchall()}
+        self.assertLessEqual({name for name, _ in self.indexes}, names)
+        self.assertIn(f'{partitioning.TABLE}_pkey', names)
+        self.assertEqual(Recipe.objects.count(), 5)
+
+        recipe = Recipe.objects.create(
+            user=self.user, title='After', time_minutes=5,
+            price=Decimal('1.00'))
+        recipe.title = 'Changed'
+        recipe.save()
+        self.assertEqual(
+            Recipe.objects.filter(user=self.user, title='Changed').count(), 1)
+
+
+class FindDuplicateRecipesTests(TestCase):
+    """Test the find_duplicate_recipes command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+
+    def create_recipe(self, title, description, user=None):
+        return Recipe.objects.create(
+            user=user or self.user,
+            title=title,
+            description=description,
+            time_minutes=10,
+            price=Decimal('5.00'),
+        )
+
+    def test_backfill_and_delete_duplicates(self):
+        """Test missing signatures are computed and copies removed"""
+        description = 'Boil the pasta and stir in tomato sauce with basil'
+        first = self.create_recipe('Tomato pasta', description)
+        copy = self.create_recipe('Tomato pasta!', description)
+        other = self.create_recipe('Carrot cake', 'Bake with walnuts')
+        elsewhere = self.create_recipe(
+            'Tomato pasta', description,
+            user=get_user_model().objects.create_user(
+                'other@example.com', 'testpass123'),
+        )
+        RecipeMinHashBand.objects.all().delete()
+        Recipe.objects.update(minhash=None)
+
+        out = StringIO()
+        call_command(
+            'find_duplicate_recipes', workers=1, chunk_size=2, stdout=out)
+
+        self.assertIn(f'Duplicates: {first.id}, {copy.id}', out.getvalue())
+        self.assertIn('Found 1 groups', out.getvalue())
+        self.assertFalse(Recipe.objects.filter(minhash=None).exists())
+
+        call_command(
+            'find_duplicate_recipes', workers=1, delete=True, stdout=out)
+
+        self.assertEqual(
+            set(Recipe.objects.values_list('id', flat=True)),
+            {first.id, other.id, elsewhere.id},
+        )
+        self.assertFalse(
+            RecipeMinHashBand.objects.filter(recipe_id=copy.id).exists())
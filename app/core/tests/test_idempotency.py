@@ -0,0 +1,138 @@
+"""
+Tests for Idempotency-Key handling on create endpoints
+"""
+import hashlib
+import json
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache, caches
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.singleflight import CacheLock
+from recipe.views import RecipeViewSet
+from user.serializers import UserSerializer
+from user.views import CreateUserView
+
+RECIPES_URL = reverse('recipe:recipe-list')
+CREATE_USER_URL = reverse('user:create')
+
+
+def create_user(**params):
+    return get_user_model().objects.create_user(**params)
+
+
+class IdempotencyTests(TestCase):
+    """Test retried creates run only once"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(
+            email='user@example.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.payload = {'title': 'Soup', 'time_minutes': 10, 'price': '3.50'}
+
+    def post(self, payload, key='key-1', client=None):
+        return (client or self.client).post(
+            RECIPES_URL, payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_response(self):
+        """Test a retry returns the stored response without a new recipe"""
+        first = self.post(self.payload)
+        retry = self.post(self.payload)
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_without_key_not_deduplicated(self):
+        """Test requests without the header are unaffected"""
+        self.client.post(RECIPES_URL, self.payload, format='json')
+        self.client.post(RECIPES_URL, self.payload, format='json')
+
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_key_reused_with_other_body(self):
+        """Test reusing a key for a different request is rejected"""
+        self.post(self.payload)
+        res = self.post({**self.payload, 'title': 'Stew'})
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_keys_scoped_to_user(self):
+        """Test another user's identical key creates their own recipe"""
+        other = APIClient()
+        other.force_authenticate(create_user(
+            email='other@example.com', password='testpass123'))
+
+        self.post(self.payload)
+        res = self.post(self.payload, client=other)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', res)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_in_flight_duplicate_conflicts(self):
+        """Test a duplicate of a running request does not execute"""
+        view = RecipeViewSet()
+        request = mock.Mock(user=self.user)
+        lock = CacheLock(
+            view.idempotency_cache_key(request, 'key-1'), timeout=30,
+            cache=settings.IDEMPOTENCY_CACHE)
+        lock.acquire()
+        self.addCleanup(lock.release)
+
+        res = self.post(self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_stored_body_hash_is_keyed(self):
+        """Test the stored fingerprint is not a plain hash of the body"""
+        payload = {
+            'email': 'new@example.com',
+            'password': 'testpass123',
+            'name': 'New user',
+        }
+        APIClient().post(
+            CREATE_USER_URL, payload, format='json',
+            HTTP_IDEMPOTENCY_KEY='signup')
+        request = mock.Mock(user=AnonymousUser())
+        stored = caches[settings.IDEMPOTENCY_CACHE].get(
+            CreateUserView().idempotency_cache_key(request, 'signup'))
+
+        plain = hashlib.sha256(
+            json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        self.assertNotEqual(stored['fingerprint'], plain)
+
+    def test_user_create_retry_hashes_once(self):
+        """Test a retried sign up does not create or hash again"""
+        payload = {
+            'email': 'new@example.com',
+            'password': 'testpass123',
+            'name': 'New user',
+        }
+        client = APIClient()
+        with mock.patch.object(
+                UserSerializer, 'create',
+                autospec=True, side_effect=UserSerializer.create) as create:
+            first = client.post(
+                CREATE_USER_URL, payload, HTTP_IDEMPOTENCY_KEY='signup')
+            retry = client.post(
+                CREATE_USER_URL, payload, HTTP_IDEMPOTENCY_KEY='signup')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(create.call_count, 1)
@@ -4,6 +4,8 @@ Tests for models in core app
 from decimal import Decimal
 
 
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
@@ -42,6 +44,16 @@ class ModelTests(TestCase):
         with self.assertRaises(ValueError):
             get_user_model().objects.create_user(None, 'testpass123')
 
+    def test_email_unique_ignoring_case(self):
+        """Test emails differing only in case cannot be registered twice"""
+        get_user_model().objects.create_user('test@example.com', 'pass123')
+        user = get_user_model()(email='TEST@example.com')
+
+        with self.assertRaises(ValidationError):
+            user.validate_unique()
+        with self.assertRaises(IntegrityError):
+            get_user_model().objects.create_user('Test@example.com', 'pass')
+
     def test_create_new_superuser(self):
         """Test creating a new superuser"""
         user = get_user_model().objects.create_superuser(
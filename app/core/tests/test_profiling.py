@@ -0,0 +1,133 @@
+"""
+Tests for request profiling
+"""
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import profiling
+
+RECIPES_URL = reverse('recipe:recipe-list')
+PROFILES_URL = reverse('profile-list')
+
+
+def profile_url(profile_id):
+    """Return the admin URL of a stored profile"""
+    return reverse('profile-detail', args=[profile_id])
+
+
+class ProfilingTests(TestCase):
+    """Test the profiling middleware and admin views"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            PROFILING_DIR=self.directory.name, PROFILING_INTERVAL=0.001)
+        self.settings.enable()
+        self.staff = get_user_model().objects.create_superuser(
+            'admin@example.com', 'testpass123')
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        self.client = APIClient()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.directory.cleanup()
+
+    def authenticate(self, user):
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_staff_header_profiles_request(self):
+        """Test staff sending the header get a stored profile"""
+        self.authenticate(self.staff)
+
+        res = self.client.get(RECIPES_URL, HTTP_X_PROFILE='1')
+
+        profile = profiling.load_profile(res['X-Profile-Id'])
+        self.assertEqual(profile['path'], RECIPES_URL)
+        self.assertEqual(profile['status'], 200)
+        self.assertEqual(profile['trigger'], 'header')
+        self.assertEqual(profile['user_id'], self.staff.id)
+        self.assertIn('allocations', profile)
+
+    def test_header_ignored_for_regular_users(self):
+        """Test non-staff users cannot trigger profiling"""
+        self.authenticate(self.user)
+
+        res = self.client.get(RECIPES_URL, HTTP_X_PROFILE='1')
+        self.assertFalse(res.has_header('X-Profile-Id'))
+
+        res = self.client.get(RECIPES_URL)
+        self.assertFalse(res.has_header('X-Profile-Id'))
+        self.assertEqual(profiling.list_profiles(), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampled_requests_skip_allocations(self):
+        """Test sampled requests only record stacks"""
+        self.authenticate(self.user)
+
+        res = self.client.get(RECIPES_URL)
+
+        profile = profiling.load_profile(res['X-Profile-Id'])
+        self.assertEqual(profile['trigger'], 'sample')
+        self.assertEqual(profile['allocations'], [])
+
+    def test_stacks_are_sampled(self):
+        """Test the sampler records the stack of the profiled thread"""
+        profile = profiling.begin()
+        self.assertIsNone(profiling.begin())
+        time.sleep(0.05)
+        stored = profiling.load_profile(profiling.finish(profile))
+
+        self.assertGreater(stored['samples'], 0)
+        self.assertTrue(any(
+            stack.endswith(f'{__name__}:test_stacks_are_sampled')
+            for stack in stored['stacks']
+        ))
+
+    @override_settings(PROFILING_MAX_ENTRIES=2)
+    def test_oldest_profiles_dropped(self):
+        """Test only the newest profiles are kept"""
+        ids = [
+            profiling.finish(profiling.begin(allocations=False))
+            for _ in range(3)
+        ]
+
+        self.assertEqual(
+            [summary['id'] for summary in profiling.list_profiles()],
+            [ids[2], ids[1]],
+        )
+        self.assertIsNone(profiling.load_profile(ids[0]))
+
+    def test_admin_views(self):
+        """Test staff can read profiles as JSON and folded stacks"""
+        profile_id = profiling.finish(profiling.begin(allocations=False))
+        profiling.save({
+            'id': profile_id,
+            'stacks': {'app:view;app:query': 3, 'app:view': 1},
+        })
+        self.client.force_login(self.staff)
+
+        res = self.client.get(PROFILES_URL)
+        self.assertEqual(res.json()['results'][0]['id'], profile_id)
+
+        res = self.client.get(profile_url(profile_id), {'format': 'folded'})
+        self.assertEqual(
+            res.content.decode(), 'app:view;app:query 3\napp:view 1\n')
+
+        res = self.client.get(profile_url('0-missing'))
+        self.assertEqual(res.status_code, 404)
+
+    def test_admin_views_require_staff(self):
+        """Test regular users are sent to the admin login"""
+        self.client.force_login(self.user)
+
+        res = self.client.get(PROFILES_URL)
+
+        self.assertEqual(res.status_code, 302)
@@ -0,0 +1,84 @@
+"""
+Tests for single-flight caching
+"""
+import threading
+import time
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from core import singleflight
+
+
+@override_settings(SINGLE_FLIGHT_LOCK_TIMEOUT=2, CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+}})
+class SingleFlightTests(SimpleTestCase):
+    """Test coalescing of concurrent cache misses"""
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_concurrent_misses_compute_once(self):
+        """Test concurrent callers share one computation"""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                singleflight.get_or_compute('key', compute, ttl=60)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_waits_for_other_process(self):
+        """Test a caller waits for the holder of the cache lock"""
+        holder = singleflight.CacheLock('key', 2)
+        self.assertTrue(holder.acquire())
+        threading.Timer(
+            0.2, lambda: cache.set('key', ('theirs', time.time() + 60)),
+        ).start()
+
+        value = singleflight.get_or_compute('key', lambda: 'mine', ttl=60)
+
+        self.assertEqual(value, 'theirs')
+
+    def test_stale_value_served_while_refreshing(self):
+        """Test stale entries are returned and refreshed in background"""
+        cache.set('key', ('old', time.time() - 1))
+
+        with patch('core.singleflight.threading.Thread') as thread:
+            value = singleflight.get_or_compute('key', lambda: 'new', ttl=60)
+            refresh = thread.call_args.kwargs['target']
+
+        self.assertEqual(value, 'old')
+        with patch('core.singleflight.connections'):
+            refresh()
+        self.assertEqual(
+            singleflight.get_or_compute('key', lambda: 'other', ttl=60),
+            'new',
+        )
+
+    def test_bump_version(self):
+        """Test bumping a namespace changes its version token"""
+        version = singleflight.get_version('recipes:1')
+        self.assertEqual(singleflight.get_version('recipes:1'), version)
+
+        singleflight.bump_version('recipes:1')
+
+        self.assertNotEqual(singleflight.get_version('recipes:1'), version)
@@ -0,0 +1,135 @@
+"""
+Tests for the token bucket throttles
+"""
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.throttling import UserTokenBucketThrottle
+
+TOKEN_URL = reverse('user:token')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+RATES = {
+    'anon': '100/min',
+    'user': '100/min',
+    'auth': '2/min',
+    'recipe_write': '3/min',
+}
+
+
+REST_FRAMEWORK = {
+    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.AnonTokenBucketThrottle',
+        'core.throttling.UserTokenBucketThrottle',
+        'core.throttling.ScopedTokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': RATES,
+}
+
+
+@override_settings(REST_FRAMEWORK=REST_FRAMEWORK)
+class ThrottleTests(TestCase):
+    """Test rate limiting of auth and write endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+
+    def test_token_endpoint_throttled(self):
+        """Test repeated login attempts are limited with Retry-After"""
+        payload = {'email': 'user@example.com', 'password': 'wrong'}
+        for remaining in (1, 0):
+            res = self.client.post(TOKEN_URL, payload)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(res['RateLimit-Limit'], '2')
+            self.assertEqual(res['RateLimit-Remaining'], str(remaining))
+
+        res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '30')
+
+    @patch('core.throttling.TokenBucketThrottle.timer')
+    def test_bucket_refills_over_time(self, patched_timer):
+        """Test tokens are returned at the configured rate"""
+        patched_timer.return_value = 1000.0
+        self.client.force_authenticate(self.user)
+        payload = {
+            'title': 'Sample recipe',
+            'time_minutes': 5,
+            'price': Decimal('1.00'),
+        }
+        for _ in range(3):
+            res = self.client.post(RECIPES_URL, payload)
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.post(RECIPES_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        patched_timer.return_value = 1020.0
+        res = self.client.post(RECIPES_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_write_limits_are_per_user(self):
+        """Test one user's writes do not use another user's tokens"""
+        other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='testpass123',
+        )
+        payload = {
+            'title': 'Sample recipe',
+            'time_minutes': 5,
+            'price': Decimal('1.00'),
+        }
+        self.client.force_authenticate(self.user)
+        for _ in range(4):
+            self.client.post(RECIPES_URL, payload)
+
+        self.client.force_authenticate(other)
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Requires PostgreSQL')
+@override_settings(REST_FRAMEWORK=REST_FRAMEWORK)
+class ConcurrentThrottleTests(TransactionTestCase):
+    """Test buckets shared by concurrent requests"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+
+    @patch('core.throttling.TokenBucketThrottle.timer', return_value=1000.0)
+    def test_concurrent_requests_share_tokens(self, patched_timer):
+        """Test a concurrent burst takes exactly the tokens in the bucket"""
+        def allow(_):
+            request = SimpleNamespace(user=self.user)
+            try:
+                return UserTokenBucketThrottle().allow_request(request, None)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            allowed = list(executor.map(allow, range(150)))
+
+        self.assertEqual(allowed.count(True), 100)
@@ -0,0 +1,149 @@
+"""
+Token bucket throttles with state shared by all worker processes
+"""
+import math
+import time
+
+from django.db import connection
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from core.models import ThrottleBucket
+
+# Theoretical arrival time (TAT): when the bucket would be full again.
+# A token is left while the TAT is at most ``tolerance`` ahead of now;
+# taking it moves the TAT one interval on from max(TAT, now). Doing the
+# check and the update in one upsert keeps concurrent requests from
+# spending the same token without any lock.
+TAKE_TOKEN_SQL = (
+    'INSERT INTO core_throttlebucket AS b (key, tat) VALUES (%s, %s) '
+    'ON CONFLICT (key) DO UPDATE '
+    'SET tat = CASE WHEN b.tat > %s THEN b.tat ELSE %s END + %s '
+    'WHERE b.tat <= %s '
+    'RETURNING tat'
+)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Base class for token bucket throttles
+
+    Rates use the usual DRF ``'<requests>/<period>'`` format from
+    ``DEFAULT_THROTTLE_RATES``: a client may burst up to ``requests`` calls
+    and the bucket refills evenly over ``period``.
+
+    The bucket is tracked with the generic cell rate algorithm, which only
+    needs one timestamp per client (the time at which the bucket will be
+    full again), kept in a ThrottleBucket row shared by all worker
+    processes and updated with a single atomic statement per request.
+    """
+    scope = None
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+    timer = time.time
+    periods = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+    def get_cache_key(self, request, view):
+        """Return the bucket key for the request, or None to not throttle"""
+        raise NotImplementedError('.get_cache_key() must be overridden')
+
+    def get_scope(self, view):
+        return self.scope
+
+    def parse_rate(self, rate):
+        """Return (capacity, seconds per token) for a rate string"""
+        num, period = rate.split('/')
+        capacity = int(num)
+        return capacity, self.periods[period[0]] / capacity
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope \
+            else None
+        if rate is None:
+            return True
+        ident = self.get_cache_key(request, view)
+        if ident is None:
+            return True
+
+        capacity, interval = self.parse_rate(rate)
+        key = self.cache_format % {'scope': scope, 'ident': ident}
+        now = self.timer()
+        tolerance = interval * (capacity - 1)
+        tat = self._take_token(key, now, interval, tolerance)
+        if tat is None:
+            # A bucket pruned in the meantime is full again
+            tat = self._get_tat(key) or now
+            self.wait_time = max(tat - now - tolerance, 0)
+            self._record(request, capacity, 0, tat - now)
+            return False
+
+        remaining = int((interval * capacity - (tat - now)) // interval)
+        self.wait_time = None
+        self._record(request, capacity, remaining, tat - now)
+        return True
+
+    def _take_token(self, key, now, interval, tolerance):
+        """Spend a token and return the new TAT, or None if none is left"""
+        with connection.cursor() as cursor:
+            cursor.execute(TAKE_TOKEN_SQL, [
+                key, now + interval, now, now, interval, now + tolerance,
+            ])
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _get_tat(self, key):
+        return ThrottleBucket.objects.filter(key=key).values_list(
+            'tat', flat=True).first()
+
+    def wait(self):
+        return getattr(self, 'wait_time', None)
+
+    @staticmethod
+    def _record(request, limit, remaining, reset):
+        """Remember the tightest limit for the rate limit headers"""
+        django_request = getattr(request, '_request', request)
+        current = getattr(django_request, 'rate_limit', None)
+        if current is None or remaining < current['remaining']:
+            django_request.rate_limit = {
+                'limit': limit,
+                'remaining': remaining,
+                'reset': math.ceil(reset),
+            }
+
+
+class AnonTokenBucketThrottle(TokenBucketThrottle):
+    """Limit unauthenticated clients per IP address"""
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.get_ident(request)
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Limit authenticated clients per user"""
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class ScopedTokenBucketThrottle(TokenBucketThrottle):
+    """Limit writes to views that set a ``throttle_scope``
+
+    Buckets are per route scope and per user, or per IP address for
+    anonymous clients. Safe methods are not limited by this throttle.
+    """
+
+    def get_scope(self, view):
+        return getattr(view, 'throttle_scope', None)
+
+    def get_cache_key(self, request, view):
+        if request.method in SAFE_METHODS:
+            return None
+        if request.user and request.user.is_authenticated:
+            return f'user-{request.user.pk}'
+        return f'ip-{self.get_ident(request)}'
@@ -0,0 +1,61 @@
+"""
+Views for the core app
+"""
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils import translation
+from django.views.decorators.cache import cache_control
+from django.views.static import serve
+from drf_spectacular.views import SpectacularAPIView
+from rest_framework.response import Response
+
+from core import profiling, singleflight
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """OpenAPI schema view that generates the schema once per version"""
+
+    def _get_schema_response(self, request):
+        version = self.api_version or request.version or \
+            self._get_version_parameter(request)
+        key = f'schema:{version}:{translation.get_language()}'
+        data = singleflight.get_or_compute(
+            key,
+            lambda: super(CachedSpectacularAPIView, self)
+            ._get_schema_response(request).data,
+            ttl=settings.SCHEMA_CACHE_TTL,
+        )
+        filename = self._get_filename(request, version)
+        return Response(
+            data=data,
+            headers={'Content-Disposition': f'inline; filename="{filename}"'},
+        )
+
+
+@staff_member_required
+def profile_list(request):
+    """List the stored request profiles, newest first"""
+    return JsonResponse({'results': profiling.list_profiles()})
+
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    """Return a stored profile, as folded stacks with ``?format=folded``"""
+    profile = profiling.load_profile(profile_id)
+    if profile is None:
+        raise Http404('Profile not found.')
+    if request.GET.get('format') == 'folded':
+        response = HttpResponse(
+            profiling.folded(profile), content_type='text/plain')
+        response['Content-Disposition'] = \
+            f'attachment; filename="{profile_id}.folded"'
+        return response
+    return JsonResponse(profile)
+
+
+@cache_control(
+    public=True, max_age=settings.MEDIA_CACHE_MAX_AGE, immutable=True)
+def media(request, path):
+    """Serve uploaded media; names are content hashes so never change"""
+    return serve(request, path, document_root=settings.MEDIA_ROOT)
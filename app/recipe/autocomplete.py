@@ -0,0 +1,124 @@
+"""
+Recipe title suggestions
+
+Prefix matches come from a sorted in-memory index of each user's titles,
+kept for the most recently active users. Fuzzy matches for the remaining
+slots use the pg_trgm index on PostgreSQL.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+
+from core import singleflight
+from core.models import Recipe
+
+
+class TitleIndex:
+    """Sorted, case-insensitive index of one user's recipe titles"""
+
+    def __init__(self, titles):
+        self.entries = sorted({(title.lower(), title) for title in titles})
+        self.keys = [key for key, _ in self.entries]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, prefix, limit):
+        """Return up to ``limit`` titles starting with prefix"""
+        prefix = prefix.lower()
+        results = []
+        position = bisect_left(self.keys, prefix)
+        for key, title in self.entries[position:]:
+            if not key.startswith(prefix) or len(results) >= limit:
+                break
+            results.append(title)
+        return results
+
+
+class TitleIndexCache:
+    """Per-process LRU cache of title indexes keyed by user
+
+    An index is rebuilt when the user's recipe version changes, and at
+    the latest AUTOCOMPLETE_INDEX_TTL seconds after it was built, in case
+    a version bump was lost. Least recently used indexes are dropped once
+    more than AUTOCOMPLETE_CACHE_USERS users or AUTOCOMPLETE_CACHE_TITLES
+    titles in total are kept, so a few users with very large recipe sets
+    cannot grow the worker's memory past the budget.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+        self._titles = 0
+
+    def get(self, user_id):
+        """Return the user's index, or None if they have too many titles"""
+        version = singleflight.get_version(f'recipes:{user_id}')
+        now = time.monotonic()
+        with self._lock:
+            cached = self._indexes.get(user_id)
+            if cached is not None and cached[0] == version and \
+                    now - cached[1] < settings.AUTOCOMPLETE_INDEX_TTL:
+                self._indexes.move_to_end(user_id)
+                return cached[2]
+
+        limit = settings.AUTOCOMPLETE_MAX_TITLES
+        titles = list(
+            Recipe.objects.filter(user_id=user_id)
+            .values_list('title', flat=True)[:limit + 1]
+        )
+        index = TitleIndex(titles) if len(titles) <= limit else None
+
+        with self._lock:
+            previous = self._indexes.pop(user_id, None)
+            if previous is not None:
+                self._titles -= len(previous[2] or ())
+            self._indexes[user_id] = (version, now, index)
+            self._titles += len(index or ())
+            while len(self._indexes) > settings.AUTOCOMPLETE_CACHE_USERS or \
+                    self._titles > settings.AUTOCOMPLETE_CACHE_TITLES:
+                _, (_, _, evicted) = self._indexes.popitem(last=False)
+                self._titles -= len(evicted or ())
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+            self._titles = 0
+
+
+indexes = TitleIndexCache()
+
+
+def suggest_titles(user, query, limit):
+    """Return up to ``limit`` distinct titles matching query"""
+    recipes = Recipe.objects.filter(user=user)
+    index = indexes.get(user.pk)
+    if index is not None:
+        results = index.search(query, limit)
+    else:
+        results = list(
+            recipes.filter(title__istartswith=query)
+            .order_by('title')
+            .values_list('title', flat=True)
+            .distinct()[:limit]
+        )
+
+    if len(results) < limit and len(query) >= 3:
+        if connection.vendor == 'postgresql':
+            from django.contrib.postgres.search import TrigramSimilarity
+            fuzzy = recipes.filter(title__trigram_similar=query).annotate(
+                similarity=TrigramSimilarity('title', query),
+            ).order_by('-similarity')
+        else:
+            fuzzy = recipes.filter(title__icontains=query).order_by('title')
+        for title in fuzzy.values_list('title', flat=True)[:limit * 2]:
+            if title not in results:
+                results.append(title)
+            if len(results) >= limit:
+                break
+    return results
@@ -0,0 +1,171 @@
+"""
+Recipe image storage and thumbnailing
+
+Uploads are streamed to a temporary file while being hashed, then moved
+into storage under their SHA-256, so a file name never changes meaning
+and can be cached forever. Thumbnails are rendered by a small pool of
+spawned processes after the upload transaction commits; when the pool is
+busy or fails the work goes to the background job queue instead.
+"""
+import hashlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import (
+    SkipFile, TemporaryFileUploadHandler)
+from django.db import connection
+from PIL import Image
+
+from core import singleflight
+from core.images import THUMBNAIL_EXTENSION, render_thumbnails
+from core.jobs import task
+from core.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Formats accepted for storage; phone cameras often write JPEGs that
+# Pillow reads as MPO (multi-picture JPEG)
+EXTENSIONS = {
+    'JPEG': 'jpg', 'MPO': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp',
+}
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """Write uploads to a temporary file, hashing them chunk by chunk"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.too_large = True
+            self.file.close()
+            raise SkipFile()
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.sha256.hexdigest()
+        return uploaded
+
+
+def image_name(digest, extension, size=None):
+    """Return the storage name of an image or one of its thumbnails"""
+    suffix = f'-{size}' if size else ''
+    return f'recipes/{digest[:2]}/{digest}{suffix}.{extension}'
+
+
+def store_image(uploaded):
+    """Store a validated upload under its content hash, return the name"""
+    with Image.open(uploaded.temporary_file_path()) as image:
+        extension = EXTENSIONS[image.format]
+    name = image_name(uploaded.sha256, extension)
+    # Identical content is stored once
+    if not default_storage.exists(name):
+        saved = default_storage.save(name, uploaded)
+        if saved != name:
+            raise RuntimeError(f'{name} was stored as {saved}')
+    return name
+
+
+def _source(name):
+    """Return something render_thumbnails can open for a stored image"""
+    try:
+        return default_storage.path(name)
+    except NotImplementedError:
+        with default_storage.open(name) as file:
+            return file.read()
+
+
+def save_thumbnails(recipe_id, name, thumbnails):
+    """Store rendered thumbnails and attach them to the recipe
+
+    Nothing is attached when the recipe's image has changed meanwhile.
+    """
+    digest = name.rsplit('/', 1)[-1].split('.')[0]
+    names = {}
+    for size, content in thumbnails.items():
+        thumbnail = image_name(digest, THUMBNAIL_EXTENSION, size)
+        if not default_storage.exists(thumbnail):
+            default_storage.save(thumbnail, ContentFile(content))
+        names[str(size)] = thumbnail
+
+    recipes = Recipe.objects.filter(pk=recipe_id, image=name)
+    user_id = recipes.values_list('user_id', flat=True).first()
+    if user_id is not None:
+        recipes.update(thumbnails=names)
+        singleflight.bump_version(f'recipes:{user_id}')
+
+
+@task
+def generate_thumbnails(recipe_id):
+    """Render the thumbnails of a recipe's image in the worker process"""
+    name = Recipe.objects.filter(pk=recipe_id).values_list(
+        'image', flat=True).first()
+    if name:
+        save_thumbnails(recipe_id, name, render_thumbnails(
+            _source(name), settings.RECIPE_THUMBNAIL_SIZES))
+
+
+_lock = threading.Lock()
+_pool = None
+_slots = None
+
+
+def _executor():
+    global _pool, _slots
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                settings.RECIPE_THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            _slots = threading.BoundedSemaphore(
+                settings.RECIPE_THUMBNAIL_QUEUE_SIZE)
+        return _pool, _slots
+
+
+def schedule_thumbnails(recipe):
+    """Render a recipe's thumbnails in the process pool
+
+    At most RECIPE_THUMBNAIL_QUEUE_SIZE images wait for the pool; beyond
+    that thumbnails are left to the job queue.
+    """
+    pool, slots = _executor()
+    if not slots.acquire(blocking=False):
+        generate_thumbnails.delay(recipe.pk)
+        return None
+    try:
+        future = pool.submit(
+            render_thumbnails, _source(recipe.image.name),
+            settings.RECIPE_THUMBNAIL_SIZES)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(
+        partial(_rendered, slots, recipe.pk, recipe.image.name))
+    return future
+
+
+def _rendered(slots, recipe_id, name, future):
+    """Store thumbnails once the pool has rendered them"""
+    slots.release()
+    try:
+        save_thumbnails(recipe_id, name, future.result())
+    except Exception:
+        logger.exception('Rendering thumbnails of %s failed', name)
+        generate_thumbnails.delay(recipe_id)
+    finally:
+        # Callbacks run on the pool's management thread
+        connection.close()
@@ -1,9 +1,12 @@
 """
 Serializers for recipe app
 """
+from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 
-from core.models import Recipe
+from core.models import Recipe, RecipeStats
+from recipe.images import EXTENSIONS
 
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer for recipe objects"""
@@ -17,9 +20,84 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail objects"""
+    thumbnails = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
         fields = (
             'id', 'title', 'time_minutes', 'price', 'link', 'description',
+            'image', 'thumbnails',
         )
-        read_only_fields = ('id',)
\ No newline at end of file
+        read_only_fields = ('id', 'image')
+
+    def get_thumbnails(self, recipe):
+        """Return thumbnail URLs keyed by their size in pixels"""
+        request = self.context.get('request')
+        urls = {}
+        for size, name in sorted(
+                recipe.thumbnails.items(), key=lambda item: int(item[0])):
+            url = default_storage.url(name)
+            urls[size] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
+def absolute_media_urls(data, request):
+    """Return recipe detail data with media URLs absolute for request
+
+    Detail data serialized without a request, as it is for the cache,
+    holds URLs relative to the host; each client gets its own host back.
+    """
+    data = dict(data)
+    if data['image']:
+        data['image'] = request.build_absolute_uri(data['image'])
+    data['thumbnails'] = {
+        size: request.build_absolute_uri(url)
+        for size, url in data['thumbnails'].items()
+    }
+    return data
+
+
+class RecipeImageSerializer(serializers.Serializer):
+    """Serializer for uploading an image to a recipe"""
+    image = serializers.ImageField()
+
+    def validate_image(self, value):
+        """Accept only the formats images are stored as"""
+        if value.image.format not in EXTENSIONS:
+            raise serializers.ValidationError(
+                f'Unsupported image format {value.image.format}; use one of '
+                f"{', '.join(sorted(set(EXTENSIONS) - {'MPO'}))}.")
+        return value
+
+
+class RecipeStatsSerializer(serializers.ModelSerializer):
+    """Serializer for per-user recipe statistics"""
+    time_minutes_avg = serializers.FloatField(read_only=True)
+    price_avg = serializers.DecimalField(
+        max_digits=16, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = RecipeStats
+        fields = (
+            'recipe_count', 'time_minutes_avg',
+            'price_min', 'price_max', 'price_avg',
+        )
+        read_only_fields = fields
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    """Serializer for a list of recipe ids to fetch in one request"""
+
+    def get_fields(self):
+        """Return the ids field, capped by RECIPE_BATCH_MAX_IDS"""
+        fields = super().get_fields()
+        fields['ids'] = serializers.ListField(
+            child=serializers.IntegerField(min_value=1),
+            allow_empty=False,
+            max_length=settings.RECIPE_BATCH_MAX_IDS,
+        )
+        return fields
+
+    def validate_ids(self, value):
+        """Drop duplicates, keeping request order"""
+        return list(dict.fromkeys(value))
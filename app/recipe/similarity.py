@@ -0,0 +1,247 @@
+"""
+Similar recipe lookups over a precomputed, memory-mapped feature index
+
+Each recipe is turned into a hashed TF-IDF vector of its title and
+description words plus the log of its preparation time and price. The
+vectors are written as ``.npy`` files by the build_similarity_index
+command and opened with ``mmap_mode='r'``, so every worker process shares
+the same pages. Rows are sorted by (user, id): a user's recipes form one
+contiguous block and a query is a single matrix-vector product over it.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from core.models import Recipe
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+# Title words count more than description words
+TITLE_WEIGHT = 2.0
+# Share of the score coming from text, the rest from time and price
+TEXT_WEIGHT = 0.8
+CURRENT = 'current'
+FIELDS = ('id', 'title', 'description', 'time_minutes', 'price')
+
+
+def _bucket(word, dimensions):
+    """Return the stable (index, sign) of a word in the hashed space"""
+    digest = zlib.crc32(word.encode())
+    return digest % dimensions, 1.0 if digest & 0x80000000 else -1.0
+
+
+def term_frequencies(rows, dimensions):
+    """Return hashed, log scaled term frequencies for recipe value rows
+
+    ``rows`` are dicts with at least ``title`` and ``description``.
+    """
+    matrix = np.zeros((len(rows), dimensions), dtype=np.float32)
+    for position, row in enumerate(rows):
+        vector = matrix[position]
+        for text, weight in ((row['title'], TITLE_WEIGHT),
+                             (row['description'], 1.0)):
+            for word in WORD_RE.findall((text or '').lower()):
+                index, sign = _bucket(word, dimensions)
+                vector[index] += sign * weight
+    return np.sign(matrix) * np.log1p(np.abs(matrix))
+
+
+def numeric_features(rows):
+    """Return log scaled preparation time and price for recipe rows"""
+    return np.log1p(np.array(
+        [[max(row['time_minutes'], 0), max(float(row['price']), 0.0)]
+         for row in rows],
+        dtype=np.float32,
+    ).reshape(len(rows), 2))
+
+
+def normalize(matrix):
+    """Scale each row to unit length, leaving empty rows at zero"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+class SimilarityIndex:
+    """One built version of the index, opened read-only"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / 'meta.json').read_text())
+        self.users = np.load(self.path / 'users.npy', mmap_mode='r')
+        self.ids = np.load(self.path / 'ids.npy', mmap_mode='r')
+        self.vectors = np.load(self.path / 'vectors.npy', mmap_mode='r')
+        self.numeric = np.load(self.path / 'numeric.npy', mmap_mode='r')
+        self.idf = np.load(self.path / 'idf.npy')
+
+    def vectorize(self, rows):
+        """Return normalized TF-IDF vectors for recipes not in the index"""
+        return normalize(
+            term_frequencies(rows, self.idf.shape[0]) * self.idf)
+
+    def similar(self, recipe, limit):
+        """Return ids of the owner's recipes most similar to recipe"""
+        start, end = np.searchsorted(
+            self.users, [recipe.user_id, recipe.user_id + 1])
+        if end - start == 0:
+            return []
+        vectors = self.vectors[start:end]
+        ids = self.ids[start:end]
+
+        position = np.searchsorted(ids, recipe.id)
+        if position < len(ids) and ids[position] == recipe.id:
+            query = vectors[position]
+        else:
+            row = {field: getattr(recipe, field) for field in FIELDS}
+            query = self.vectorize([row])[0]
+        numeric = numeric_features([{
+            'time_minutes': recipe.time_minutes, 'price': recipe.price}])[0]
+
+        text_score = vectors @ query
+        closeness = np.exp(-np.abs(self.numeric[start:end] - numeric).sum(1))
+        scores = TEXT_WEIGHT * text_score + (1 - TEXT_WEIGHT) * closeness
+        scores[ids == recipe.id] = -np.inf
+
+        count = min(limit, len(ids) - 1)
+        if count <= 0:
+            return []
+        best = np.argpartition(-scores, count - 1)[:count]
+        best = best[np.argsort(-scores[best])]
+        return [int(pk) for pk in ids[best]]
+
+
+_lock = threading.Lock()
+_loaded = {'target': None, 'index': None}
+
+
+def load_index():
+    """Return the current index, reopening it when a new one was built"""
+    link = Path(settings.RECIPE_SIMILARITY_DIR) / CURRENT
+    try:
+        target = link.parent / os.readlink(link)
+    except OSError:
+        return None
+    with _lock:
+        if _loaded['target'] != target:
+            _loaded['index'] = SimilarityIndex(target)
+            _loaded['target'] = target
+        return _loaded['index']
+
+
+def similar_recipe_ids(recipe, limit):
+    """Return ids of recipes similar to recipe, best first"""
+    index = load_index()
+    if index is None:
+        return []
+    return index.similar(recipe, limit)
+
+
+def build_index(full=False, chunk_size=2000, keep=2, log=None):
+    """Write a new version of the index and make it current
+
+    Unless ``full`` is set, vectors of recipes unchanged since the previous
+    build are copied over and only new or edited recipes are vectorized
+    with the previous document frequencies.
+    """
+    root = Path(settings.RECIPE_SIMILARITY_DIR)
+    root.mkdir(parents=True, exist_ok=True)
+    dimensions = settings.RECIPE_SIMILARITY_DIMENSIONS
+    previous = None if full else load_index()
+    if previous is not None and previous.idf.shape[0] != dimensions:
+        previous = None
+    started = timezone.now()
+
+    rows = np.array(
+        Recipe.objects.order_by('user_id', 'id')
+        .values_list('user_id', 'id'),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    count = len(rows)
+    path = root / f'build-{time.time_ns()}'
+    path.mkdir()
+    np.save(path / 'users.npy', rows[:, 0])
+    np.save(path / 'ids.npy', rows[:, 1])
+    vectors = np.lib.format.open_memmap(
+        path / 'vectors.npy', mode='w+', dtype=np.float32,
+        shape=(count, dimensions))
+    numeric = np.lib.format.open_memmap(
+        path / 'numeric.npy', mode='w+', dtype=np.float32, shape=(count, 2))
+
+    # Positions that need vectorizing, everything else is copied over
+    todo = np.arange(count)
+    if previous is not None:
+        changed = set(
+            Recipe.objects.filter(updated_at__gte=previous.meta['built_at'])
+            .values_list('id', flat=True)
+        )
+        order = np.argsort(previous.ids)
+        old_ids = previous.ids[order]
+        found = np.searchsorted(old_ids, rows[:, 1]).clip(0, len(old_ids) - 1)
+        reuse = (old_ids[found] == rows[:, 1]) if len(old_ids) else \
+            np.zeros(count, dtype=bool)
+        if changed:
+            reuse &= ~np.isin(rows[:, 1], list(changed))
+        source = order[found[reuse]]
+        vectors[reuse] = previous.vectors[source]
+        numeric[reuse] = previous.numeric[source]
+        todo = np.flatnonzero(~reuse)
+        idf = previous.idf
+    else:
+        document_frequency = np.zeros(dimensions, dtype=np.int64)
+
+    for offset in range(0, len(todo), chunk_size):
+        positions = todo[offset:offset + chunk_size]
+        recipes = Recipe.objects.in_bulk(
+            rows[positions, 1].tolist(), field_name='id')
+        chunk = [
+            {field: getattr(recipes[pk], field) for field in FIELDS}
+            if pk in recipes else
+            {'title': '', 'description': '', 'time_minutes': 0, 'price': 0}
+            for pk in rows[positions, 1].tolist()
+        ]
+        frequencies = term_frequencies(chunk, dimensions)
+        if previous is not None:
+            vectors[positions] = normalize(frequencies * idf)
+        else:
+            vectors[positions] = frequencies
+            document_frequency += (frequencies != 0).sum(axis=0)
+        numeric[positions] = numeric_features(chunk)
+        if log:
+            log(f'Vectorized {offset + len(positions)} of {len(todo)} recipes')
+
+    if previous is None:
+        idf = (np.log((1 + count) / (1 + document_frequency)) + 1).astype(
+            np.float32)
+        for offset in range(0, count, chunk_size):
+            block = slice(offset, offset + chunk_size)
+            vectors[block] = normalize(vectors[block] * idf)
+
+    vectors.flush()
+    numeric.flush()
+    del vectors, numeric
+    np.save(path / 'idf.npy', idf)
+    (path / 'meta.json').write_text(json.dumps({
+        'built_at': started.isoformat(),
+        'count': count,
+        'dimensions': dimensions,
+        'vectorized': int(len(todo)),
+    }))
+
+    link = root / f'{CURRENT}.tmp'
+    if link.is_symlink():
+        link.unlink()
+    link.symlink_to(path.name)
+    os.replace(link, root / CURRENT)
+
+    builds = sorted(root.glob('build-*'))
+    for old in builds[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+    return path, int(len(todo))
@@ -0,0 +1,164 @@
+"""
+Columnar snapshot of the recipe table for site-wide reporting
+
+The export_recipe_snapshot command streams recipes into one raw binary
+file per column. Reports open them with ``np.memmap`` and aggregate with
+vectorized NumPy operations, so reporting never queries core_recipe.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from core.models import Recipe
+
+CURRENT = 'current'
+COLUMNS = {
+    'id': np.dtype('<i8'),
+    'user_id': np.dtype('<i8'),
+    'time_minutes': np.dtype('<i4'),
+    'price_cents': np.dtype('<i8'),
+}
+PERCENTILES = (50, 75, 90, 95, 99)
+
+
+class Snapshot:
+    """One exported snapshot, opened read-only"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / 'meta.json').read_text())
+        self.columns = {
+            name: np.memmap(
+                self.path / f'{name}.bin', dtype=dtype, mode='r',
+                shape=(self.meta['count'],),
+            ) if self.meta['count'] else np.zeros(0, dtype=dtype)
+            for name, dtype in COLUMNS.items()
+        }
+        self._reports = {}
+
+    def report(self, bins):
+        """Return counts, distributions and per-user totals"""
+        if bins not in self._reports:
+            self._reports[bins] = self._report(bins)
+        return self._reports[bins]
+
+    def _report(self, bins):
+        users = self.columns['user_id']
+        per_user = np.unique(users, return_counts=True)[1] if len(users) \
+            else np.zeros(0, dtype=np.int64)
+        return {
+            'exported_at': self.meta['exported_at'],
+            'recipes': int(self.meta['count']),
+            'users': int(len(per_user)),
+            'recipes_per_user': distribution(per_user, bins),
+            'time_minutes': distribution(self.columns['time_minutes'], bins),
+            'price': distribution(
+                self.columns['price_cents'], bins, scale=100),
+        }
+
+
+def distribution(values, bins, scale=1):
+    """Return summary statistics, percentiles and a histogram of values"""
+    if not len(values):
+        return {
+            'min': None, 'max': None, 'mean': None,
+            'percentiles': {}, 'histogram': [],
+        }
+    values = np.asarray(values, dtype=np.float64) / scale
+    counts, edges = np.histogram(values, bins=bins)
+    return {
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'mean': round(float(values.mean()), 2),
+        'percentiles': {
+            str(rank): float(value)
+            for rank, value in zip(
+                PERCENTILES, np.percentile(values, PERCENTILES))
+        },
+        'histogram': [
+            {'start': float(start), 'end': float(end), 'count': int(count)}
+            for start, end, count in zip(edges[:-1], edges[1:], counts)
+        ],
+    }
+
+
+_lock = threading.Lock()
+_loaded = {'target': None, 'snapshot': None}
+
+
+def load_snapshot():
+    """Return the current snapshot, reopening it after a new export"""
+    link = Path(settings.RECIPE_SNAPSHOT_DIR) / CURRENT
+    try:
+        target = link.parent / os.readlink(link)
+    except OSError:
+        return None
+    with _lock:
+        if _loaded['target'] != target:
+            _loaded['snapshot'] = Snapshot(target)
+            _loaded['target'] = target
+        return _loaded['snapshot']
+
+
+def export(using='default', chunk_size=10000, keep=2, log=None):
+    """Write a new snapshot of all recipes and make it current
+
+    Recipes are read in id order one chunk per query, so the export never
+    holds a long transaction open; point ``using`` at a replica to keep
+    the load off the primary entirely.
+    """
+    root = Path(settings.RECIPE_SNAPSHOT_DIR)
+    root.mkdir(parents=True, exist_ok=True)
+    path = root / f'snapshot-{time.time_ns()}'
+    path.mkdir()
+    started = timezone.now()
+
+    files = {name: open(path / f'{name}.bin', 'wb') for name in COLUMNS}
+    recipes = Recipe.objects.using(using).order_by('id').values_list(
+        'id', 'user_id', 'time_minutes', 'price')
+    count = last_id = 0
+    try:
+        while True:
+            rows = list(recipes.filter(id__gt=last_id)[:chunk_size])
+            if not rows:
+                break
+            ids, users, minutes, prices = zip(*rows)
+            columns = {
+                'id': ids,
+                'user_id': users,
+                'time_minutes': minutes,
+                'price_cents': np.rint(
+                    np.asarray(prices, dtype=np.float64) * 100),
+            }
+            for name, values in columns.items():
+                files[name].write(
+                    np.asarray(values).astype(COLUMNS[name]).tobytes())
+            count += len(rows)
+            last_id = ids[-1]
+            if log:
+                log(f'Exported {count} recipes')
+    finally:
+        for file in files.values():
+            file.close()
+
+    (path / 'meta.json').write_text(json.dumps({
+        'exported_at': started.isoformat(),
+        'count': count,
+    }))
+
+    link = root / f'{CURRENT}.tmp'
+    if link.is_symlink():
+        link.unlink()
+    link.symlink_to(path.name)
+    os.replace(link, root / CURRENT)
+
+    for old in sorted(root.glob('snapshot-*'))[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+    return path, count
@@ -0,0 +1,136 @@
+"""
+Server-sent event stream of the authenticated user's recipe changes
+
+Served directly by the ASGI application (see app/asgi.py) so an idle
+client holds no worker thread. Browsers' EventSource cannot set headers,
+so such clients first exchange their token for a short-lived, single-use
+ticket and pass that as ``?ticket=``; the API token itself never appears
+in a URL.
+"""
+import asyncio
+import json
+import secrets
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+
+from core.events import hub
+
+PATH = '/api/recipe/events/'
+
+
+def _ticket_key(ticket):
+    return f'stream-ticket:{ticket}'
+
+
+def issue_ticket(user):
+    """Return a ticket opening one stream as the user"""
+    ticket = secrets.token_urlsafe(32)
+    cache.set(
+        _ticket_key(ticket), user.pk, settings.RECIPE_EVENTS_TICKET_TTL)
+    return ticket
+
+
+@sync_to_async
+def authenticate(scope):
+    """Return the active user of the request's token or ticket, or None"""
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization':
+            parts = value.decode('latin-1').split()
+            if len(parts) == 2 and parts[0].lower() == 'token':
+                token = Token.objects.select_related('user').filter(
+                    key=parts[1]).first()
+                if token is not None and token.user.is_active:
+                    return token.user
+                return None
+
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    ticket = query.get('ticket', [None])[0]
+    if not ticket:
+        return None
+    key = _ticket_key(ticket)
+    user_id = cache.get(key)
+    # Only the caller that deletes the ticket may use it
+    if user_id is None or not cache.delete(key):
+        return None
+    return get_user_model().objects.filter(
+        pk=user_id, is_active=True).first()
+
+
+def format_event(event):
+    """Return one event in the text/event-stream format"""
+    return (
+        f"event: {event['event']}\n"
+        f'data: {json.dumps(event, separators=(",", ":"))}\n\n'
+    ).encode()
+
+
+async def recipe_events(scope, receive, send):
+    """ASGI application streaming recipe events to one client"""
+    user = await authenticate(scope)
+    if user is None:
+        await send({
+            'type': 'http.response.start',
+            'status': 401,
+            'headers': [(b'content-type', b'application/json')],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': b'{"detail":"Invalid or missing token or ticket."}',
+        })
+        return
+
+    queue = hub.subscribe(user.pk)
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': b'retry: 5000\n\n',
+            'more_body': True,
+        })
+
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        try:
+            while not disconnected.done():
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait(
+                    [getter, disconnected],
+                    timeout=settings.RECIPE_EVENTS_KEEPALIVE,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if getter.done():
+                    body = format_event(getter.result())
+                elif disconnected.done():
+                    getter.cancel()
+                    break
+                else:
+                    getter.cancel()
+                    body = b': keepalive\n\n'
+                await send({
+                    'type': 'http.response.body',
+                    'body': body,
+                    'more_body': True,
+                })
+        finally:
+            disconnected.cancel()
+    finally:
+        hub.unsubscribe(user.pk, queue)
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
@@ -1,19 +1,38 @@
 """
 Tests for the recipe API
 """
+import hashlib
+import os
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.core.management import call_command
 from django.contrib.auth import get_user_model
 from decimal import Decimal
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Recipe
+from core import singleflight
+from core.models import Recipe, RecipeStats
 
+from recipe import images
+from recipe.autocomplete import TitleIndexCache
 from recipe.serializers import RecipeSerializer
 from recipe.serializers import RecipeDetailSerializer
 
+STATS_URL = reverse('recipe:recipe-stats')
+BATCH_URL = reverse('recipe:recipe-batch')
+AUTOCOMPLETE_URL = reverse('recipe:recipe-autocomplete')
+DUPLICATES_URL = reverse('recipe:recipe-duplicates')
+REPORT_URL = reverse('recipe:report')
+
 def create_recipe(user, **params):
     """Helper function to create a recipe"""
     defaults = {
@@ -27,6 +46,10 @@ def create_recipe(user, **params):
     recipe=Recipe.objects.create(user=user, **defaults)
     return recipe
 
+def similar_url(recipe_id):
+    """Return similar recipes URL"""
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
 def detail_url(recipe_id):
     """Return recipe detail URL"""
     return reverse('recipe:recipe-detail', args=[recipe_id])
@@ -175,4 +198,504 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
         self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
 
+    def test_recipe_stats(self):
+        """Test statistics follow recipe creates, updates and deletes"""
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 0)
+        self.assertIsNone(res.data['price_avg'])
+
+        url = reverse('recipe:recipe-list')
+        payloads = [
+            {'title': 'Soup', 'time_minutes': 10, 'price': Decimal('2.00')},
+            {'title': 'Stew', 'time_minutes': 30, 'price': Decimal('8.00')},
+            {'title': 'Pie', 'time_minutes': 20, 'price': Decimal('5.00')},
+        ]
+        ids = [self.client.post(url, payload).data['id']
+               for payload in payloads]
+
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res.data['recipe_count'], 3)
+        self.assertEqual(res.data['time_minutes_avg'], 20)
+        self.assertEqual(res.data['price_min'], '2.00')
+        self.assertEqual(res.data['price_max'], '8.00')
+        self.assertEqual(res.data['price_avg'], '5.00')
+
+        self.client.patch(detail_url(ids[1]), {'price': Decimal('4.00')})
+        self.client.delete(detail_url(ids[0]))
+
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res.data['recipe_count'], 2)
+        self.assertEqual(res.data['time_minutes_avg'], 25)
+        self.assertEqual(res.data['price_min'], '4.00')
+        self.assertEqual(res.data['price_max'], '5.00')
+        self.assertEqual(res.data['price_avg'], '4.50')
+
+    def test_recipe_stats_limited_to_user(self):
+        """Test statistics only count the user's own recipes"""
+        other = create_user(email='other@example.com', password='testpass')
+        create_recipe(user=other)
+        create_recipe(user=self.user, price=Decimal('3.00'))
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipe_count'], 1)
+        self.assertEqual(res.data['price_max'], '3.00')
+        self.assertEqual(RecipeStats.objects.get(user=other).recipe_count, 1)
+
+    def test_batch_retrieve_preserves_order(self):
+        """Test retrieving several recipes by id in request order"""
+        first = create_recipe(user=self.user, title='First')
+        second = create_recipe(user=self.user, title='Second')
+        other = create_recipe(
+            user=create_user(email='other@example.com', password='testpass'))
+        ids = [second.id, 999999, first.id, other.id, second.id]
+
+        res = self.client.get(
+            BATCH_URL, {'ids': ','.join(str(pk) for pk in ids)})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'],
+            RecipeDetailSerializer([second, first], many=True).data,
+        )
+        self.assertEqual(res.data['missing'], [999999, other.id])
+
+    def test_batch_retrieve_post_body(self):
+        """Test ids can be sent in a POST body"""
+        recipe = create_recipe(user=self.user)
+
+        res = self.client.post(BATCH_URL, {'ids': [recipe.id]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'][0]['id'], recipe.id)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    @override_settings(RECIPE_BATCH_MAX_IDS=2)
+    def test_batch_retrieve_limit(self):
+        """Test requesting too many ids returns an error"""
+        res = self.client.get(BATCH_URL, {'ids': '1,2,3'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_BATCH_MAX_IDS=2)
+    def test_batch_retrieve_limit_counts_duplicates(self):
+        """Test the cap applies to the ids sent, before deduplication"""
+        res = self.client.post(
+            BATCH_URL, {'ids': [1] * 3}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_retrieve_invalid_ids(self):
+        """Test non numeric ids are rejected"""
+        res = self.client.get(BATCH_URL, {'ids': '1,abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cached_list_invalidated_by_writes(self):
+        """Test cached recipe responses reflect later changes"""
+        recipe = create_recipe(user=self.user, title='Original')
+        url = reverse('recipe:recipe-list')
+        self.client.get(url)
+        self.client.get(detail_url(recipe.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.title = 'Changed'
+            recipe.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(user=self.user, title='Another')
+
+        res = self.client.get(url)
+        self.assertEqual(
+            [item['title'] for item in res.data], ['Another', 'Changed'])
+        res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(res.data['title'], 'Changed')
+
+    def test_cache_invalidated_after_commit(self):
+        """Test cached responses are dropped only once a write commits"""
+        namespace = f'recipes:{self.user.id}'
+        version = singleflight.get_version(namespace)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(user=self.user)
+            self.assertEqual(singleflight.get_version(namespace), version)
+
+        self.assertNotEqual(singleflight.get_version(namespace), version)
+
+    def test_autocomplete_prefix(self):
+        """Test title suggestions match prefixes case-insensitively"""
+        for title in ('Pancakes', 'pasta bake', 'Pasta salad', 'Soup'):
+            create_recipe(user=self.user, title=title)
+        create_recipe(
+            user=create_user(email='other@example.com', password='testpass'),
+            title='Pastry',
+        )
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'pas'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], ['pasta bake', 'Pasta salad'])
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'pa', 'limit': 1})
+        self.assertEqual(res.data['results'], ['Pancakes'])
+
+    def test_autocomplete_fragment_and_updates(self):
+        """Test fragments inside titles match and new titles show up"""
+        create_recipe(user=self.user, title='Chicken tikka')
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'tikka'})
+        self.assertEqual(res.data['results'], ['Chicken tikka'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(user=self.user, title='Tikka masala')
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'tikka'})
+        self.assertEqual(
+            res.data['results'], ['Tikka masala', 'Chicken tikka'])
+
+    @override_settings(AUTOCOMPLETE_INDEX_TTL=60)
+    def test_autocomplete_index_expires(self):
+        """Test a title index is rebuilt after its TTL without a bump"""
+        create_recipe(user=self.user, title='Chicken tikka')
+        with patch('recipe.autocomplete.time.monotonic', return_value=0):
+            self.client.get(AUTOCOMPLETE_URL, {'q': 'ti'})
+        # Written without bumping the cache version, as if by another
+        # process whose bump was lost
+        Recipe.objects.bulk_create([Recipe(
+            user=self.user, title='Tikka masala', time_minutes=5,
+            price=Decimal('1.00'))])
+
+        with patch('recipe.autocomplete.time.monotonic', return_value=30):
+            res = self.client.get(AUTOCOMPLETE_URL, {'q': 'ti'})
+        self.assertEqual(res.data['results'], [])
+        with patch('recipe.autocomplete.time.monotonic', return_value=61):
+            res = self.client.get(AUTOCOMPLETE_URL, {'q': 'ti'})
+        self.assertEqual(res.data['results'], ['Tikka masala'])
+
+    @override_settings(AUTOCOMPLETE_CACHE_TITLES=3)
+    def test_autocomplete_cache_bounded_by_titles(self):
+        """Test indexes are evicted once too many titles are kept"""
+        other = create_user(email='other@example.com', password='testpass')
+        for user in (self.user, other):
+            create_recipe(user=user, title='Pancakes')
+            create_recipe(user=user, title='Pasta')
+        indexes = TitleIndexCache()
+
+        indexes.get(self.user.pk)
+        indexes.get(other.pk)
+
+        self.assertEqual(list(indexes._indexes), [other.pk])
+        self.assertEqual(indexes._titles, 2)
+
+    def test_autocomplete_empty_query(self):
+        """Test an empty query returns no suggestions"""
+        create_recipe(user=self.user)
+
+        res = self.client.get(AUTOCOMPLETE_URL)
+
+        self.assertEqual(res.data['results'], [])
+
+    def build_similarity_index(self, *args):
+        """Build the similar recipe index"""
+        call_command('build_similarity_index', *args, stdout=StringIO())
+
+    def test_similar_recipes(self):
+        """Test similar recipes are ranked by text and time/price"""
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(RECIPE_SIMILARITY_DIR=directory):
+            base = create_recipe(
+                user=self.user, title='Tomato pasta',
+                description='Pasta with tomato sauce and basil')
+            close = create_recipe(
+                user=self.user, title='Creamy tomato pasta',
+                description='Pasta with tomato and cream sauce')
+            create_recipe(
+                user=self.user, title='Chocolate cake',
+                description='Sweet cake with dark chocolate')
+            create_recipe(
+                user=create_user(email='other@example.com', password='pass'),
+                title='Tomato pasta', description='Pasta with tomato sauce')
+
+            res = self.client.get(similar_url(base.id))
+            self.assertEqual(res.data['results'], [])
+
+            self.build_similarity_index()
+            res = self.client.get(similar_url(base.id), {'limit': 1})
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                res.data['results'], RecipeSerializer([close], many=True).data)
+
+    def test_similar_recipes_incremental_build(self):
+        """Test an incremental build picks up edited and deleted recipes"""
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(RECIPE_SIMILARITY_DIR=directory):
+            base = create_recipe(
+                user=self.user, title='Lentil soup',
+                description='Red lentil soup with cumin')
+            soup = create_recipe(
+                user=self.user, title='Lentil curry',
+                description='Lentils cooked with cumin')
+            cake = create_recipe(
+                user=self.user, title='Carrot cake',
+                description='Cake with walnuts')
+            self.build_similarity_index('--full')
+
+            cake.title = 'Lentil soup with carrot'
+            cake.description = 'Red lentil soup with cumin and carrot'
+            cake.save()
+            soup.delete()
+            self.build_similarity_index()
+
+            res = self.client.get(similar_url(base.id))
+
+            ids = [item['id'] for item in res.data['results']]
+            self.assertEqual(ids, [cake.id])
+
+    def test_duplicate_recipes(self):
+        """Test near-identical recipes of the user are grouped"""
+        description = 'Whisk eggs with milk and flour, then fry in butter'
+        first = create_recipe(
+            user=self.user, title='Pancakes', description=description)
+        create_recipe(
+            user=self.user, title='Crepes',
+            description='Fold the crepes around ham and cheese')
+        copy = create_recipe(
+            user=self.user, title='Pancakes',
+            description=description + '.')
+        create_recipe(
+            user=create_user(email='other@example.com', password='pass'),
+            title='Pancakes', description=description)
+
+        res = self.client.get(DUPLICATES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['groups'],
+            [RecipeSerializer([first, copy], many=True).data],
+        )
+
+    def test_duplicate_recipes_after_edit(self):
+        """Test editing a copy into a different recipe ungroups it"""
+        first = create_recipe(user=self.user, title='Lemon tart')
+        copy = create_recipe(user=self.user, title='Lemon tart')
+        res = self.client.get(DUPLICATES_URL)
+        self.assertEqual(len(res.data['groups']), 1)
+
+        self.client.patch(detail_url(copy.id), {
+            'title': 'Beef stew',
+            'description': 'Slow cooked beef with carrots and red wine',
+        })
+
+        res = self.client.get(DUPLICATES_URL)
+        self.assertEqual(res.data['groups'], [])
+        self.assertTrue(Recipe.objects.filter(pk=first.id).exists())
+
+
+class RecipeReportApiTests(TestCase):
+    """Test the admin recipe report"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_superuser(
+            'admin@example.com', 'testpass')
+        self.client.force_authenticate(self.admin)
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            RECIPE_SNAPSHOT_DIR=self.directory.name)
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.directory.cleanup()
+
+    def test_report_requires_staff(self):
+        """Test regular users cannot read the report"""
+        user = create_user(email='user@example.com', password='testpass')
+        self.client.force_authenticate(user)
+
+        res = self.client.get(REPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_report_without_snapshot(self):
+        """Test the report is unavailable before the first export"""
+        res = self.client.get(REPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_report_from_snapshot(self):
+        """Test distributions are computed from the exported snapshot"""
+        other = create_user(email='user@example.com', password='testpass')
+        for minutes, price in ((10, '1.50'), (20, '2.50'), (30, '3.50')):
+            create_recipe(
+                user=self.admin, time_minutes=minutes, price=Decimal(price))
+        create_recipe(user=other, time_minutes=40, price=Decimal('9.99'))
+        call_command(
+            'export_recipe_snapshot', chunk_size=3, stdout=StringIO())
+        create_recipe(user=other)
+
+        res = self.client.get(REPORT_URL, {'bins': 3})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipes'], 4)
+        self.assertEqual(res.data['users'], 2)
+        self.assertEqual(res.data['recipes_per_user']['max'], 3)
+        self.assertEqual(res.data['time_minutes']['mean'], 25)
+        self.assertEqual(res.data['time_minutes']['percentiles']['50'], 25)
+        self.assertEqual(res.data['price']['min'], 1.5)
+        self.assertEqual(res.data['price']['max'], 9.99)
+        self.assertEqual(
+            [bucket['count'] for bucket in res.data['price']['histogram']],
+            [3, 0, 1],
+        )
+
+
+def image_upload_url(recipe_id):
+    """Return the image upload URL of a recipe"""
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def image_file(size=(800, 600), format='JPEG'):
+    """Return an in-memory image file"""
+    content = BytesIO()
+    Image.new('RGB', size, color=(200, 80, 40)).save(content, format)
+    content.seek(0)
+    content.name = f'image.{format.lower()}'
+    return content
+
+
+class ImageUploadTests(TestCase):
+    """Test recipe image uploads"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='pass')
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = override_settings(MEDIA_ROOT=self.directory.name)
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.directory.cleanup()
+
+    @patch('recipe.images.schedule_thumbnails')
+    def test_upload_image(self, patched_schedule):
+        """Test an upload is stored under its content hash"""
+        upload = image_file()
+        digest = hashlib.sha256(upload.getvalue()).hexdigest()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                image_upload_url(self.recipe.id), {'image': upload},
+                format='multipart',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(
+            self.recipe.image.name, f'recipes/{digest[:2]}/{digest}.jpg')
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertTrue(res.data['image'].endswith(self.recipe.image.url))
+        self.assertEqual(res.data['thumbnails'], {})
+        patched_schedule.assert_called_once_with(self.recipe)
+
+    def test_upload_invalid_image(self):
+        """Test uploading something that is not an image fails"""
+        upload = BytesIO(b'not an image')
+        upload.name = 'image.jpg'
+
+        res = self.client.post(
+            image_upload_url(self.recipe.id), {'image': upload},
+            format='multipart',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_upload_unsupported_format(self):
+        """Test images in formats that are not stored are rejected"""
+        res = self.client.post(
+            image_upload_url(self.recipe.id),
+            {'image': image_file(format='BMP')},
+            format='multipart',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('BMP', res.data['image'][0])
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=1024)
+    def test_upload_too_large(self):
+        """Test uploads above the size limit are rejected"""
+        res = self.client.post(
+            image_upload_url(self.recipe.id),
+            {'image': image_file(format='PNG', size=(2000, 2000))},
+            format='multipart',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('too large', str(res.data['image']))
+
+    def test_thumbnails_in_detail(self):
+        """Test rendered thumbnails are listed with cacheable URLs"""
+        with patch('recipe.images.schedule_thumbnails'):
+            self.client.post(
+                image_upload_url(self.recipe.id), {'image': image_file()},
+                format='multipart',
+            )
+        images.generate_thumbnails(self.recipe.id)
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(list(res.data['thumbnails']), ['160', '480'])
+        url = res.data['thumbnails']['160']
+        self.assertRegex(url, r'/media/recipes/\w\w/\w{64}-160\.jpg$')
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('immutable', res['Cache-Control'])
+        with Image.open(BytesIO(b''.join(res.streaming_content))) as thumb:
+            self.assertEqual(thumb.size, (160, 120))
+
+    @override_settings(
+        ALLOWED_HOSTS=['testserver', 'internal', 'public.example.com'])
+    def test_cached_detail_urls_use_request_host(self):
+        """Test media URLs follow each client's host, not the cache's"""
+        with patch('recipe.images.schedule_thumbnails'):
+            self.client.post(
+                image_upload_url(self.recipe.id), {'image': image_file()},
+                format='multipart',
+            )
+        images.generate_thumbnails(self.recipe.id)
+        self.client.get(detail_url(self.recipe.id), HTTP_HOST='internal')
+
+        res = self.client.get(
+            detail_url(self.recipe.id), HTTP_HOST='public.example.com')
+
+        prefix = 'http://public.example.com/media/recipes/'
+        self.assertTrue(res.data['image'].startswith(prefix))
+        for url in res.data['thumbnails'].values():
+            self.assertTrue(url.startswith(prefix))
+
+    @patch('recipe.images.save_thumbnails')
+    def test_thumbnails_rendered_in_process_pool(self, patched_save):
+        """Test the process pool renders thumbnails off the request"""
+        with patch('recipe.images.schedule_thumbnails'):
+            self.client.post(
+                image_upload_url(self.recipe.id), {'image': image_file()},
+                format='multipart',
+            )
+        self.recipe.refresh_from_db()
+
+        with patch('recipe.images.connection'):
+            images.schedule_thumbnails(self.recipe).result(timeout=60)
+            for _ in range(100):
+                if patched_save.called:
+                    break
+                time.sleep(0.05)
 
+        recipe_id, name, thumbnails = patched_save.call_args.args
+        self.assertEqual(name, self.recipe.image.name)
+        self.assertEqual(sorted(thumbnails), [160, 480])
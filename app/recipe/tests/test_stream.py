@@ -0,0 +1,167 @@
+"""
+Tests for the recipe event stream
+"""
+import asyncio
+import json
+from unittest import skipIf
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import connection as db_connection
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import events
+from recipe import stream
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TICKET_URL = reverse('recipe:events-ticket')
+
+
+class FakeConnection:
+    """ASGI receive/send pair recording what the application sends"""
+
+    def __init__(self):
+        self.sent = asyncio.Queue()
+        self.closed = asyncio.Event()
+
+    async def receive(self):
+        await self.closed.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        await self.sent.put(message)
+
+    async def next_body(self):
+        message = await asyncio.wait_for(self.sent.get(), timeout=5)
+        return message.get('body')
+
+
+def scope(query_string=b'', headers=()):
+    return {
+        'type': 'http',
+        'path': stream.PATH,
+        'query_string': query_string,
+        'headers': list(headers),
+    }
+
+
+class RecipeEventTests(TestCase):
+    """Test publishing and streaming recipe changes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        self.token = Token.objects.create(user=self.user)
+
+    def tearDown(self):
+        events.hub.subscribers.clear()
+
+    @skipIf(db_connection.vendor == 'postgresql',
+            'PostgreSQL delivers events through NOTIFY')
+    @patch('core.events.hub.dispatch_threadsafe')
+    def test_writes_publish_after_commit(self, patched_dispatch):
+        """Test recipe writes notify subscribers once committed"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = client.post(RECIPES_URL, {
+                'title': 'Soup', 'time_minutes': 5, 'price': '1.00',
+            })
+            patched_dispatch.assert_not_called()
+
+        recipe_id = res.data['id']
+        with self.captureOnCommitCallbacks(execute=True):
+            client.delete(
+                reverse('recipe:recipe-detail', args=[recipe_id]))
+
+        payloads = [json.loads(c.args[0]) for c in patched_dispatch.mock_calls]
+        self.assertEqual(payloads, [
+            {'event': 'created', 'id': recipe_id, 'user': self.user.id},
+            {'event': 'deleted', 'id': recipe_id, 'user': self.user.id},
+        ])
+
+    async def test_stream_requires_token(self):
+        """Test clients without a valid token or ticket are rejected"""
+        for query in (b'ticket=invalid', b'token=' + self.token.key.encode()):
+            connection = FakeConnection()
+
+            await stream.recipe_events(
+                scope(query), connection.receive, connection.send)
+
+            message = await connection.sent.get()
+            self.assertEqual(message['status'], 401)
+
+    def test_ticket_requires_token(self):
+        """Test tickets are only issued to authenticated clients"""
+        client = APIClient()
+
+        res = client.post(TICKET_URL)
+        self.assertEqual(res.status_code, 401)
+
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        res = client.post(TICKET_URL)
+        self.assertEqual(res.status_code, 201)
+        self.assertTrue(res.data['ticket'])
+
+    async def test_ticket_opens_one_stream(self):
+        """Test a ticket authenticates a single stream"""
+        ticket = await sync_to_async(stream.issue_ticket)(self.user)
+        query = f'ticket={ticket}'.encode()
+
+        connection = FakeConnection()
+        task = asyncio.ensure_future(stream.recipe_events(
+            scope(query), connection.receive, connection.send))
+        start = await asyncio.wait_for(connection.sent.get(), timeout=5)
+        self.assertEqual(start['status'], 200)
+        connection.closed.set()
+        await asyncio.wait_for(task, timeout=5)
+
+        connection = FakeConnection()
+        await stream.recipe_events(
+            scope(query), connection.receive, connection.send)
+        message = await connection.sent.get()
+        self.assertEqual(message['status'], 401)
+
+    async def test_stream_delivers_own_events(self):
+        """Test subscribers only receive their own recipe events"""
+        other = await sync_to_async(get_user_model().objects.create_user)(
+            'other@example.com', 'testpass123')
+        connection = FakeConnection()
+        headers = [(b'authorization', f'Token {self.token.key}'.encode())]
+        task = asyncio.ensure_future(stream.recipe_events(
+            scope(headers=headers), connection.receive, connection.send))
+
+        start = await asyncio.wait_for(connection.sent.get(), timeout=5)
+        self.assertEqual(start['status'], 200)
+        self.assertEqual(await connection.next_body(), b'retry: 5000\n\n')
+
+        events.hub.dispatch(json.dumps(
+            {'event': 'updated', 'id': 1, 'user': other.id}))
+        events.hub.dispatch(json.dumps(
+            {'event': 'updated', 'id': 2, 'user': self.user.id}))
+        body = await connection.next_body()
+
+        self.assertEqual(body, (
+            b'event: updated\n'
+            b'data: {"event":"updated","id":2,"user":%d}\n\n' % self.user.id
+        ))
+
+        connection.closed.set()
+        await asyncio.wait_for(task, timeout=5)
+        self.assertEqual(events.hub.subscribers, {})
+
+    async def test_slow_subscriber_resyncs(self):
+        """Test a full queue is replaced by a resync event"""
+        with self.settings(RECIPE_EVENTS_QUEUE_SIZE=2):
+            queue = events.hub.subscribe(self.user.id)
+        for recipe_id in range(3):
+            events.hub.dispatch(json.dumps(
+                {'event': 'created', 'id': recipe_id, 'user': self.user.id}))
+
+        self.assertEqual(queue.qsize(), 1)
+        self.assertEqual(queue.get_nowait(), {'event': 'resync'})
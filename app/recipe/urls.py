@@ -13,5 +13,11 @@ router.register('recipes', views.RecipeViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
+    path('reports/', views.RecipeReportView.as_view(), name='report'),
+    path(
+        'events/ticket/',
+        views.StreamTicketView.as_view(),
+        name='events-ticket',
+    ),
     path('', include(router.urls))
 ]
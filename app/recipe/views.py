@@ -1,19 +1,30 @@
 """
 Views for recipe app
 """
-from rest_framework import viewsets
+from django.conf import settings
+from django.db import transaction
+from rest_framework import status, viewsets
 from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from core.models import Recipe
-from recipe import serializers
+from core import audit, duplicates, events, singleflight
+from core.idempotency import IdempotentCreateMixin
+from core.models import AuditEvent, Recipe, RecipeStats
+from recipe import images, serializers, snapshot, stream
+from recipe.autocomplete import suggest_titles
+from recipe.similarity import similar_recipe_ids
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(IdempotentCreateMixin, viewsets.ModelViewSet):
     """Manage recipes in the database"""
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     queryset = Recipe.objects.all()
     serializer_class = serializers.RecipeDetailSerializer
+    throttle_scope = 'recipe_write'
 
     def get_queryset(self):
         """Return recipes for the current authenticated user only"""
@@ -23,11 +34,223 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Return appropriate serializer class"""
         if self.action=='list':
             return serializers.RecipeSerializer
+        if self.action == 'stats':
+            return serializers.RecipeStatsSerializer
+        if self.action == 'batch':
+            return serializers.RecipeBatchSerializer
+        if self.action in ('similar', 'duplicates'):
+            return serializers.RecipeSerializer
+        if self.action == 'upload_image':
+            return serializers.RecipeImageSerializer
         return self.serializer_class
 
+    def _cached(self, name, compute):
+        """Serve a per-user response body through the single-flight cache
+
+        Keys embed the user's recipe version, which recipe writes bump, so
+        entries never outlive a change.
+        """
+        user_id = self.request.user.pk
+        version = singleflight.get_version(f'recipes:{user_id}')
+        return singleflight.get_or_compute(
+            f'recipes:{user_id}:{version}:{name}',
+            compute,
+            ttl=settings.RECIPE_CACHE_TTL,
+        )
+
+    def list(self, request, *args, **kwargs):
+        """List the user's recipes"""
+        data = self._cached(
+            'list', lambda: super(RecipeViewSet, self).list(
+                request, *args, **kwargs).data)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Return one of the user's recipes"""
+        def compute():
+            # Without the request media URLs stay relative, so the cached
+            # body does not carry the host of whoever filled it
+            context = self.get_serializer_context()
+            del context['request']
+            return self.get_serializer(
+                self.get_object(), context=context).data
+
+        data = self._cached(f"detail:{kwargs['pk']}", compute)
+        return Response(serializers.absolute_media_urls(data, request))
+
+    # Recipe writes update the owner's RecipeStats row through signals;
+    # the atomic blocks keep both changes in a single transaction, and
+    # change events reach stream subscribers only once it commits.
+
+    @transaction.atomic
     def perform_create(self, serializer):
         """Create a new recipe"""
-        serializer.save(user=self.request.user)
+        recipe = serializer.save(user=self.request.user)
+        events.publish(events.CREATED, recipe)
+        audit.record(self.request.user, AuditEvent.ACTION_CREATED, recipe)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        """Update a recipe"""
+        before = audit.capture(serializer.instance)
+        recipe = serializer.save()
+        events.publish(events.UPDATED, recipe)
+        audit.record(
+            self.request.user, AuditEvent.ACTION_UPDATED, recipe, before)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """Delete a recipe"""
+        recipe_id = instance.pk
+        instance.delete()
+        instance.pk = recipe_id
+        events.publish(events.DELETED, instance)
+        audit.record(self.request.user, AuditEvent.ACTION_DELETED, instance)
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Return recipe statistics for the authenticated user"""
+        stats = RecipeStats.objects.filter(user=request.user).first()
+        if stats is None:
+            stats = RecipeStats(user=request.user)
+        serializer = self.get_serializer(stats)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get', 'post'])
+    def batch(self, request):
+        """Return several recipes by id with a single query
+
+        Ids come from ``?ids=1,2,3`` or a ``{"ids": [...]}`` body. Results
+        keep the requested order and unknown ids are listed as missing.
+        """
+        if request.method == 'GET':
+            raw = request.query_params.get('ids', '')
+            data = {'ids': [part for part in raw.split(',') if part]}
+        else:
+            data = request.data
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+
+        recipes = self.get_queryset().order_by().in_bulk(ids)
+        found = [recipes[pk] for pk in ids if pk in recipes]
+        return Response({
+            'results': serializers.RecipeDetailSerializer(
+                found, many=True, context=self.get_serializer_context(),
+            ).data,
+            'missing': [pk for pk in ids if pk not in recipes],
+        })
 
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Suggest titles of the user's recipes for ``?q=`` (and ``limit``)"""
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        limit = max(1, min(limit, settings.AUTOCOMPLETE_MAX_RESULTS))
+        results = suggest_titles(request.user, query, limit) if query else []
+        return Response({'results': results})
 
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Return the user's recipes most similar to this one (``limit``)"""
+        recipe = self.get_object()
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        limit = max(1, min(limit, settings.RECIPE_SIMILARITY_MAX_RESULTS))
+        ids = similar_recipe_ids(recipe, limit)
+        recipes = self.get_queryset().order_by().in_bulk(ids)
+        return Response({
+            'results': serializers.RecipeSerializer(
+                [recipes[pk] for pk in ids if pk in recipes], many=True,
+                context=self.get_serializer_context(),
+            ).data,
+        })
+
+    @action(detail=False, methods=['get'])
+    def duplicates(self, request):
+        """Return groups of the user's near-identical recipes"""
+        groups = duplicates.duplicate_groups(request.user)
+        recipes = self.get_queryset().order_by().in_bulk(
+            [pk for group in groups for pk in group])
+        serializer = serializers.RecipeSerializer
+        context = self.get_serializer_context()
+        return Response({
+            'groups': [
+                serializer(
+                    [recipes[pk] for pk in group if pk in recipes],
+                    many=True, context=context,
+                ).data
+                for group in groups
+            ],
+        })
+
+    @action(
+        detail=True, methods=['post'], url_path='upload-image',
+        parser_classes=(MultiPartParser,),
+    )
+    def upload_image(self, request, pk=None):
+        """Upload an image to a recipe; thumbnails follow shortly"""
+        handler = images.HashingUploadHandler(request._request)
+        request._request.upload_handlers = [handler]
+        recipe = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        if getattr(handler, 'too_large', False):
+            return Response(
+                {'image': ['The image is too large.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            before = audit.capture(recipe)
+            recipe.image = images.store_image(
+                serializer.validated_data['image'])
+            recipe.thumbnails = {}
+            recipe.save(update_fields=['image', 'thumbnails', 'updated_at'])
+            events.publish(events.UPDATED, recipe)
+            audit.record(
+                request.user, AuditEvent.ACTION_UPDATED, recipe, before)
+            transaction.on_commit(
+                lambda: images.schedule_thumbnails(recipe))
+
+        return Response(serializers.RecipeDetailSerializer(
+            recipe, context=self.get_serializer_context()).data)
+
+
+class RecipeReportView(APIView):
+    """Site-wide recipe report computed from the exported snapshot"""
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        """Return recipe distributions (``bins`` sets histogram size)"""
+        current = snapshot.load_snapshot()
+        if current is None:
+            return Response(
+                {'detail': 'No recipe snapshot has been exported yet.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        try:
+            bins = int(request.query_params.get('bins', 20))
+        except ValueError:
+            bins = 20
+        bins = max(1, min(bins, settings.RECIPE_REPORT_MAX_BINS))
+        return Response(current.report(bins))
+
+
+class StreamTicketView(APIView):
+    """Exchange the API token for a ticket opening the event stream"""
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
 
+    def post(self, request):
+        """Return a single-use ticket for ``/api/recipe/events/?ticket=``"""
+        return Response({
+            'ticket': stream.issue_ticket(request.user),
+            'expires_in': settings.RECIPE_EVENTS_TICKET_TTL,
+        }, status=status.HTTP_201_CREATED)
@@ -9,6 +9,8 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.models import Job, UserDeletion
+
 
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
@@ -49,6 +51,29 @@ class PublicUserApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_user_exists_different_case(self):
+        """Test emails that only differ in case are treated as taken"""
+        create_user(email='test@example.com', password='testpass123')
+        payload = {
+            'email': 'Test@Example.com',
+            'password': 'testpass123',
+            'name': 'Test name',
+        }
+        res = self.client.post(CREATE_USER_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+    def test_create_token_email_case_insensitive(self):
+        """Test a token is created whatever the case of the email"""
+        create_user(email='Test@example.com', password='testpass123')
+
+        payload = {'email': 'test@EXAMPLE.com', 'password': 'testpass123'}
+        res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('token', res.data)
+
     def test_password_too_short(self):
         """Test that the password must be more than 5 characters"""
         payload = {
@@ -147,11 +172,15 @@ class PrivateUserApiTests(TestCase):
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_delete_user_schedules_deletion(self):
+        """Test deleting the profile deactivates the user immediately"""
+        res = self.client.delete(ME_URL)
 
-
-
-
-
-
-
-
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        deletion = UserDeletion.objects.get(user=self.user)
+        self.assertEqual(res.data['deletion'], deletion.id)
+        job = Job.objects.get()
+        self.assertEqual(job.name, 'core.deletion.run_user_deletion')
+        self.assertEqual(job.args, [deletion.id])
@@ -1,10 +1,14 @@
 """
 Views for the user API.
 """
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, authentication, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
-from core.models import User
+from core import audit
+from core.deletion import schedule_user_deletion
+from core.idempotency import IdempotentCreateMixin
+from core.models import AuditEvent, User
 
 from user.serializers import (
     UserSerializer,
@@ -12,18 +16,26 @@ from user.serializers import (
 )
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(IdempotentCreateMixin, generics.CreateAPIView):
     """Create a new user in the system."""
     serializer_class = UserSerializer
+    throttle_scope = 'auth'
+
+    def perform_create(self, serializer):
+        """Create the user and record the sign up"""
+        user = serializer.save()
+        audit.record(user, AuditEvent.ACTION_CREATED, user)
 
 
 class CreateTokenView(ObtainAuthToken):
     """Create a new auth token for user."""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = 'auth'
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     """Manage the authenticated user."""
     serializer_class = UserSerializer
     authentication_classes = [authentication.TokenAuthentication]
@@ -33,6 +45,22 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
         """Retrieve and return the authenticated user."""
         return self.request.user
 
+    def perform_update(self, serializer):
+        """Update the user and record what changed."""
+        before = audit.capture(serializer.instance)
+        user = serializer.save()
+        audit.record(user, AuditEvent.ACTION_UPDATED, user, before)
+
+    def destroy(self, request, *args, **kwargs):
+        """Deactivate the user and delete their data in the background."""
+        user = self.get_object()
+        deletion = schedule_user_deletion(user)
+        audit.record(user, AuditEvent.ACTION_DELETED, user)
+        return Response(
+            {'deletion': deletion.id, 'status': deletion.status},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
 
 class ListUsersView(generics.ListAPIView):
     queryset = User.objects.all()